@@ -1,11 +1,21 @@
+import time
+STARTUP_BEGIN = time.perf_counter()
+
 import dash
 import logging
-import sys 
+import sys
 import os
 
 from utils.manager import ConnectionManager
 from utils.monitoring import MonitoringState
 from utils.monitoring import MonitoringController
+from utils.startup import StartupTimer
+from utils.metrics import register_metrics_endpoint
+from utils.profiling import SamplingProfiler, register_profiling_endpoint, install_signal_handler
+from utils.download import register_download_endpoint
+from utils.data import initialize_database
+from utils.export import Exporter
+from utils.adb import check_initial_devices
 from ui.callbacks import register_callbacks
 from ui.layout import create_layout
 
@@ -17,24 +27,54 @@ logging.basicConfig(
     force=True
 )
 
+startup_timer = StartupTimer(STARTUP_BEGIN)
+startup_timer.mark("imports")
+
 # Initialize core components
 connection_manager = ConnectionManager()
 monitoring_state = MonitoringState()
 monitoring_controller = MonitoringController(connection_manager, monitoring_state)
 
+# Samples also go to a time-series store when TELEMETRY_EXPORT_URL is set, see utils/export.py
+if os.environ.get("TELEMETRY_EXPORT_URL"):
+    auth = os.environ.get("TELEMETRY_EXPORT_AUTH")
+    monitoring_state.exporter = Exporter(
+        os.environ.get("TELEMETRY_EXPORT_FORMAT", "influx"),
+        os.environ["TELEMETRY_EXPORT_URL"],
+        headers={"Authorization": auth} if auth else None,
+    ).start()
+
 # Initialize Dash app
 app = dash.Dash(__name__, update_title=None)
 app.title = "Real-time-mobile-performance-telemetry"
 
 # Define app layout
 app.layout = create_layout()
+startup_timer.mark("layout")
 
 # Register all callbacks
 notification_manager = register_callbacks(app, connection_manager, monitoring_state, monitoring_controller)
 monitoring_controller.notification_manager = notification_manager
+startup_timer.mark("callbacks")
+startup_timer.register(app.server)
+
+# Self-telemetry in Prometheus text format
+register_metrics_endpoint(app.server)
+
+# On-demand profiling, via POST /admin/profile?seconds=30&memory=1 or SIGUSR1
+profiler = SamplingProfiler()
+register_profiling_endpoint(app.server, profiler)
+
+# Stored samples as CSV or Parquet, via /download?device=SERIAL&metrics=cpu_user,mem_used&format=csv
+register_download_endpoint(app.server)
 
 if __name__ == "__main__":
-    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+    # the reloader runs the whole app twice, so it is opt-in
+    use_reloader = os.environ.get("TELEMETRY_RELOAD") == "1"
+    if not use_reloader or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
         logging.info("Starting ADB CPU Monitor Dashboard")
         logging.info("Please start monitoring using the dashboard controls")
-    app.run(debug=True)
\ No newline at end of file
+        startup_timer.run_in_background("database", initialize_database)
+        startup_timer.run_in_background("device scan", check_initial_devices)
+        install_signal_handler(profiler)
+    app.run(debug=True, use_reloader=use_reloader)
@@ -0,0 +1,276 @@
+"""Benchmarks for the ingest and render hot paths.
+
+Usage:
+    python -m benchmarks.run                      # run and compare against benchmarks/baseline.json
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --update-baseline    # store this run as the new baseline
+
+Each benchmark reports the best time per operation over several rounds. A
+benchmark regresses when it is slower than the baseline by more than the
+tolerance, in which case the run exits with status 1. Baselines are machine
+specific, regenerate them on the machine that runs the comparison.
+"""
+import argparse
+import glob
+import itertools
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from utils import data as data_module
+from utils.adb import parse_battery_status
+from utils.data import (
+    remove_ansi_escape_codes, parse_top_summary, save_data_to_db, save_data_points_to_db,
+    create_session, finish_session, load_session_summaries, load_session_series,
+)
+from utils.burst import parse_burst
+from utils.download import DOWNLOAD_COLUMNS, sample_chunks, csv_stream
+from utils.export import EXPORT_FORMATS, BATCH_SIZE
+from utils.monitoring import MonitoringState
+from utils.stats import StatsEngine
+from utils.parsers import parse_top_processes, parse_framestats, parse_logcat_line
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(BENCH_DIR, "fixtures")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+
+BUFFER_SIZES = (100, 1000, 10000)
+
+
+def load_fixtures(prefix):
+    fixtures = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, f"{prefix}_*.txt"))):
+        name = os.path.basename(path)[len(prefix) + 1:-len(".txt")]
+        with open(path, encoding="utf-8") as f:
+            fixtures[name] = f.read().strip()
+    return fixtures
+
+
+def measure(func, number, rounds=5):
+    """Best time per call of func() in microseconds over several rounds"""
+    func()  # warm up
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best * 1e6
+
+
+def sample_point(i, device_serial="BENCH0001"):
+    return {
+        "timestamp": datetime(2025, 1, 1) + timedelta(seconds=i),
+        "device_serial": device_serial,
+        "model": "Bench",
+        "connection_type": "USB",
+        "tasks_total": 712, "tasks_running": 2, "tasks_sleeping": 710, "tasks_stopped": 0, "tasks_zombie": 0,
+        "mem_total": 7573, "mem_used": 7263, "mem_free": 309, "mem_buffers": 44,
+        "swap_total": 4194300, "swap_used": 1358260, "swap_free": 2836040, "swap_cached": 2781720,
+        "cpu_cpu": 800, "cpu_user": 23 + i % 50, "cpu_nice": 1, "cpu_sys": 19, "cpu_idle": 751,
+        "cpu_iow": 0, "cpu_irq": 5, "cpu_sirq": 1, "cpu_host": 0,
+        "battery_level": 80, "battery_temp": 31.2, "charging_status": "Charging", "battery_health": "Good",
+    }
+
+
+def bench_parse_top(results, quick):
+    for name, text in load_fixtures("top").items():
+        def parse():
+            parse_top_summary(remove_ansi_escape_codes(text).splitlines(), device_serial="BENCH0001")
+        results[f"parse_top[{name}]"] = measure(parse, 200 if quick else 2000)
+
+
+def bench_parse_top_processes(results, quick):
+    for name, text in load_fixtures("top").items():
+        lines = remove_ansi_escape_codes(text).splitlines()
+        results[f"parse_top_processes[{name}]"] = measure(lambda: parse_top_processes(lines), 200 if quick else 2000)
+
+
+def bench_parse_battery(results, quick):
+    for name, text in load_fixtures("battery").items():
+        results[f"parse_battery[{name}]"] = measure(lambda: parse_battery_status(text), 200 if quick else 5000)
+
+
+def bench_parse_framestats(results, quick):
+    for name, text in load_fixtures("gfxinfo").items():
+        results[f"parse_framestats[{name}]"] = measure(lambda: parse_framestats(text), 200 if quick else 2000)
+
+
+def bench_parse_logcat(results, quick):
+    for name, text in load_fixtures("logcat").items():
+        lines = text.splitlines()
+        results[f"parse_logcat[{name}]"] = measure(
+            lambda: [parse_logcat_line(line) for line in lines], 100 if quick else 1000
+        )
+
+
+def bench_parse_burst(results, quick):
+    for name, text in load_fixtures("burst").items():
+        results[f"parse_burst[{name}]"] = measure(lambda: parse_burst(text), 10 if quick else 100)
+
+
+def bench_save_to_db(results, quick):
+    with tempfile.TemporaryDirectory() as tmp:
+        data_module.initialize_database(os.path.join(tmp, "bench.db"))
+        points = [sample_point(i) for i in range(50 if quick else 300)]
+        counter = itertools.count()
+
+        def save():
+            save_data_to_db(points[next(counter) % len(points)])
+        results["save_data_to_db"] = measure(save, len(points) // 5, rounds=3)
+
+
+def bench_add_data_point(results, quick):
+    for size in BUFFER_SIZES:
+        state = MonitoringState(buffer_size=size)
+        # fill the buffer so every measured insert also evicts the oldest point
+        for i in range(size):
+            state.add_data_point(sample_point(i))
+        point = sample_point(size)
+        results[f"add_data_point[{size}]"] = measure(lambda: state.add_data_point(point), 500 if quick else 5000)
+
+
+def bench_update_graph(results, quick):
+    from ui.callbacks import build_figure
+
+    for size in BUFFER_SIZES[:2]:
+        state = MonitoringState(buffer_size=size)
+        for i in range(size):
+            state.add_data_point(sample_point(i))
+
+        def render():
+            build_figure(state.collected_data, "cpu", [])
+        results[f"update_graph[{size}]"] = measure(render, 5 if quick else 20, rounds=3)
+
+
+def bench_compare_sessions(results, quick):
+    """Loading two finished sessions for the comparison view, summaries and one metric's series"""
+    with tempfile.TemporaryDirectory() as tmp:
+        data_module.initialize_database(os.path.join(tmp, "bench.db"))
+        samples = 600 if quick else 3600
+        session_ids = []
+        for n in range(2):
+            points = [sample_point(n * samples + i) for i in range(samples)]
+            stats = StatsEngine()
+            for point in points:
+                stats.update(point)
+            session_id = create_session("BENCH0001", points[0]["timestamp"], f"run {n}")
+            save_data_points_to_db(points)
+            finish_session(session_id, points[-1]["timestamp"], stats.rows())
+            session_ids.append(session_id)
+
+        def load():
+            load_session_summaries(session_ids)
+            load_session_series(session_ids, "cpu_user")
+        results["compare_sessions"] = measure(load, 20 if quick else 200, rounds=3)
+
+
+def bench_export_encode(results, quick):
+    """Encoding and compressing one full export batch, per format"""
+    points = [sample_point(i) for i in range(BATCH_SIZE)]
+    for name, fmt in EXPORT_FORMATS.items():
+        encoder = fmt()
+        results[f"export_encode[{name}]"] = measure(lambda: encoder.encode(points), 2 if quick else 10, rounds=3)
+
+
+def bench_download_csv(results, quick):
+    """Streaming an hour of stored samples with all metrics as CSV, per sample"""
+    with tempfile.TemporaryDirectory() as tmp:
+        data_module.initialize_database(os.path.join(tmp, "bench.db"))
+        samples = 600 if quick else 3600
+        save_data_points_to_db([sample_point(i) for i in range(samples)])
+        metrics = list(DOWNLOAD_COLUMNS)
+
+        def download():
+            for _ in csv_stream(sample_chunks("BENCH0001", metrics, "", "9999"), metrics):
+                pass
+        results["download_csv"] = measure(download, 2 if quick else 5, rounds=3) / samples
+
+
+BENCHMARKS = {
+    "parse_top": bench_parse_top,
+    "parse_top_processes": bench_parse_top_processes,
+    "parse_battery": bench_parse_battery,
+    "parse_framestats": bench_parse_framestats,
+    "parse_logcat": bench_parse_logcat,
+    "parse_burst": bench_parse_burst,
+    "save_data_to_db": bench_save_to_db,
+    "add_data_point": bench_add_data_point,
+    "update_graph": bench_update_graph,
+    "compare_sessions": bench_compare_sessions,
+    "export_encode": bench_export_encode,
+    "download_csv": bench_download_csv,
+}
+
+
+def compare(results, baseline, tolerance):
+    """Return (name, baseline_us, current_us) for every benchmark slower than allowed"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous and current > previous * (1 + tolerance):
+            regressions.append((name, previous, current))
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description=__doc__.splitlines()[0])
+    parser.add_argument("--only", nargs="*", choices=sorted(BENCHMARKS), help="run a subset of the benchmarks")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="allowed slowdown relative to the baseline, 0.5 means 50%% (default: 0.5)")
+    parser.add_argument("--update-baseline", action="store_true", help="write the results to the baseline file")
+    parser.add_argument("--quick", action="store_true", help="fewer iterations, for smoke runs")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, force=True)
+
+    results = {}
+    for name in args.only or BENCHMARKS:
+        BENCHMARKS[name](results, args.quick)
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "unit": "us/op",
+        "results": results,
+    }
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+
+    for name, value in results.items():
+        previous = baseline.get(name)
+        change = f"{100 * (value / previous - 1):+6.1f}%" if previous else "    new"
+        print(f"{name:<32} {value:>12.2f} us/op  {change}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.update_baseline:
+        # with --only the other benchmarks keep their recorded values
+        report["results"] = {**baseline, **results}
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for name, previous, current in regressions:
+        print(f"REGRESSION {name}: {previous:.2f} -> {current:.2f} us/op", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
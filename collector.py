@@ -0,0 +1,298 @@
+"""Headless collector, samples devices without the Dash/Plotly/pandas stack.
+
+Usage:
+    python -m collector --devices SERIAL1 SERIAL2 --interval 2 --duration 600
+"""
+import argparse
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+
+from utils.adb import get_unique_devices
+from utils.alerts import load_rules
+from utils.data import initialize_database
+from utils.export import Exporter, EXPORT_FORMATS
+from utils.logcat import parse_filter_specs
+from utils.manager import ConnectionManager
+from utils.monitoring import MonitoringState, MonitoringController
+from utils.profiling import SamplingProfiler, install_signal_handler
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+class JsonLinesWriter:
+    """Appends samples to a JSON lines file, shared by all device threads"""
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.file = open(path, "a", encoding="utf-8")
+
+    def write(self, data):
+        line = json.dumps(data, default=str)
+        with self.lock:
+            self.file.write(line + "\n")
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class CollectorState(MonitoringState):
+    """Monitoring state with a small live buffer that also forwards samples to a writer"""
+    def __init__(self, writer=None, buffer_size=10):
+        super().__init__(buffer_size=buffer_size)
+        self.writer = writer
+
+    def add_data_point(self, data):
+        super().add_data_point(data)
+        if self.writer:
+            self.writer.write(data)
+
+    def merge_data_points(self, points):
+        super().merge_data_points(points)
+        if self.writer:
+            for data in points:
+                self.writer.write(data)
+
+    def add_process_batch(self, data, batch):
+        super().add_process_batch(data, batch)
+        if self.writer:
+            self.writer.write({
+                "timestamp": data["timestamp"],
+                "device_serial": data.get("device_serial"),
+                "processes": batch,
+            })
+
+
+def logcat_filter(text):
+    try:
+        return parse_filter_specs(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def alert_rules(path):
+    try:
+        return load_rules(path)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def metadata_item(text):
+    key, sep, value = text.partition("=")
+    if not sep or not key:
+        raise argparse.ArgumentTypeError(f"expected KEY=VALUE, got {text!r}")
+    return key, value
+
+
+def http_header(text):
+    name, sep, value = text.partition(":")
+    if not sep or not name.strip():
+        raise argparse.ArgumentTypeError(f"expected 'Name: value', got {text!r}")
+    return name.strip(), value.strip()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m collector",
+        description="Collect device metrics over ADB without starting the dashboard.",
+    )
+    parser.add_argument("--devices", nargs="*", default=None,
+                        help="serial numbers (or adb device ids) to monitor, defaults to all connected devices")
+    parser.add_argument("--interval", type=float, default=5, help="seconds between samples (default: 5)")
+    parser.add_argument("--adaptive", nargs=2, type=float, default=None, metavar=("MIN", "MAX"),
+                        help="move the interval between MIN and MAX seconds, faster while CPU or memory change "
+                             "quickly and slower while they are steady (starts at --interval)")
+    parser.add_argument("--duration", type=float, default=None,
+                        help="stop after this many seconds (default: run until interrupted)")
+    parser.add_argument("--db", default=None, help="SQLite database path (default: app.db in the project root)")
+    parser.add_argument("--no-db", action="store_true", help="do not write samples to the database")
+    parser.add_argument("--jsonl", default=None, help="also append every sample to this JSON lines file")
+    parser.add_argument("--stream", action="store_true",
+                        help="run the sampling loop on the device and read its records from one adb stream "
+                             "instead of one adb call per sample")
+    parser.add_argument("--backfill", action="store_true",
+                        help="keep sampling on the device while it is disconnected and merge those samples "
+                             "after the reconnect")
+    parser.add_argument("--frames", action="store_true",
+                        help="with --package, also record jank and frame times from dumpsys gfxinfo framestats")
+    parser.add_argument("--cores", action="store_true",
+                        help="also record per-core frequency and utilization and thermal zone temperatures")
+    parser.add_argument("--power", type=float, default=0, metavar="HZ",
+                        help="also sample battery current and voltage this many times per second, "
+                             "buffered on the device, and integrate energy per interval (default: off)")
+    parser.add_argument("--net", action="store_true",
+                        help="also record per-interface throughput from /proc/net/dev "
+                             "(and the --package app's own traffic where the kernel exposes it)")
+    parser.add_argument("--logcat", nargs="?", const="", default=None, type=logcat_filter, metavar="FILTERSPECS",
+                        help="also stream logcat into a full-text indexed table, optionally filtered on the device "
+                             "by logcat filterspecs, e.g. --logcat 'ActivityManager:I *:W' (needs the database)")
+    parser.add_argument("--alerts", type=alert_rules, default=None, metavar="RULES.json",
+                        help="check every sample against the alert rules in this JSON file "
+                             "(default: the built-in CPU, thermal, battery and memory rules)")
+    parser.add_argument("--no-alerts", action="store_true", help="do not check alert rules")
+    parser.add_argument("--export", nargs=2, default=None, metavar=("FORMAT", "URL"),
+                        help=f"also send every sample to a time-series store, FORMAT one of {', '.join(EXPORT_FORMATS)}, "
+                             "e.g. --export influx 'http://localhost:8086/api/v2/write?org=o&bucket=b'")
+    parser.add_argument("--export-header", action="append", type=http_header, default=[], metavar="'NAME: VALUE'",
+                        help="HTTP header of the export requests, can be repeated, e.g. 'Authorization: Token ...'")
+    parser.add_argument("--export-spool", default=None, metavar="DIR",
+                        help="directory of the batches waiting to be resent (default: export_spool in the project root)")
+    parser.add_argument("--processes", type=int, default=0, metavar="K",
+                        help="also record the K busiest processes of every sample (default: off)")
+    parser.add_argument("--package", default=None,
+                        help="also sample this app's processes (CPU, RSS, PSS, swap, threads) from /proc")
+    parser.add_argument("--label", default=None,
+                        help="label of the monitoring session, e.g. the build under test, for comparing sessions later")
+    parser.add_argument("--meta", action="append", type=metadata_item, default=[], metavar="KEY=VALUE",
+                        help="metadata stored with the session, can be repeated, e.g. --meta build=1234 --meta test=scroll")
+    parser.add_argument("--log-level", default="INFO", help="logging level (default: INFO)")
+    return parser.parse_args(argv)
+
+
+def resource_usage():
+    """Return CPU time and peak memory of this process"""
+    if resource is None:
+        return {"cpu_user_s": time.process_time(), "cpu_sys_s": 0.0, "max_rss_mb": None}
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "cpu_user_s": usage.ru_utime,
+        "cpu_sys_s": usage.ru_stime,
+        "max_rss_mb": usage.ru_maxrss / divisor,
+    }
+
+
+def report_usage(collectors, started_at):
+    """Log the collector's own footprint, in total and per monitored device"""
+    elapsed = time.monotonic() - started_at
+    usage = resource_usage()
+    cpu_s = usage["cpu_user_s"] + usage["cpu_sys_s"]
+    samples = sum(state.total_points for _, state, _ in collectors)
+    device_count = max(len(collectors), 1)
+
+    logging.info(f"Collector ran for {elapsed:.1f}s with {len(collectors)} device(s), {samples} sample(s)")
+    for serial, state, _ in collectors:
+        logging.info(f"  {serial}: {state.total_points} sample(s)")
+    logging.info(
+        f"CPU time: {cpu_s:.2f}s (user {usage['cpu_user_s']:.2f}s, sys {usage['cpu_sys_s']:.2f}s), "
+        f"{100 * cpu_s / elapsed if elapsed else 0:.2f}% of one core"
+    )
+    if samples:
+        logging.info(f"CPU per sample: {1000 * cpu_s / samples:.2f}ms")
+    if usage["max_rss_mb"] is not None:
+        logging.info(
+            f"Peak RSS: {usage['max_rss_mb']:.1f}MB ({usage['max_rss_mb'] / device_count:.1f}MB per device)"
+        )
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(
+        level=args.log_level.upper(),
+        stream=sys.stdout,
+        format="%(name)s: %(asctime)s | %(levelname)s | %(filename)s:%(lineno)s >>> %(message)s",
+        datefmt="%d-%m-%Y %H:%M:%S",
+        force=True
+    )
+    started_at = time.monotonic()
+
+    if not args.no_db:
+        initialize_database(os.path.abspath(args.db) if args.db else None)
+    elif args.logcat is not None:
+        logging.warning("--logcat is ignored with --no-db, logcat lines are only kept in the database.")
+
+    if args.adaptive and not 0 < args.adaptive[0] <= args.adaptive[1]:
+        logging.error("--adaptive needs 0 < MIN <= MAX.")
+        return 2
+
+    if args.power < 0:
+        logging.error("--power needs a rate above 0 Hz, or 0 to leave it off.")
+        return 2
+
+    if args.export and args.export[0] not in EXPORT_FORMATS:
+        logging.error(f"--export FORMAT must be one of {', '.join(EXPORT_FORMATS)}.")
+        return 2
+
+    serials = args.devices or list(get_unique_devices())
+    if not serials:
+        logging.error("No devices found.")
+        return 1
+
+    writer = JsonLinesWriter(args.jsonl) if args.jsonl else None
+    exporter = None
+    if args.export:
+        exporter = Exporter(*args.export, headers=dict(args.export_header), spool_dir=args.export_spool).start()
+    collectors = []
+    for serial in serials:
+        state = CollectorState(writer)
+        state.save_to_local_db = not args.no_db
+        state.process_top_k = args.processes
+        state.target_package = args.package
+        state.collect_frames = args.frames
+        state.collect_cores = args.cores
+        state.power_rate_hz = args.power
+        state.collect_net = args.net
+        state.streaming = args.stream
+        state.backfill = args.backfill
+        state.adaptive_range = tuple(args.adaptive) if args.adaptive else None
+        state.alerts_enabled = not args.no_alerts
+        state.alert_rules = args.alerts
+        state.exporter = exporter
+        state.collect_logcat = args.logcat is not None
+        state.logcat_filter = args.logcat or ()
+        controller = MonitoringController(ConnectionManager(), state)
+        # plain adb device ids are passed through, everything else is treated as a serial number
+        device = serial if ":" in serial else f"serial:{serial}"
+        if controller.start_monitoring(
+            selected_device_id=device, monitoring_interval=args.interval, label=args.label, metadata=dict(args.meta)
+        ):
+            collectors.append((serial, state, controller))
+        else:
+            logging.error(f"Could not start monitoring {serial}")
+
+    if not collectors:
+        if writer:
+            writer.close()
+        if exporter:
+            exporter.stop()
+        return 1
+
+    stop_event = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    # kill -USR1 <pid> writes a 30s profile of the monitoring threads to profiles/
+    install_signal_handler(SamplingProfiler())
+
+    deadline = started_at + args.duration if args.duration else None
+    while not stop_event.is_set():
+        if deadline and time.monotonic() >= deadline:
+            break
+        # auto-stopped collectors (device gone for too long) end the run once none are left
+        if not any(state.monitoring_active for _, state, _ in collectors):
+            logging.warning("All devices stopped, exiting.")
+            break
+        stop_event.wait(0.5)
+
+    for _, state, controller in collectors:
+        if state.monitoring_active:
+            controller.stop_monitoring()
+    if writer:
+        writer.close()
+    if exporter:
+        exporter.stop()
+
+    report_usage(collectors, started_at)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""Stand-in export destination, accepts what the exporter sends and logs what it decoded.
+
+Usage:
+    python -m receiver --port 9201
+    python -m collector --export influx http://127.0.0.1:9201/api/v2/write
+    python -m receiver --port 9201 --fail-rate 0.5   # answer half of the requests with 503
+
+Every request is decoded like the real store would (gzip or snappy, then line
+protocol, OTLP JSON or a remote-write protobuf) and counted, so a broken batch
+shows up as a 400 and a decoding error in the log. It stands in for InfluxDB,
+an OpenTelemetry collector or Prometheus when trying the exporter out.
+"""
+import argparse
+import gzip
+import json
+import logging
+import random
+import signal
+import struct
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def read_varint(data, position):
+    value = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def snappy_decompress(data):
+    length, position = read_varint(data, 0)
+    out = bytearray()
+    while position < len(data):
+        tag = data[position]
+        position += 1
+        kind = tag & 3
+        if kind == 0:
+            size = tag >> 2
+            if size >= 60:
+                extra = size - 59
+                size = int.from_bytes(data[position:position + extra], "little")
+                position += extra
+            size += 1
+            out += data[position:position + size]
+            position += size
+            continue
+        if kind == 1:
+            size = ((tag >> 2) & 7) + 4
+            offset = (tag >> 5) << 8 | data[position]
+            position += 1
+        elif kind == 2:
+            size = (tag >> 2) + 1
+            offset = struct.unpack_from("<H", data, position)[0]
+            position += 2
+        else:
+            size = (tag >> 2) + 1
+            offset = struct.unpack_from("<I", data, position)[0]
+            position += 4
+        if not 0 < offset <= len(out):
+            raise ValueError(f"snappy copy offset {offset} outside the {len(out)} bytes written")
+        # copies may overlap what they produce, byte by byte
+        for _ in range(size):
+            out.append(out[-offset])
+    if len(out) != length:
+        raise ValueError(f"snappy length {len(out)} instead of {length}")
+    return bytes(out)
+
+
+def protobuf_fields(data):
+    """(field number, value) of a protobuf message, value as bytes for length-delimited fields"""
+    position = 0
+    while position < len(data):
+        key, position = read_varint(data, position)
+        number, wire = key >> 3, key & 7
+        if wire == 0:
+            value, position = read_varint(data, position)
+        elif wire == 1:
+            value = struct.unpack_from("<d", data, position)[0]
+            position += 8
+        elif wire == 2:
+            size, position = read_varint(data, position)
+            value = data[position:position + size]
+            position += size
+        elif wire == 5:
+            value = struct.unpack_from("<f", data, position)[0]
+            position += 4
+        else:
+            raise ValueError(f"unsupported protobuf wire type {wire}")
+        yield number, value
+
+
+def count_remote_write(body):
+    """(series, samples) of a WriteRequest"""
+    series = samples = 0
+    for number, timeseries in protobuf_fields(body):
+        if number != 1:
+            continue
+        series += 1
+        labels = {}
+        for field, value in protobuf_fields(timeseries):
+            if field == 1:
+                label = dict(protobuf_fields(value))
+                labels[label[1].decode()] = label[2].decode()
+            elif field == 2:
+                samples += 1
+        if "__name__" not in labels:
+            raise ValueError("time series without __name__")
+    return series, samples
+
+
+def count_otlp(body):
+    series = samples = 0
+    for resource in json.loads(body)["resourceMetrics"]:
+        for scope in resource["scopeMetrics"]:
+            for metric in scope["metrics"]:
+                series += 1
+                samples += len(metric["gauge"]["dataPoints"])
+    return series, samples
+
+
+def count_influx(body):
+    """(lines, fields) of line protocol"""
+    lines = [line for line in body.decode("utf-8").splitlines() if line and not line.startswith("#")]
+    fields = 0
+    for line in lines:
+        # measurement,tags fields timestamp, escaped spaces are part of a tag
+        parts = line.replace("\\ ", "\0").split(" ")
+        if len(parts) != 3:
+            raise ValueError(f"malformed line: {line[:80]}")
+        fields += parts[1].count(",") + 1
+    return len(lines), fields
+
+
+class Receiver:
+    def __init__(self, fail_rate=0.0, fail_status=503):
+        self.fail_rate = fail_rate
+        self.fail_status = fail_status
+        self.lock = threading.Lock()
+        self.totals = {"requests": 0, "failed": 0, "bytes": 0, "series": 0, "samples": 0}
+
+    def handle(self, headers, body):
+        """Decode one request, returns the HTTP status to answer with"""
+        with self.lock:
+            self.totals["requests"] += 1
+        if random.random() < self.fail_rate:
+            with self.lock:
+                self.totals["failed"] += 1
+            logging.info(f"Failing request with {self.fail_status}")
+            return self.fail_status
+        encoding = headers.get("Content-Encoding", "")
+        content_type = headers.get("Content-Type", "")
+        try:
+            raw = gzip.decompress(body) if encoding == "gzip" else snappy_decompress(body) if encoding == "snappy" else body
+            if "protobuf" in content_type:
+                kind, (series, samples) = "remote-write", count_remote_write(raw)
+            elif "json" in content_type:
+                kind, (series, samples) = "otlp", count_otlp(raw)
+            else:
+                kind, (series, samples) = "influx", count_influx(raw)
+        except Exception as e:
+            logging.error(f"Could not decode {len(body)} byte(s) of {content_type} ({encoding or 'plain'}): {e}")
+            return 400
+        with self.lock:
+            self.totals["bytes"] += len(body)
+            self.totals["series"] += series
+            self.totals["samples"] += samples
+        logging.info(
+            f"{kind}: {len(body)} byte(s) {encoding or 'plain'}, {len(raw)} decoded, "
+            f"{series} series/lines, {samples} value(s)"
+        )
+        return 204
+
+
+def serve(receiver, host="127.0.0.1", port=0):
+    """Answer POSTs on any path with the receiver, in a thread; port 0 picks a free one"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self.send_response(receiver.handle(self.headers, body))
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="receiver", daemon=True).start()
+    return server
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m receiver", description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=9201, help="port to listen on (default: 9201)")
+    parser.add_argument("--fail-rate", type=float, default=0.0,
+                        help="share of requests answered with --fail-status, to try the retry spool (default: 0)")
+    parser.add_argument("--fail-status", type=int, default=503, help="status of failed requests (default: 503)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO,
+        stream=sys.stdout,
+        format="%(name)s: %(asctime)s | %(levelname)s | %(filename)s:%(lineno)s >>> %(message)s",
+        datefmt="%d-%m-%Y %H:%M:%S",
+        force=True
+    )
+    receiver = Receiver(args.fail_rate, args.fail_status)
+    server = serve(receiver, args.host, args.port)
+    logging.info(f"Receiving on http://{args.host}:{server.server_port}/, any path")
+
+    stop_event = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    while not stop_event.is_set():
+        stop_event.wait(0.5)
+    server.shutdown()
+    server.server_close()
+    logging.info(f"Totals: {receiver.totals}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
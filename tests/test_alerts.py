@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from utils import alerts
+from utils.alerts import MIN_ANOMALY_SAMPLES, AlertEngine, validate_rules
+from utils.stats import StatsEngine
+
+START = datetime(2025, 1, 1)
+
+
+def sample(seconds, **values):
+    return {"timestamp": START + timedelta(seconds=seconds), **values}
+
+
+def states(events):
+    return [(rule.name, state, notify) for rule, state, _, notify in events]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Monotonic clock of the notification limits, moved by hand"""
+    now = [1000.0]
+    monkeypatch.setattr(alerts.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_fires_after_duration_and_clears(clock):
+    engine = AlertEngine([{"name": "hot", "metric": "battery_temp", "op": ">", "threshold": 45, "for": 10}])
+
+    assert engine.evaluate(sample(0, battery_temp=50)) == []
+    assert engine.evaluate(sample(9, battery_temp=50)) == []
+    assert states(engine.evaluate(sample(10, battery_temp=50))) == [("hot", "fired", True)]
+    # an ongoing problem is one alert
+    assert engine.evaluate(sample(20, battery_temp=51)) == []
+    assert states(engine.evaluate(sample(21, battery_temp=40))) == [("hot", "cleared", False)]
+
+
+def test_duration_restarts_when_condition_breaks(clock):
+    engine = AlertEngine([{"name": "hot", "metric": "battery_temp", "threshold": 45, "for": 10}])
+
+    engine.evaluate(sample(0, battery_temp=50))
+    engine.evaluate(sample(5, battery_temp=40))
+    engine.evaluate(sample(6, battery_temp=50))
+
+    assert engine.evaluate(sample(15, battery_temp=50)) == []
+    assert states(engine.evaluate(sample(16, battery_temp=50))) == [("hot", "fired", True)]
+
+
+def test_rule_cooldown(clock):
+    engine = AlertEngine([{"name": "hot", "metric": "battery_temp", "threshold": 45}])
+
+    assert states(engine.evaluate(sample(0, battery_temp=50))) == [("hot", "fired", True)]
+    engine.evaluate(sample(1, battery_temp=40))
+    # a flapping rule still fires, but only notifies once per cooldown
+    clock[0] += alerts.RULE_COOLDOWN - 1
+    assert states(engine.evaluate(sample(2, battery_temp=50))) == [("hot", "fired", False)]
+    engine.evaluate(sample(3, battery_temp=40))
+    clock[0] += 1
+    assert states(engine.evaluate(sample(4, battery_temp=50))) == [("hot", "fired", True)]
+
+
+def test_overall_limit(clock):
+    rules = [{"name": f"rule{i}", "metric": "battery_temp", "threshold": i} for i in range(8)]
+    engine = AlertEngine(rules)
+
+    events = engine.evaluate(sample(0, battery_temp=100))
+
+    assert [notify for _, _, _, notify in events] == [True] * alerts.MAX_ALERTS_PER_MINUTE + [False] * 3
+    engine.evaluate(sample(1, battery_temp=-1))
+    clock[0] += alerts.RULE_COOLDOWN
+    assert sum(notify for _, _, _, notify in engine.evaluate(sample(2, battery_temp=100))) == alerts.MAX_ALERTS_PER_MINUTE
+
+
+def test_derived_metric():
+    engine = AlertEngine([{"name": "busy", "metric": "cpu_busy_pct", "threshold": 90}])
+
+    # idle is out of 100% per core, 40 of 800 is 95% busy
+    assert states(engine.evaluate(sample(0, cpu_cpu=800, cpu_idle=40))) == [("busy", "fired", True)]
+    # samples without the inputs leave the rule as it is
+    assert engine.evaluate(sample(1, cpu_user=10)) == []
+    assert states(engine.evaluate(sample(2, cpu_cpu=800, cpu_idle=100))) == [("busy", "cleared", False)]
+
+
+def test_zscore_waits_for_baseline():
+    engine = AlertEngine([{"name": "jump", "metric": "mem_used", "kind": "zscore", "threshold": 4}])
+    stats = StatsEngine()
+
+    for i in range(MIN_ANOMALY_SAMPLES):
+        assert engine.evaluate(sample(i, mem_used=2000 + i % 3), stats) == []
+        stats.update(sample(i, mem_used=2000 + i % 3))
+
+    assert engine.evaluate(sample(100, mem_used=2001), stats) == []
+    assert states(engine.evaluate(sample(101, mem_used=2100), stats))[0][:2] == ("jump", "fired")
+
+
+@pytest.mark.parametrize("rule", [
+    {"metric": "battery_temp", "threshold": 45},
+    {"name": "x", "metric": "battery_temp", "threshold": "45"},
+    {"name": "x", "metric": "battery_temp", "threshold": 45, "op": "=="},
+    {"name": "x", "metric": "battery_temp", "threshold": 45, "kind": "median"},
+])
+def test_invalid_rules(rule):
+    with pytest.raises(ValueError):
+        validate_rules([rule])
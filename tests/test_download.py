@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from utils import data as data_module
+from utils import download
+from utils.data import format_timestamp, save_data_points_to_db
+from utils.download import csv_stream, download_query, sample_chunks
+
+START = datetime(2025, 1, 1)
+METRICS = ["cpu_user", "mem_used", "battery_temp", "power_mw"]
+
+
+def sample_point(i, device_serial="TEST0001"):
+    point = {
+        "timestamp": START + timedelta(seconds=i),
+        "device_serial": device_serial,
+        "cpu_cpu": 800, "cpu_user": i, "mem_total": 7573, "mem_used": 7000 + i,
+    }
+    # optional tables only get rows for the samples that have their values
+    if i % 2 == 0:
+        point["battery_temp"] = 30.0 + i
+    if i % 7 == 0:
+        point["power_mw"] = 1000.0 + i
+    return point
+
+
+def expected_row(i):
+    return (
+        format_timestamp(START + timedelta(seconds=i)), i, 7000 + i,
+        30.0 + i if i % 2 == 0 else None, 1000.0 + i if i % 7 == 0 else None,
+    )
+
+
+@pytest.fixture(autouse=True)
+def database(monkeypatch, tmp_path):
+    # restored after the test, initialize_database points the module at the new file
+    monkeypatch.setattr(data_module, "DATABASE_PATH", data_module.DATABASE_PATH)
+    data_module.initialize_database(str(tmp_path / "test.db"))
+    # windows smaller than the optional tables, so their rows are matched across windows
+    monkeypatch.setattr(download, "DOWNLOAD_CHUNK_ROWS", 4)
+
+
+def rows(*args):
+    return [row for chunk in sample_chunks(*args) for row in chunk]
+
+
+def test_optional_tables_stay_aligned():
+    save_data_points_to_db([sample_point(i) for i in range(50)])
+
+    assert rows("TEST0001", METRICS, "", "9999") == [expected_row(i) for i in range(50)]
+
+
+def test_time_range():
+    save_data_points_to_db([sample_point(i) for i in range(50)])
+    start, end = format_timestamp(START + timedelta(seconds=11)), format_timestamp(START + timedelta(seconds=29))
+
+    # the optional cursors skip their rows before the range as well
+    assert rows("TEST0001", METRICS, start, end) == [expected_row(i) for i in range(11, 30)]
+
+
+def test_other_devices_and_missing_device():
+    save_data_points_to_db([sample_point(i) for i in range(10)])
+    save_data_points_to_db([sample_point(i, device_serial="TEST0002") for i in range(10, 13)])
+
+    assert rows("TEST0002", METRICS, "", "9999") == [expected_row(i) for i in range(10, 13)]
+    assert rows("UNKNOWN", METRICS, "", "9999") == []
+
+
+def test_csv_stream():
+    save_data_points_to_db([sample_point(i) for i in range(3)])
+
+    text = "".join(csv_stream(sample_chunks("TEST0001", METRICS, "", "9999"), METRICS))
+
+    assert text.splitlines() == [
+        "timestamp,cpu_user,mem_used,battery_temp,power_mw",
+        f"{format_timestamp(START)},0,7000,30.0,1000.0",
+        f"{format_timestamp(START + timedelta(seconds=1))},1,7001,,",
+        f"{format_timestamp(START + timedelta(seconds=2))},2,7002,32.0,",
+    ]
+
+
+@pytest.mark.parametrize("args, message", [
+    ({"device": "TEST0001", "format": "xlsx"}, "Unknown format"),
+    ({}, "Pass a device serial or a session id"),
+    ({"device": "TEST0001", "metrics": "cpu_user,bogus"}, "Unknown metrics: bogus"),
+    ({"device": "TEST0001", "start": "yesterday"}, "ISO timestamps"),
+    ({"session": "abc"}, "Invalid session"),
+])
+def test_invalid_query(args, message):
+    with pytest.raises(ValueError, match=message):
+        download_query(args)
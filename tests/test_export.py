@@ -0,0 +1,218 @@
+import gzip
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from receiver import Receiver, protobuf_fields, serve, snappy_decompress
+from utils import export
+from utils.export import (
+    DiskSpool, Exporter, EXPORT_FORMATS, InfluxLineFormat, OtlpJsonFormat, RemoteWriteFormat, sample_fields,
+    snappy_compress,
+)
+from utils.metrics import EXPORT_DROPPED, EXPORT_SAMPLES
+
+
+def sample_point(i, device_serial="TEST0001"):
+    return {
+        "timestamp": datetime(2025, 1, 1) + timedelta(seconds=i),
+        "device_serial": device_serial,
+        "model": "Test",
+        "connection_type": "USB",
+        "cpu_cpu": 800, "cpu_user": 23 + i % 50, "cpu_sys": 19, "cpu_idle": 751,
+        "mem_total": 7573, "mem_used": 7263 + i, "battery_temp": 31.2, "charging_status": "Charging",
+    }
+
+
+def dropped(reason):
+    return EXPORT_DROPPED.series.get((reason,), 0)
+
+
+class RecordingReceiver(Receiver):
+    """Receiver that also keeps the line protocol of every accepted influx request, in arrival order"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.accepted = []
+
+    def handle(self, headers, body):
+        status = super().handle(headers, body)
+        if status == 204 and "text/plain" in headers.get("Content-Type", ""):
+            self.accepted.append(gzip.decompress(body).decode())
+        return status
+
+    def timestamps(self):
+        return [int(line.rsplit(" ", 1)[1]) for text in self.accepted for line in text.splitlines()]
+
+
+@pytest.fixture
+def receiver():
+    receiver = RecordingReceiver()
+    server = serve(receiver)
+    receiver.url = f"http://127.0.0.1:{server.server_port}/write"
+    yield receiver
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def fast_flush(monkeypatch):
+    monkeypatch.setattr(export, "FLUSH_INTERVAL", 0.05)
+
+
+@pytest.mark.parametrize("fmt", list(EXPORT_FORMATS))
+def test_batches_decode(receiver, tmp_path, fmt):
+    points = [sample_point(i) for i in range(120)]
+    fields = len(sample_fields(points[0]))
+    sent = EXPORT_SAMPLES.series.get((fmt,), 0)
+
+    exporter = Exporter(fmt, receiver.url, spool_dir=str(tmp_path)).start()
+    for point in points:
+        exporter.submit(point)
+    exporter.stop()
+
+    assert receiver.totals["failed"] == 0
+    # influx counts lines, the other formats one series per metric of the device
+    assert receiver.totals["series"] == (len(points) if fmt == "influx" else fields)
+    assert receiver.totals["samples"] == len(points) * fields
+    assert EXPORT_SAMPLES.series[(fmt,)] - sent == len(points)
+    assert len(exporter.spool) == 0
+
+
+def test_unavailable_store_spools_and_resends_in_order(receiver, tmp_path):
+    receiver.fail_rate = 1.0
+    exporter = Exporter("influx", receiver.url, spool_dir=str(tmp_path))
+    batches = [[sample_point(n * 10 + i) for i in range(10)] for n in range(3)]
+
+    for batch in batches:
+        exporter._export(batch)
+    # only the first batch is tried, the others queue behind it in the spool
+    assert receiver.totals["requests"] == 1
+    assert len(exporter.spool) == 3
+    assert sorted(os.listdir(exporter.spool.directory)) == list(exporter.spool.files)
+
+    receiver.fail_rate = 0.0
+    exporter._retry_spool()
+    assert receiver.totals["requests"] == 1, "retried before the backoff ran out"
+
+    exporter.retry_at = 0.0
+    exporter._retry_spool()
+    assert len(exporter.spool) == 0
+    assert os.listdir(exporter.spool.directory) == []
+    expected = [int(point["timestamp"].timestamp() * 1e9) for batch in batches for point in batch]
+    assert receiver.timestamps() == expected
+    assert exporter.backoff == export.RETRY_MIN
+
+
+def test_rejected_batch_is_dropped(receiver, tmp_path):
+    receiver.fail_rate, receiver.fail_status = 1.0, 400
+    exporter = Exporter("influx", receiver.url, spool_dir=str(tmp_path))
+    before = dropped("rejected")
+
+    exporter._export([sample_point(i) for i in range(7)])
+
+    assert dropped("rejected") - before == 7
+    assert len(exporter.spool) == 0
+
+
+def test_full_queue_drops_without_blocking(monkeypatch, tmp_path):
+    monkeypatch.setattr(export, "QUEUE_SIZE", 2)
+    # never started, so nothing takes samples off the queue
+    exporter = Exporter("influx", "http://127.0.0.1:9/write", spool_dir=str(tmp_path))
+    before = dropped("queue full")
+
+    start = time.perf_counter()
+    for i in range(5):
+        exporter.submit(sample_point(i))
+
+    assert time.perf_counter() - start < 0.5
+    assert exporter.queue.qsize() == 2
+    assert dropped("queue full") - before == 3
+
+
+def test_spool_drops_oldest_over_max_bytes(tmp_path):
+    spool = DiskSpool(str(tmp_path), max_bytes=100)
+    before = dropped("spool full")
+
+    for samples in (3, 4, 5):
+        spool.put(b"x" * 40, samples)
+
+    # 120 bytes is over the limit, the oldest batch goes
+    assert len(spool) == 2
+    assert spool.size == 80
+    assert sorted(os.listdir(tmp_path)) == list(spool.files)
+    assert [DiskSpool.samples(name) for name in spool.files] == [4, 5]
+    assert dropped("spool full") - before == 3
+    # a new spool on the same directory picks the batches up again
+    assert list(DiskSpool(str(tmp_path), max_bytes=100).files) == list(spool.files)
+
+
+@pytest.mark.parametrize("data", [
+    b"",
+    b"abc",
+    # literals of each length encoding: in the tag, 1 extra byte, 2 extra bytes, split at 64 KB
+    bytes(random.Random(1).getrandbits(8) for _ in range(200)),
+    bytes(random.Random(2).getrandbits(8) for _ in range(70000)),
+    # matches longer than one 64-byte copy, and overlapping ones
+    b"device=TEST0001,model=Test " * 500,
+    b"a" * 1000,
+], ids=["empty", "short", "literal-200", "literal-70000", "repeated", "run"])
+def test_snappy_round_trip(data):
+    compressed = snappy_compress(data)
+
+    assert snappy_decompress(compressed) == data
+
+
+def test_snappy_compresses_repeated_labels():
+    data = b"device=TEST0001,model=Test " * 500
+
+    assert len(snappy_compress(data)) < len(data) // 10
+
+
+def test_remote_write_series():
+    # out of order on purpose, a series' samples must be sent in time order
+    points = [sample_point(i) for i in (2, 0, 1)]
+    body = snappy_decompress(RemoteWriteFormat().encode(points))
+
+    series = {}
+    for _, timeseries in protobuf_fields(body):
+        labels, samples = {}, []
+        for field, value in protobuf_fields(timeseries):
+            if field == 1:
+                label = dict(protobuf_fields(value))
+                labels[label[1].decode()] = label[2].decode()
+            else:
+                samples.append(tuple(v for _, v in protobuf_fields(value)))
+        series[labels.pop("__name__")] = (labels, samples)
+
+    assert len(series) == len(sample_fields(points[0]))
+    labels, samples = series["telemetry_cpu_user"]
+    assert labels == {"device": "TEST0001", "model": "Test", "connection": "USB"}
+    start_ms = int(sample_point(0)["timestamp"].timestamp() * 1000)
+    assert samples == [(23.0, start_ms), (24.0, start_ms + 1000), (25.0, start_ms + 2000)]
+
+
+def test_influx_escapes_tags():
+    point = {**sample_point(0), "model": "Pixel 8, Pro"}
+
+    line = gzip.decompress(InfluxLineFormat().encode([point])).decode()
+
+    assert line.startswith("telemetry,connection=USB,device=TEST0001,model=Pixel\\ 8\\,\\ Pro cpu_cpu=800.0,")
+    assert line.endswith(f" {int(point['timestamp'].timestamp() * 1e9)}")
+
+
+def test_otlp_resource_per_device():
+    points = [sample_point(0), sample_point(1, device_serial="TEST0002"), sample_point(2)]
+
+    request = json.loads(gzip.decompress(OtlpJsonFormat().encode(points)))
+
+    resources = request["resourceMetrics"]
+    devices = [
+        {a["key"]: a["value"]["stringValue"] for a in r["resource"]["attributes"]}["device.device"] for r in resources
+    ]
+    assert devices == ["TEST0001", "TEST0002"]
+    metrics = {m["name"]: m for m in resources[0]["scopeMetrics"][0]["metrics"]}
+    assert [p["asDouble"] for p in metrics["telemetry.cpu_user"]["gauge"]["dataPoints"]] == [23.0, 25.0]
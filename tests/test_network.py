@@ -0,0 +1,55 @@
+import pytest
+
+from utils.network import COUNTER_32_BIT, NetworkSampler, counter_delta, parse_net_dev
+
+NET_DEV = """Inter-|   Receive                                                |  Transmit
+ face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed
+    lo: {lo} 10 0 0 0 0 0 0 {lo} 10 0 0 0 0 0 0
+ wlan0: {rx} {rxp} 0 0 0 0 0 0 {tx} {txp} 0 0 0 0 0 0
+"""
+
+
+def net_output(uptime, rx, tx, rxp=0, txp=0, lo=0):
+    return f"{uptime} 100.0\n" + NET_DEV.format(rx=rx, tx=tx, rxp=rxp, txp=txp, lo=lo)
+
+
+@pytest.mark.parametrize("previous, current, expected", [
+    (1000, 1500, 500),
+    (1000, 1000, 0),
+    # a 32-bit counter wrapped: near the top before, near zero now
+    (COUNTER_32_BIT - 100, 50, 150),
+    # any other decrease is a reset, counted from zero since
+    (5000, 200, 200),
+    # a 64-bit counter never wraps in practice, a drop past 2**32 is a reset too
+    (COUNTER_32_BIT * 3, 10, 10),
+])
+def test_counter_delta(previous, current, expected):
+    assert counter_delta(previous, current) == expected
+
+
+def test_parse_net_dev_skips_headers():
+    counters = parse_net_dev(net_output(1.0, 123, 456, 7, 8).splitlines()[1:])
+
+    assert counters == {"lo": (0, 10, 0, 10), "wlan0": (123, 7, 456, 8)}
+
+
+def test_rates_over_uptime():
+    sampler = NetworkSampler()
+
+    assert sampler.parse(net_output(100.0, 1000, 2000)) is None
+    data = sampler.parse(net_output(102.0, 5000, 2000 + 600, lo=99999))
+
+    # bytes per second over the device uptime, loopback left out
+    assert data["net_rx_bps"] == 2000.0
+    assert data["net_tx_bps"] == 300.0
+    assert data["net_wlan0_rx_bps"] == 2000.0
+    assert sampler.batches["net_interfaces_table"]["interface"] == ["wlan0"]
+
+
+def test_rates_across_wrap():
+    sampler = NetworkSampler()
+
+    sampler.parse(net_output(100.0, COUNTER_32_BIT - 1000, 0))
+    data = sampler.parse(net_output(101.0, 3000, 0))
+
+    assert data["net_rx_bps"] == 4000.0
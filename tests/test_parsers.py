@@ -0,0 +1,186 @@
+import os
+from datetime import datetime
+
+import pytest
+
+from utils.burst import parse_burst
+from utils.data import STREAM_TABLES
+from utils.parsers import (
+    parse_battery_status, parse_framestats, parse_logcat_line, parse_top_processes, parse_top_summary, remove_ansi_escape_codes,
+)
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "fixtures")
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return f.read().strip()
+
+
+def top_lines(name):
+    return remove_ansi_escape_codes(fixture(name)).splitlines()
+
+
+def test_top_summary_toybox():
+    timestamp = datetime(2025, 1, 1)
+    data = parse_top_summary(top_lines("top_android13.txt"), device_serial="TEST0001", timestamp=timestamp)
+
+    assert data["timestamp"] == timestamp
+    assert data["device_serial"] == "TEST0001"
+    assert (data["tasks_total"], data["tasks_running"], data["tasks_sleeping"]) == (712, 2, 710)
+    # KB in the header, MB in the sample
+    assert data["mem_total"] == pytest.approx(7755048 / 1024)
+    assert data["mem_used"] == pytest.approx(7437652 / 1024)
+    assert data["swap_cached"] == 2781720
+    assert (data["cpu_cpu"], data["cpu_user"], data["cpu_sys"], data["cpu_idle"]) == (800, 23, 19, 751)
+
+
+def test_top_summary_size_suffixes():
+    # newer toybox prints 11.2G and 612.0M instead of KB counts, converted to whole MB
+    data = parse_top_summary(top_lines("top_android15.txt"))
+
+    assert data["mem_total"] == int(11.2 * 1024)
+    assert data["mem_free"] == 612
+    assert data["cpu_cpu"] == 1600
+
+
+def test_top_summary_busybox():
+    data = parse_top_summary(top_lines("top_busybox.txt"))
+
+    # busybox has no total, it is used + free, and percentages of a single 100% cpu
+    assert data["mem_total"] == pytest.approx((1843200 + 120000) / 1024)
+    assert (data["cpu_cpu"], data["cpu_user"], data["cpu_idle"]) == (100, 5.0, 92.3)
+    # tasks come from the "2/612" of the load average line
+    assert (data["tasks_running"], data["tasks_total"]) == (2, 612)
+
+
+@pytest.mark.parametrize("name", ["top_android8.txt", "top_android10.txt", "top_android13.txt", "top_android15.txt"])
+def test_top_summary_versions(name):
+    data = parse_top_summary(top_lines(name))
+
+    assert data["mem_used"] + data["mem_free"] == pytest.approx(data["mem_total"], rel=1e-3)
+    assert data["cpu_cpu"] % 100 == 0
+    assert "cpu_host" in data
+
+
+def test_top_summary_without_header():
+    assert parse_top_summary([]) is None
+    assert parse_top_summary(["/system/bin/sh: top: inaccessible or not found"]) is None
+
+
+def test_top_processes_busiest_first():
+    batch = parse_top_processes(top_lines("top_android13.txt"), limit=3)
+
+    assert batch == {
+        "pid": [15169, 3231, 12894],
+        "user": ["radio", "u0_a34", "system"],
+        "cpu": [59.7, 48.0, 37.4],
+        "mem": [0.1, 1.9, 2.3],
+        # RES in MB, 7.9M stays as is, 172M of system_server
+        "res": [7.9, 145.0, 172.0],
+        "name": ["com.android.phone", "com.google.android.gms.persistent", "system_server"],
+    }
+
+
+def test_top_processes_busybox_has_no_memory_columns():
+    batch = parse_top_processes(top_lines("top_busybox.txt"), limit=4)
+
+    assert batch["pid"] == [1234, 567, 301, 7890]
+    assert batch["mem"] == [None] * 4 and batch["res"] == [None] * 4
+    # the command keeps its arguments
+    assert batch["name"][-1] == "top -b -n 1"
+
+
+def test_top_processes_without_table():
+    assert parse_top_processes(top_lines("top_android13.txt")[:4]) is None
+
+
+def test_framestats_skips_flagged_frames():
+    frames = parse_framestats(fixture("gfxinfo_android13.txt"))
+
+    # 40 rows, the first has Flags 1
+    assert len(frames) == 39
+    intended, vsync, frame_time, interval = frames[0]
+    assert (intended, vsync, interval) == (2000016666667, 2000016666667, 16666667)
+    assert frame_time == 5470863
+    assert [frame[0] for frame in frames] == sorted(frame[0] for frame in frames)
+
+
+def test_framestats_without_frame_interval():
+    # FrameInterval only exists from Android 12
+    frames = parse_framestats(fixture("gfxinfo_android10.txt"))
+
+    assert len(frames) == 39
+    assert {frame[3] for frame in frames} == {None}
+
+
+def test_framestats_after_vsync():
+    text = fixture("gfxinfo_android13.txt")
+    frames = parse_framestats(text)
+
+    # frames already seen by an earlier dump are left out
+    assert parse_framestats(text, after_vsync=frames[1][0]) == frames[2:]
+    assert parse_framestats(text, after_vsync=frames[-1][0]) == []
+
+
+def test_framestats_without_profile_data():
+    assert parse_framestats("Applications Graphics Acceleration Info:\nNo process found for: com.example.app") == []
+
+
+def test_battery_numeric_codes():
+    assert parse_battery_status(fixture("battery_android12.txt")) == {
+        "charging_status": "Full", "battery_health": "Good", "level": 100, "temperature": 33.1,
+    }
+
+
+def test_battery_words_pass_through():
+    output = "Current Battery Service state:\n  status: Charging\n  health: Cold\n  level: 42\n  temperature: -15\n"
+
+    assert parse_battery_status(output) == {
+        "charging_status": "Charging", "battery_health": "Cold", "level": 42, "temperature": -1.5,
+    }
+
+
+def test_logcat_lines():
+    lines = fixture("logcat_epoch.txt").splitlines()
+    parsed = [parse_logcat_line(line) for line in lines]
+
+    # only the '--------- beginning of' lines have no header
+    assert parsed[:2] == [None, None]
+    assert None not in parsed[2:]
+    assert parsed[3] == (1729300000.020, 1423, 13405, "W", "System.err", "java.net.SocketTimeoutException: timeout")
+
+
+@pytest.mark.parametrize("line, expected", [
+    # the tag is padded before the colon
+    ("1729300000.064   1423  20333 I chatty  : uid=1000(system) expire 12 lines",
+     (1729300000.064, 1423, 20333, "I", "chatty", "uid=1000(system) expire 12 lines")),
+    ("1729300000.100   100  101 E Tag:", (1729300000.1, 100, 101, "E", "Tag", "")),
+    ("1729300000.100   100  101 X Tag: not a priority", None),
+    ("01-01 00:00:00.000   100  101 I Tag: threadtime format", None),
+])
+def test_logcat_line_edge_cases(line, expected):
+    assert parse_logcat_line(line) == expected
+
+
+def test_burst_readings():
+    frame = parse_burst(fixture("burst_60s.txt"))
+
+    assert len(frame) == 600
+    # the rows are stored by position, without the burst and session ids
+    assert list(frame.columns) == [
+        name for name, _ in STREAM_TABLES["burst_table"][1] if name not in ("burst_id", "session_id")
+    ]
+    first, second = frame.iloc[0], frame.iloc[1]
+    # device clock at the start plus the uptime since
+    assert second["device_time"] == pytest.approx(1792378311.726355314 + 0.11)
+    # there is no tick delta for the first reading; after it, 68 busy of 138 ticks
+    assert first["cpu_pct"] != first["cpu_pct"]
+    assert second["cpu_pct"] == 49.3
+    assert (second["mem_total"], second["mem_used"], second["mem_free"]) == (7573.2, 7295.4, 277.8)
+    assert (second["power_current_ma"], second["power_voltage_v"], second["power_mw"]) == (-328.7, 3.947, 1297.4)
+
+
+def test_burst_without_readings():
+    assert parse_burst("@@done") is None
+    assert parse_burst("@@start 1792378311.7 1000.00\n@@done") is None
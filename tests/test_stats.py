@@ -0,0 +1,98 @@
+import json
+import random
+import statistics
+from datetime import datetime, timedelta
+
+import pytest
+
+from utils.stats import SKETCH_ACCURACY, QuantileSketch, RunningStats, StatsEngine
+
+
+def values(seed, count=5000):
+    rng = random.Random(seed)
+    # latency-like, a long tail over several orders of magnitude, and a few negatives and zeros
+    return [rng.lognormvariate(3, 1.5) for _ in range(count)] + [-5.0, -0.5, 0.0, 0.0]
+
+
+def exact_quantile(data, q):
+    return sorted(data)[int(q * (len(data) - 1))]
+
+
+@pytest.mark.parametrize("q", [0.01, 0.5, 0.9, 0.99, 1.0])
+def test_sketch_relative_accuracy(q):
+    data = values(1)
+    sketch = QuantileSketch()
+    for value in data:
+        sketch.update(value)
+
+    exact = exact_quantile(data, q)
+    assert sketch.quantile(q) == pytest.approx(exact, rel=SKETCH_ACCURACY)
+
+
+def test_sketch_merge_equals_single_sketch():
+    parts = [values(seed, 1000) for seed in range(4)]
+    merged, single = QuantileSketch(), QuantileSketch()
+    for part in parts:
+        sketch = QuantileSketch()
+        for value in part:
+            sketch.update(value)
+            single.update(value)
+        merged.merge(sketch)
+
+    # merging adds bucket counts, nothing is lost against one sketch of everything
+    assert merged.count == single.count
+    assert (merged.positive, merged.negative, merged.zero) == (single.positive, single.negative, single.zero)
+    assert merged.quantile(0.99) == single.quantile(0.99)
+
+
+def test_sketch_serialization():
+    sketch = QuantileSketch()
+    for value in values(2, 500):
+        sketch.update(value)
+
+    # as saved in the stats table, JSON turns the bucket keys into strings
+    restored = QuantileSketch.from_dict(json.loads(json.dumps(sketch.to_dict())))
+
+    assert restored.count == sketch.count
+    assert [restored.quantile(q) for q in (0.1, 0.5, 0.9)] == [sketch.quantile(q) for q in (0.1, 0.5, 0.9)]
+
+
+def test_empty_sketch():
+    assert QuantileSketch().quantile(0.5) is None
+
+
+def test_running_stats_merge():
+    data = values(3, 1000)
+    whole, left, right = RunningStats(), RunningStats(), RunningStats()
+    for value in data:
+        whole.update(value)
+    for value in data[:300]:
+        left.update(value)
+    for value in data[300:]:
+        right.update(value)
+
+    left.merge(right)
+
+    assert left.count == whole.count
+    assert left.mean == pytest.approx(whole.mean)
+    assert left.std == pytest.approx(whole.std)
+    assert (left.min, left.max) == (whole.min, whole.max)
+    # the EWMA keeps the newer side
+    assert left.ewma == right.ewma
+
+
+def test_engine_skips_non_metrics():
+    engine = StatsEngine()
+    start = datetime(2025, 1, 1)
+    for i in range(10):
+        engine.update({
+            "timestamp": start + timedelta(seconds=i), "device_serial": "TEST0001", "cpu_user": float(i),
+            "charging_status": "Charging", "backfilled": True, "battery_temp": float("nan"),
+        })
+
+    assert engine.names() == ["cpu_user"]
+    count, mean, std, ewma = engine.baseline("cpu_user")
+    assert (count, mean) == (10, 4.5)
+    assert std == pytest.approx(statistics.stdev(range(10)))
+    assert engine.baseline("battery_temp") is None
+    assert engine.summary("cpu_user")["max"] == 9.0
@@ -0,0 +1,55 @@
+import pytest
+
+from utils.timing import ClockOffsetEstimator, parse_device_time, split_timed_output, timed_shell_command
+
+
+def round_trip(estimator, host_send, up, down, offset=5.0, run=0.02):
+    """One adb call: `up` seconds to the device, `run` on it, `down` back, device clock `offset` ahead"""
+    device_start = host_send + up + offset
+    device_end = device_start + run
+    return estimator.update(host_send, host_send + up + run + down, device_start, device_end)
+
+
+def test_offset_of_symmetric_round_trip():
+    estimator = ClockOffsetEstimator()
+
+    assert round_trip(estimator, 1000.0, 0.01, 0.01) == pytest.approx(5.0)
+    # the time the device ran the command is not network delay
+    assert estimator.last_delay == pytest.approx(0.02)
+    assert estimator.to_host_time(2005.0) == pytest.approx(2000.0)
+
+
+def test_slow_round_trip_does_not_move_offset():
+    estimator = ClockOffsetEstimator()
+    round_trip(estimator, 1000.0, 0.005, 0.005)
+
+    # a one-sided 400ms stall would put the offset 200ms off, the faster round trip in the window wins
+    assert round_trip(estimator, 1001.0, 0.4, 0.005) == pytest.approx(5.0)
+
+
+def test_offset_follows_drift_smoothly():
+    estimator = ClockOffsetEstimator(window=1, alpha=0.25)
+    round_trip(estimator, 1000.0, 0.01, 0.01, offset=5.0)
+
+    assert round_trip(estimator, 1001.0, 0.01, 0.01, offset=5.4) == pytest.approx(5.1)
+    estimator.reset()
+    assert estimator.offset is None and estimator.to_host_time(10.0) == 10.0
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("1729300000.123456789", 1729300000.123456789),
+    # toybox without %N prints the literal, or nothing after the dot
+    ("1729300000.%N", 1729300000.0),
+    ("1729300000.", 1729300000.0),
+    ("date: bad format", None),
+])
+def test_parse_device_time(line, expected):
+    assert parse_device_time(line) == expected
+
+
+def test_split_timed_output():
+    assert timed_shell_command("cat /proc/loadavg").startswith("date +%s.%N; cat /proc/loadavg;")
+    output = "1729300000.100\n0.52 0.48 0.50 1/612 12345\n1729300000.180\n"
+
+    assert split_timed_output(output) == (1729300000.1, 1729300000.18, "0.52 0.48 0.50 1/612 12345")
+    assert split_timed_output("0.52 0.48 0.50 1/612 12345") == (None, None, "0.52 0.48 0.50 1/612 12345")
@@ -1,16 +1,350 @@
 import time
 import logging
+from urllib.parse import urlencode
+from datetime import datetime
 import dash
-import plotly.graph_objs as go
 from dash.dependencies import Input, Output, State
 from dash import html
+import plotly.graph_objs as go
 from utils.adb import get_device_model, get_unique_devices
+from utils.data import search_logcat, format_timestamp, list_sessions, load_session_summaries, load_session_series
+from utils.download import DOWNLOAD_COLUMNS
+from utils.fleet import FleetConnector
+from utils.logcat import parse_filter_specs
 from utils.manager import NotificationManager
+from utils.metrics import timed, CALLBACK_SECONDS
+
+
+# y axis label, default range and traces of each metric category
+GRAPH_LABELS = {
+    "cpu": {
+        "all_metrics": [
+            "cpu_cpu", "cpu_user", "cpu_nice", "cpu_sys", "cpu_idle",
+            "cpu_iow", "cpu_irq", "cpu_sirq", "cpu_host"
+        ],
+        "ylabel": "CPU Usage (%)",
+        "max": 100,
+    },
+    "mem": {
+        "all_metrics": [
+            "mem_total", "mem_used", "mem_free", "mem_buffers",
+            "swap_total", "swap_used", "swap_free", "swap_cached"
+        ],
+        "ylabel": "Memory (MB)",
+        "max": 4096,
+    },
+    "task": {
+        "all_metrics": [
+            "tasks_total", "tasks_running", "tasks_sleeping",
+            "tasks_stopped", "tasks_zombie"
+        ],
+        "ylabel": "Task Count",
+        "max": 100,
+    },
+    "battery": {
+        "all_metrics": ["battery_level", "battery_temp"],
+        "ylabel": "Battery",
+        "max": 100,
+    },
+    "power": {
+        "all_metrics": ["power_mw", "power_peak_mw", "energy_mj"],
+        "ylabel": "Power (mW) / Energy (mJ)",
+        "max": 5000,
+    },
+    "app": {
+        "all_metrics": ["app_cpu", "app_rss_mb", "app_pss_mb", "app_swap_mb"],
+        "ylabel": "Target app (% / MB)",
+        "max": 100,
+    },
+    "frames": {
+        # app CPU is drawn on the same time axis to line up slow frames with CPU spikes
+        "all_metrics": ["gfx_jank_pct", "gfx_p50_ms", "gfx_p90_ms", "gfx_p99_ms", "gfx_missed_vsync", "app_cpu"],
+        "ylabel": "Frames (% / ms)",
+        "max": 100,
+    },
+    "cores": {
+        # per-core and per-zone keys depend on the device, they are picked from the samples by prefix
+        "prefixes": ["core_freq_", "core_util_", "thermal_", "cores_throttled"],
+        # frequencies only until something else is selected, the units differ
+        "default_prefixes": ["core_freq_"],
+        "ylabel": "MHz / % / °C",
+        "max": 3000,
+    },
+    "net": {
+        # per-interface keys depend on the device, e.g. net_wlan0_rx_bps
+        "prefixes": ["net_", "app_rx_", "app_tx_"],
+        # totals until something else is selected
+        "default_prefixes": ["net_rx_bps", "net_tx_bps"],
+        "ylabel": "Bytes/s | Packets/s",
+        "max": 1024 * 1024,
+    },
+    "burst": {
+        # the latest burst capture, not the live samples
+        "all_metrics": ["cpu_pct", "mem_used", "mem_available", "power_mw"],
+        "ylabel": "Burst (% / MB / mW)",
+        "max": 100,
+    },
+    "swap": {
+        "all_metrics": ["swap_total", "swap_used", "swap_free", "swap_cached"],
+        "ylabel": "Swap (MB)",
+        "max": 1024
+    }
+}
+
+
+# readings per second of the power collector when it is switched on from the dashboard
+POWER_RATE_HZ = 10
+
+# processes recorded per sample when process collection is switched on, and how many are plotted
+PROCESS_TOP_K = 10
+PROCESS_TRACES = 8
+
+# readings per second of a burst capture started from the dashboard
+BURST_RATE_HZ = 10
+
+# logcat lines listed under the search box, and at most drawn on the chart
+LOGCAT_RESULTS = 100
+LOGCAT_OVERLAY = 300
+
+# adaptive mode from the dashboard samples between interval / ADAPTIVE_FACTOR (not below the minimum) and interval * ADAPTIVE_FACTOR
+ADAPTIVE_FACTOR = 4
+ADAPTIVE_MIN_INTERVAL = 1
+
+
+# column titles of the statistics table
+STATS_HEADERS = {"window_p90": "p90 (1 min)", "ewma": "EWMA"}
+
+
+# finished sessions offered for comparison, newest first
+SESSION_CHOICES = 50
+
+# statistics of the compared metric side by side, total is the sum over the session, e.g. of energy_mj
+COMPARE_STATS = ("mean", "p50", "p90", "p99", "max", "std", "total")
+
+# metric shown when two sessions are picked, if both have it
+COMPARE_DEFAULT_METRIC = "cpu_user"
+
+# line colors of session A and B
+COMPARE_COLORS = ("#13ffe3", "#ff5c7a")
+
+
+def _format_stat(value):
+    if value is None:
+        return ""
+    return f"{value:.0f}" if abs(value) >= 1000 else f"{value:.3g}"
+
+
+def _timed_callback(func):
+    """Record the callback duration under its function name"""
+    return timed(CALLBACK_SECONDS, func.__name__)(func)
+
+
+def category_metrics(metric, columns, default=False):
+    """Keys of a category present in the samples, for categories defined by key prefixes"""
+    prefixes = tuple(GRAPH_LABELS[metric]["default_prefixes" if default else "prefixes"])
+    return [column for column in columns if column.startswith(prefixes)]
+
+
+def build_figure(df, metric, selected_metrics, backfilled=()):
+    """Build the live plot figure for a metric category from a DataFrame of samples
+
+    backfilled holds (first, last) timestamps of samples recorded during a disconnect,
+    they are shaded.
+    """
+    fig = go.Figure()
+
+    if metric in GRAPH_LABELS and "prefixes" in GRAPH_LABELS[metric]:
+        all_metrics = category_metrics(metric, df.columns)
+        ylabel = GRAPH_LABELS[metric]["ylabel"]
+        y_max = GRAPH_LABELS[metric]["max"]
+        if not selected_metrics:
+            selected_metrics = category_metrics(metric, df.columns, default=True)
+    elif metric in GRAPH_LABELS:
+        all_metrics = GRAPH_LABELS[metric]["all_metrics"]
+        ylabel = GRAPH_LABELS[metric]["ylabel"]
+        y_max = GRAPH_LABELS[metric]["max"]
+    else:
+        all_metrics = []
+        ylabel = "Value"
+        y_max = 100
+
+    # Only keep selected metrics if any are chosen, else all by default
+    metrics = [m for m in all_metrics if selected_metrics and m in selected_metrics] or all_metrics
+
+    # Add traces for all selected metrics
+    if not df.empty:
+        for m in metrics:
+            name = m.replace("swap_", "").capitalize()
+            ydata = df[m] if m in df.columns else [0] * len(df)
+            fig.add_trace(
+                go.Scatter(
+                    x=df["timestamp"],
+                    y=ydata,
+                    mode="lines+markers",
+                    name=name
+                )
+            )
+
+    if not df.empty and backfilled:
+        first, last = df["timestamp"].min(), df["timestamp"].max()
+        for start, end in backfilled:
+            if end >= first and start <= last:
+                fig.add_vrect(
+                    x0=start, x1=end, fillcolor="#f0c04a", opacity=0.15, line_width=0,
+                    annotation_text="backfilled", annotation_position="top left",
+                )
+
+    fig.update_layout(
+        title="",
+        xaxis_title="Time",
+        yaxis_title=ylabel,
+        legend=dict(
+            orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1
+        ),
+        margin=dict(l=40, r=40, t=50, b=40),
+        hovermode="closest",
+        template="plotly_white",
+        yaxis=dict(range=[0, y_max], autorange=True),
+    )
+
+    return fig
+
+
+def add_log_overlay(fig, rows):
+    """Mark logcat lines on the time axis of a figure, rows as returned by search_logcat"""
+    for name, priorities, color in (
+        ("Log", "VDI", "#7a8bb5"), ("Log warnings", "W", "#f0c04a"), ("Log errors", "EF", "#ff5c7a")
+    ):
+        lines = [row for row in rows if row[1] in priorities]
+        if not lines:
+            continue
+        fig.add_trace(
+            go.Scatter(
+                x=[row[0] for row in lines],
+                y=[0] * len(lines),
+                mode="markers",
+                marker=dict(symbol="line-ns-open", size=14, color=color),
+                name=name,
+                # the markers sit on the bottom of the plot whatever the scale of the metrics
+                yaxis="y2",
+                hovertext=[f"{row[1]}/{row[2]}({row[3]}): {row[4]}" for row in lines],
+                hoverinfo="x+text",
+            )
+        )
+    fig.update_layout(yaxis2=dict(overlaying="y", range=[0, 1], visible=False, fixedrange=True))
+    return fig
+
+
+def top_process_names(process_samples, limit=PROCESS_TRACES):
+    """Names of the processes with the most CPU time across the buffered samples"""
+    totals = {}
+    for _, batch in process_samples:
+        for name, cpu in zip(batch["name"], batch["cpu"]):
+            totals[name] = totals.get(name, 0.0) + cpu
+    return sorted(totals, key=totals.get, reverse=True)[:limit]
+
+
+def build_process_figure(process_samples, selected_names):
+    """Build the top consumers figure, %CPU over time per process"""
+    fig = go.Figure()
+    names = selected_names or top_process_names(process_samples)
+    timestamps = [timestamp for timestamp, _ in process_samples]
+    for name in names:
+        # a process that drops out of the top K leaves a gap rather than a zero
+        ydata = []
+        for _, batch in process_samples:
+            cpu = [c for n, c in zip(batch["name"], batch["cpu"]) if n == name]
+            ydata.append(sum(cpu) if cpu else None)
+        fig.add_trace(go.Scatter(x=timestamps, y=ydata, mode="lines+markers", name=name))
+
+    fig.update_layout(
+        title="",
+        xaxis_title="Time",
+        yaxis_title="Process CPU (%)",
+        legend=dict(
+            orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1
+        ),
+        margin=dict(l=40, r=40, t=50, b=40),
+        hovermode="closest",
+        template="plotly_white",
+        yaxis=dict(range=[0, 100], autorange=True),
+    )
+
+    return fig
+
+
+def session_name(session):
+    """Short name of a session: id, label, device and start"""
+    device = session["model"] or session["device_serial"]
+    return f"#{session['id']} {session['label'] or 'unlabeled'} · {device} · {session['started'][:16]}"
+
+
+def session_duration(session):
+    if not session["ended"]:
+        return None
+    return (datetime.fromisoformat(session["ended"]) - datetime.fromisoformat(session["started"])).total_seconds()
+
+
+def build_comparison_figure(series, names, metric):
+    """Downsampled series of sessions over seconds since their start, the mean with the min-max band"""
+    fig = go.Figure()
+    for (offsets, means, mins, maxs), name, color in zip(series, names, COMPARE_COLORS):
+        if not offsets:
+            continue
+        fig.add_trace(
+            go.Scatter(
+                x=offsets + offsets[::-1], y=maxs + mins[::-1], fill="toself", fillcolor=color, opacity=0.15,
+                line=dict(width=0), hoverinfo="skip", showlegend=False,
+            )
+        )
+        fig.add_trace(go.Scatter(x=offsets, y=means, mode="lines", name=name, line=dict(color=color)))
+
+    fig.update_layout(
+        title="",
+        xaxis_title="Seconds since start",
+        yaxis_title=metric or "Value",
+        legend=dict(
+            orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1
+        ),
+        margin=dict(l=40, r=40, t=50, b=40),
+        hovermode="closest",
+        template="plotly_white",
+    )
+
+    return fig
+
+
+def build_comparison_table(sessions, summaries, metric):
+    """Session settings and the metric's statistics of sessions side by side, with the change of B against A"""
+    def row(name, values, delta=True):
+        change = ""
+        if delta and len(values) == 2 and values[0] and values[1] is not None:
+            change = f"{100 * (values[1] / values[0] - 1):+.1f}%"
+        return html.Tr(
+            [html.Td(name)]
+            + [html.Td(v if isinstance(v, str) else _format_stat(v)) for v in values]
+            + [html.Td(change)]
+        )
+
+    header = html.Tr([html.Th("")] + [html.Th(f"#{s['id']} {s['label'] or ''}") for s in sessions] + [html.Th("Δ")])
+    settings = [
+        ", ".join(f"{key}={value}" for key, value in s["metadata"].items() if value is not None) for s in sessions
+    ]
+    rows = [
+        row("duration (s)", [session_duration(s) for s in sessions]),
+        row("samples", [s["samples"] for s in sessions]),
+        row("settings", settings, delta=False),
+    ]
+    for stat in COMPARE_STATS:
+        rows.append(row(f"{metric} {stat}", [summaries[s["id"]].get(metric, {}).get(stat) for s in sessions]))
+    return html.Table([header] + rows, className="stats-table")
+
 
 def register_callbacks(
     app, connection_manager, monitoring_state, monitoring_controller
 ):
     notification_manager = NotificationManager()
+    fleet = FleetConnector(connection_manager)
 
     @app.callback(
         Output("device-dropdown", "options"),
@@ -19,6 +353,7 @@ def register_callbacks(
             Input("refresh-button", "n_clicks"),
         ],
     )
+    @_timed_callback
     def update_device_dropdown(_, refresh_clicks):
         """Update the device dropdown list with available devices"""
         # get unique devices first.
@@ -47,6 +382,7 @@ def register_callbacks(
         return options
 
     @app.callback(Input("clear-button", "n_clicks"), prevent_initial_call=True)
+    @_timed_callback
     def clear_data(n_clicks):
         """Clear data button callback"""
         if n_clicks>0:
@@ -54,22 +390,19 @@ def register_callbacks(
             # also tries to clear notifications.
             notification_manager.clear_notification()
             # also handle clear data functionality
-            if len(monitoring_state.collected_data) == 0:
+            if not monitoring_state.samples:
                 logging.warning("No data to clear.")
                 notification_manager.set_notification(
                     "No data to clear.", "notification-error", priority=3
                 )
             else:
-                monitoring_state.collected_data.drop(
-                    monitoring_state.collected_data.index, inplace=True
-                )
-                monitoring_state.total_points = 0
-                logging.info("Data cleared.")
+                monitoring_state.clear_data()
                 notification_manager.set_notification(
                     "Data cleared.", "notification-success", priority=3
                 )
             
     @app.callback(Input("save-to-db-dropdown", "value"))
+    @_timed_callback
     def handle_save_to_db(save_value):
         """Handle save to DB dropdown changes"""
 
@@ -88,7 +421,82 @@ def register_callbacks(
             priority=3,
         )
 
+    @app.callback(Input("process-collection-checklist", "value"), Input("interval-input", "value"))
+    @_timed_callback
+    def handle_process_collection(value, interval):
+        """Switch the optional collectors on or off"""
+        monitoring_state.process_top_k = PROCESS_TOP_K if "on" in (value or []) else 0
+        monitoring_state.collect_frames = "frames" in (value or [])
+        monitoring_state.collect_cores = "cores" in (value or [])
+        monitoring_state.collect_net = "net" in (value or [])
+        monitoring_state.collect_logcat = "logcat" in (value or [])
+        monitoring_state.streaming = "stream" in (value or [])
+        monitoring_state.backfill = "backfill" in (value or [])
+        monitoring_state.alerts_enabled = "alerts" in (value or [])
+        interval = interval or 1
+        monitoring_state.adaptive_range = (
+            (max(ADAPTIVE_MIN_INTERVAL, interval / ADAPTIVE_FACTOR), interval * ADAPTIVE_FACTOR)
+            if "adaptive" in (value or []) else None
+        )
+        monitoring_state.power_rate_hz = POWER_RATE_HZ if "power" in (value or []) else 0
+
+    @app.callback(Input("target-package-input", "value"))
+    @_timed_callback
+    def handle_target_package(package):
+        """Sample a package from /proc along with the system metrics"""
+        monitoring_state.target_package = (package or "").strip() or None
+
+    @app.callback(
+        Input("burst-button", "n_clicks"),
+        State("burst-duration-input", "value"),
+        prevent_initial_call=True,
+    )
+    @_timed_callback
+    def handle_burst(n_clicks, duration):
+        """Record the monitored device at BURST_RATE_HZ for a few seconds, shown under Burst"""
+        if not n_clicks:
+            return
+        if not monitoring_state.monitoring_active:
+            notification_manager.set_notification(
+                "Start monitoring a device before a burst capture.", "notification-error", priority=4
+            )
+        elif monitoring_controller.capture_burst(duration or 10, BURST_RATE_HZ):
+            notification_manager.set_notification(
+                f"Burst capture running for {duration or 10}s...", "notification-success", priority=3
+            )
+        else:
+            notification_manager.set_notification("A burst capture is already running.", "notification-error", priority=3)
+
+    @app.callback(Input("logcat-filter-input", "value"))
+    @_timed_callback
+    def handle_logcat_filter(text):
+        """Logcat filterspecs, applied on the device when the stream (re)starts"""
+        try:
+            monitoring_state.logcat_filter = parse_filter_specs(text)
+        except ValueError as e:
+            notification_manager.set_notification(str(e), "notification-error", priority=4)
+
+    @app.callback(
+        Output("logcat-results", "children"),
+        [
+            Input("interval-component", "n_intervals"),
+            Input("logcat-search-input", "value"),
+        ],
+    )
+    @_timed_callback
+    def update_logcat_results(_, text):
+        """Newest logcat lines of the device, or the newest matches of the search"""
+        serial = connection_manager.device_info.get("persistent_id")
+        if not serial or not (monitoring_state.collect_logcat or text):
+            return []
+        rows = search_logcat(serial, (text or "").strip() or None, limit=LOGCAT_RESULTS)
+        return [
+            html.Div(f"{timestamp[11:]} {priority}/{tag}({pid}): {message}", className=f"log-line log-{priority}")
+            for timestamp, priority, tag, pid, message in rows
+        ]
+
     @app.callback([Input("wifi-connect-button", "n_clicks")],[State("device-dropdown", "value")])
+    @_timed_callback
     def handle_wifi_connect(n_clicks,selected_device):
         """Handle Wi-Fi connect button clicks"""
         if n_clicks > 0:
@@ -114,6 +522,179 @@ def register_callbacks(
                     logging.info("No USB connection was found for selected device.")
                     notification_manager.set_notification("Device must be connected via USB first.","notification-error",priority=5)
 
+    @app.callback(Input("wifi-fleet-button", "n_clicks"), prevent_initial_call=True)
+    @_timed_callback
+    def handle_wifi_fleet(n_clicks):
+        """Move every USB-attached device to Wi-Fi, progress is shown in the results table"""
+        if fleet.start():
+            notification_manager.set_notification(
+                "Connecting all USB devices via Wi-Fi...", "notification-info", priority=3
+            )
+        else:
+            notification_manager.set_notification(
+                "A Wi-Fi bring-up is already running.", "notification-error", priority=3
+            )
+
+    @app.callback(Output("wifi-fleet-results", "children"), Input("device-check-interval", "n_intervals"))
+    @_timed_callback
+    def update_wifi_fleet_results(_):
+        """One row per device of the last Wi-Fi bring-up"""
+        rows = fleet.rows()
+        if not rows:
+            return []
+        header = html.Tr([html.Th(label) for label in ("Serial", "Status", "Endpoint", "Step", "Tries", "s")])
+        return html.Table([header] + [
+            html.Tr([
+                html.Td(row["serial"]),
+                html.Td(row["status"], className=f"fleet-{row['status']}"),
+                html.Td(row["endpoint"] or ""),
+                html.Td(row["detail"]),
+                html.Td(row["attempts"]),
+                html.Td(f"{row['seconds']:.1f}" if row["seconds"] is not None else ""),
+            ])
+            for row in rows
+        ], className="fleet-table")
+
+    @app.callback(
+        Output("stats-table", "children"),
+        [
+            Input("interval-component", "n_intervals"),
+            Input("metric-selector-dropdown", "value"),
+            Input("specific-metrics-dropdown", "value"),
+        ],
+    )
+    @_timed_callback
+    def update_stats_table(_, metric, selected_metrics):
+        """Session and last-minute statistics of the metrics shown on the plot"""
+        stats = monitoring_state.stats
+        # bursts and processes are not part of the samples
+        if metric not in GRAPH_LABELS or metric == "burst":
+            metrics = []
+        elif selected_metrics:
+            metrics = selected_metrics
+        elif "prefixes" in GRAPH_LABELS[metric]:
+            metrics = category_metrics(metric, stats.names(), default=True)
+        else:
+            metrics = GRAPH_LABELS[metric]["all_metrics"]
+        rows = [(name, stats.summary(name)) for name in metrics]
+        rows = [(name, summary) for name, summary in rows if summary]
+        if not rows:
+            return []
+        columns = ("last", "mean", "std", "min", "max", "p50", "p90", "p99", "window_p90", "ewma")
+        header = html.Tr([html.Th("Metric")] + [html.Th(STATS_HEADERS.get(c, c)) for c in columns])
+        return html.Table([header] + [
+            html.Tr([html.Td(name)] + [html.Td(_format_stat(summary[c])) for c in columns])
+            for name, summary in rows
+        ], className="stats-table")
+
+    @app.callback(Input("new-session-button", "n_clicks"), State("session-label-input", "value"),
+                  prevent_initial_call=True)
+    @_timed_callback
+    def handle_new_session(n_clicks, label):
+        """End the running session and start a new one with the label, monitoring goes on"""
+        if not monitoring_state.monitoring_active:
+            notification_manager.set_notification(
+                "Start monitoring to begin a session.", "notification-error", priority=3
+            )
+            return
+        session_id = monitoring_controller.start_session((label or "").strip() or None)
+        notification_manager.set_notification(
+            f"Session #{session_id} started." if session_id else "Session started, it is not saved.",
+            "notification-success", priority=3,
+        )
+
+    @app.callback(
+        Output("session-a-dropdown", "options"),
+        Output("session-b-dropdown", "options"),
+        Input("device-check-interval", "n_intervals"),
+    )
+    @_timed_callback
+    def update_session_options(_):
+        """Finished sessions of all devices, newest first"""
+        options = [
+            {"label": session_name(session), "value": session["id"]}
+            for session in list_sessions(limit=SESSION_CHOICES) if session["ended"]
+        ]
+        return options, options
+
+    @app.callback(
+        Output("session-metric-dropdown", "options"),
+        Output("session-metric-dropdown", "value"),
+        Input("session-a-dropdown", "value"),
+        Input("session-b-dropdown", "value"),
+        State("session-metric-dropdown", "value"),
+    )
+    @_timed_callback
+    def update_session_metrics(session_a, session_b, metric):
+        """Metrics summarized in all picked sessions, keeping the current choice where possible"""
+        session_ids = [s for s in (session_a, session_b) if s is not None]
+        if not session_ids:
+            return [], None
+        summaries = load_session_summaries(session_ids)
+        metrics = sorted(set.intersection(*(set(summary) for summary in summaries.values())))
+        if metric not in metrics:
+            metric = COMPARE_DEFAULT_METRIC if COMPARE_DEFAULT_METRIC in metrics else next(iter(metrics), None)
+        return metrics, metric
+
+    @app.callback(
+        Output("session-compare-plot", "figure"),
+        Output("session-compare-table", "children"),
+        Input("session-a-dropdown", "value"),
+        Input("session-b-dropdown", "value"),
+        Input("session-metric-dropdown", "value"),
+    )
+    @_timed_callback
+    def update_session_comparison(session_a, session_b, metric):
+        """Stored summaries and downsampled series of the picked sessions, no sample is read"""
+        session_ids = [s for s in (session_a, session_b) if s is not None]
+        if not session_ids or not metric:
+            return build_comparison_figure([], [], metric), []
+        by_id = {session["id"]: session for session in list_sessions(session_ids=session_ids)}
+        sessions = [by_id[s] for s in session_ids if s in by_id]
+        series = load_session_series(session_ids, metric)
+        figure = build_comparison_figure(
+            [series[s["id"]] for s in sessions], [session_name(s) for s in sessions], metric
+        )
+        return figure, build_comparison_table(sessions, load_session_summaries(session_ids), metric)
+
+    def download_links(**params):
+        """hrefs of the CSV and Parquet downloads of these query parameters"""
+        path = app.get_relative_path("/download")
+        return tuple(f"{path}?{urlencode({**params, 'format': fmt})}" for fmt in ("csv", "parquet"))
+
+    @app.callback(
+        Output("session-csv-link", "href"),
+        Output("session-parquet-link", "href"),
+        Output("session-csv-link", "style"),
+        Output("session-parquet-link", "style"),
+        Input("session-a-dropdown", "value"),
+    )
+    @_timed_callback
+    def update_session_download(session_a):
+        """All samples of session A"""
+        if session_a is None:
+            return "", "", {"display": "none"}, {"display": "none"}
+        return (*download_links(session=session_a), {}, {})
+
+    @app.callback(
+        Output("device-csv-link", "href"),
+        Output("device-parquet-link", "href"),
+        Output("device-download-row", "style"),
+        Input("device-check-interval", "n_intervals"),
+        Input("specific-metrics-dropdown", "value"),
+    )
+    @_timed_callback
+    def update_device_download(_, selected_metrics):
+        """All stored samples of the monitored device, only the selected metrics when there are some"""
+        serial = connection_manager.device_info.get("persistent_id")
+        if not serial:
+            return "", "", {"display": "none"}
+        params = {"device": serial}
+        metrics = [m for m in selected_metrics or [] if m in DOWNLOAD_COLUMNS]
+        if metrics:
+            params["metrics"] = ",".join(metrics)
+        return (*download_links(**params), {})
+
     @app.callback(
     Output("mini-cpu-user", "children"),
     Output("mini-cpu-sys", "children"),
@@ -123,8 +704,9 @@ def register_callbacks(
     Output("mini-batt-level", "children"),
     Input("interval-component", "n_intervals")
     )
+    @_timed_callback
     def update_mini_metrics(n_intervals):
-        latest = monitoring_state.collected_data.iloc[-1] if not monitoring_state.collected_data.empty else {}
+        latest = monitoring_state.latest()
         return (
             latest.get("cpu_user", "--"),
             latest.get("cpu_sys", "--"),
@@ -145,6 +727,7 @@ def register_callbacks(
             Input("notification-clear-interval", "n_intervals"),
         ],prevent_initial_call=True,
     )
+    @_timed_callback
     def notification_handler(
         interval_check,
         notification_clear_interval,
@@ -180,89 +763,35 @@ def register_callbacks(
         [
             State("app-plot", "figure"),
             State("available-metrics-store", "data"),
+            State("logcat-search-input", "value"),
         ],
     )
-
-    def update_graph(_, stop_clicks, metric, selected_metrics, current_fig, available_metrics):
-        fig = go.Figure()
-        df = monitoring_state.collected_data
-
-        labels = {
-            "cpu": {
-                "all_metrics": [
-                    "cpu_cpu", "cpu_user", "cpu_nice", "cpu_sys", "cpu_idle",
-                    "cpu_iow", "cpu_irq", "cpu_sirq", "cpu_host"
-                ],
-                "ylabel": "CPU Usage (%)",
-                "max": 100,
-            },
-            "mem": {
-                "all_metrics": [
-                    "mem_total", "mem_used", "mem_free", "mem_buffers",
-                    "swap_total", "swap_used", "swap_free", "swap_cached"
-                ],
-                "ylabel": "Memory (MB)",
-                "max": 4096,
-            },
-            "task": {
-                "all_metrics": [
-                    "tasks_total", "tasks_running", "tasks_sleeping",
-                    "tasks_stopped", "tasks_zombie"
-                ],
-                "ylabel": "Task Count",
-                "max": 100,
-            },
-            "battery": {
-                "all_metrics": ["battery_level", "battery_temp"],
-                "ylabel": "Battery",
-                "max": 100,
-            },
-            "swap": {
-                "all_metrics": ["swap_total", "swap_used", "swap_free", "swap_cached"],
-                "ylabel": "Swap (MB)",
-                "max": 1024 
-            }
-        }
-
-        if metric in labels:
-            all_metrics = labels[metric]["all_metrics"]
-            ylabel = labels[metric]["ylabel"]
-            y_max = labels[metric]["max"]
+    @_timed_callback
+    def update_graph(_, stop_clicks, metric, selected_metrics, current_fig, available_metrics, log_search):
+        if metric == "proc":
+            fig = build_process_figure(list(monitoring_state.process_samples), selected_metrics)
+        elif metric == "burst":
+            import pandas as pd
+
+            burst = monitoring_state.burst
+            return build_figure(burst if burst is not None else pd.DataFrame(), metric, selected_metrics)
         else:
-            all_metrics = []
-            ylabel = "Value"
-            y_max = 100
-
-        # Only keep selected metrics if any are chosen, else all by default
-        metrics = [m for m in all_metrics if selected_metrics and m in selected_metrics] or all_metrics
-
-        # Add traces for all selected metrics
-        if not df.empty:
-            for m in metrics:
-                name = m.replace("swap_", "").capitalize()
-                ydata = df[m] if m in df.columns else [0] * len(df)
-                fig.add_trace(
-                    go.Scatter(
-                        x=df["timestamp"],
-                        y=ydata,
-                        mode="lines+markers",
-                        name=name
-                    )
-                )
-
-        fig.update_layout(
-            title="",
-            xaxis_title="Time",
-            yaxis_title=ylabel,
-            legend=dict(
-                orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1
-            ),
-            margin=dict(l=40, r=40, t=50, b=40),
-            hovermode="closest",
-            template="plotly_white",
-            yaxis=dict(range=[0, y_max], autorange=True),
-        )
-
+            fig = build_figure(
+                monitoring_state.collected_data, metric, selected_metrics, list(monitoring_state.backfilled_ranges)
+            )
+        serial = connection_manager.device_info.get("persistent_id")
+        if monitoring_state.collect_logcat and serial and monitoring_state.samples:
+            # warnings and errors in the plotted window, or the matches of the search when there is one
+            text = (log_search or "").strip() or None
+            rows = search_logcat(
+                serial,
+                text,
+                start=format_timestamp(monitoring_state.samples[0]["timestamp"]),
+                end=format_timestamp(monitoring_state.latest()["timestamp"]),
+                priorities=None if text else "WEF",
+                limit=LOGCAT_OVERLAY,
+            )
+            add_log_overlay(fig, rows)
         return fig
 
     @app.callback(
@@ -271,6 +800,7 @@ def register_callbacks(
         Output("available-metrics-store", "data")],
         [Input("metric-selector-dropdown", "value")]
     )
+    @_timed_callback
     def update_specific_metrics_options(metric_category):
         """Update the specific metrics dropdown options based on the selected category."""
         if metric_category == "cpu":
@@ -311,6 +841,57 @@ def register_callbacks(
                 {"label": "Swap Free", "value": "swap_free"},
                 {"label": "Swap Cached", "value": "swap_cached"},
             ]
+        elif metric_category == "power":
+            metrics = [
+                {"label": "Average Power", "value": "power_mw"},
+                {"label": "Peak Power", "value": "power_peak_mw"},
+                {"label": "Energy per Interval", "value": "energy_mj"},
+                {"label": "Current", "value": "power_current_ma"},
+                {"label": "Voltage", "value": "power_voltage_v"},
+            ]
+        elif metric_category == "app":
+            metrics = [
+                {"label": "CPU (% of one core)", "value": "app_cpu"},
+                {"label": "RSS", "value": "app_rss_mb"},
+                {"label": "PSS", "value": "app_pss_mb"},
+                {"label": "Swap", "value": "app_swap_mb"},
+            ]
+        elif metric_category == "frames":
+            metrics = [
+                {"label": "Jank %", "value": "gfx_jank_pct"},
+                {"label": "Frame time p50", "value": "gfx_p50_ms"},
+                {"label": "Frame time p90", "value": "gfx_p90_ms"},
+                {"label": "Frame time p99", "value": "gfx_p99_ms"},
+                {"label": "Missed vsync", "value": "gfx_missed_vsync"},
+                {"label": "App CPU", "value": "app_cpu"},
+            ]
+        elif metric_category == "burst":
+            metrics = [
+                {"label": "CPU (all cores)", "value": "cpu_pct"},
+                {"label": "Used Memory", "value": "mem_used"},
+                {"label": "Available Memory", "value": "mem_available"},
+                {"label": "Cached", "value": "mem_cached"},
+                {"label": "Power", "value": "power_mw"},
+                {"label": "Current", "value": "power_current_ma"},
+            ]
+        elif metric_category == "cores":
+            # cores and thermal zones differ per device, offer what the latest sample has
+            metrics = [
+                {"label": key.replace("_", " ").capitalize(), "value": key}
+                for key in category_metrics("cores", monitoring_state.latest())
+            ]
+        elif metric_category == "net":
+            # interfaces differ per device, offer what the latest sample has
+            metrics = [
+                {"label": key.removeprefix("net_").replace("_", " "), "value": key}
+                for key in category_metrics("net", monitoring_state.latest())
+            ]
+        elif metric_category == "proc":
+            # processes seen so far, busiest first
+            metrics = [
+                {"label": name, "value": name}
+                for name in top_process_names(list(monitoring_state.process_samples), limit=None)
+            ]
         else:
             metrics = []
         
@@ -325,6 +906,7 @@ def register_callbacks(
     Output("chip-points", "children"),
     Input("interval-component", "n_intervals")
     )
+    @_timed_callback
     def _chip_update(_):
         status = "Active" if monitoring_state.monitoring_active else ("Paused" if monitoring_state.monitoring_paused else "Idle")
         dev = connection_manager.device_info.get("model","–")
@@ -337,6 +919,7 @@ def register_callbacks(
     Output("device-id-conn", "children"),
     Input("interval-component", "n_intervals")
     )
+    @_timed_callback
     def update_device_title(_):
         dev = connection_manager.device_info.get("model", "No Device")
         conn = connection_manager.device_info.get("connection_type", "")
@@ -357,11 +940,16 @@ def register_callbacks(
             Input("stop-button", "n_clicks"),
             Input("device-check-interval", "n_intervals"),
         ],
-        [State("interval-input", "value"), State("device-dropdown", "value")],
+        [
+            State("interval-input", "value"),
+            State("device-dropdown", "value"),
+            State("session-label-input", "value"),
+        ],
         prevent_initial_call=True,
     )
+    @_timed_callback
     def manage_monitoring(
-        start_clicks, stop_clicks, n_intervals, interval_value, selected_device
+        start_clicks, stop_clicks, n_intervals, interval_value, selected_device, session_label
     ):
         ctx = dash.callback_context
         trigger_id = (
@@ -401,7 +989,8 @@ def register_callbacks(
                     monitoring_state.current_device = selected_device
                     logging.info(f"Device which is selected for monitoring is : {monitoring_state.current_device}")
                     success = monitoring_controller.start_monitoring(
-                        monitoring_interval=interval_value, selected_device_id=selected_device
+                        monitoring_interval=interval_value, selected_device_id=selected_device,
+                        label=(session_label or "").strip() or None,
                     )
                     logging.info(f"Monitoring started: {success}")
                 except Exception as e:
@@ -50,7 +50,9 @@ def create_layout():
                         html.Div([
                             html.Button('Refresh', id='refresh-button', n_clicks=0, className="btn"),
                             html.Button('Wi‑Fi Connect', id='wifi-connect-button', n_clicks=0, className="btn secondary"),
-                        ], className="row gap")
+                            html.Button('Wi‑Fi All', id='wifi-fleet-button', n_clicks=0, className="btn secondary"),
+                        ], className="row gap"),
+                        html.Div(id='wifi-fleet-results', className="fleet-results"),
                     ])
                 ], className="card"),
                 html.Div([
@@ -67,6 +69,42 @@ def create_layout():
                             className="ddl compact"
                         ),
                     ], className="row gap wrap"),
+                    dcc.Input(
+                        id='target-package-input', type='text', debounce=True,
+                        placeholder="Target package (optional)", className="w-100"
+                    ),
+                    dcc.Checklist(
+                        id='process-collection-checklist',
+                        options=[
+                            {'label': ' Record top processes', 'value': 'on'},
+                            {'label': ' Frame stats (target app)', 'value': 'frames'},
+                            {'label': ' Per-core frequency & thermal', 'value': 'cores'},
+                            {'label': ' Power & energy (10 Hz)', 'value': 'power'},
+                            {'label': ' Network throughput', 'value': 'net'},
+                            {'label': ' Logcat (searchable)', 'value': 'logcat'},
+                            {'label': ' Stream from an on-device loop', 'value': 'stream'},
+                            {'label': ' Backfill disconnects from the device', 'value': 'backfill'},
+                            {'label': ' Adaptive interval (¼× to 4×)', 'value': 'adaptive'},
+                            {'label': ' Alerts (CPU, thermal, battery, memory)', 'value': 'alerts'},
+                        ],
+                        value=['alerts'], className="row gap"
+                    ),
+                    dcc.Input(
+                        id='logcat-filter-input', type='text', debounce=True,
+                        placeholder="Logcat filter, e.g. ActivityManager:I *:W", className="w-100"
+                    ),
+                    html.Div([
+                        html.Button('Burst', id='burst-button', n_clicks=0, className="btn secondary"),
+                        dcc.Input(id='burst-duration-input', type='number', min=1, max=120, value=10, className="num"),
+                        html.Span("s at 10 Hz", className="unit"),
+                    ], className="row gap"),
+                    html.Div([
+                        dcc.Input(
+                            id='session-label-input', type='text',
+                            placeholder="Session label, e.g. build 1234", className="grow"
+                        ),
+                        html.Button('New session', id='new-session-button', n_clicks=0, className="btn secondary"),
+                    ], className="row gap"),
                     html.Div([
                         html.Button('Start', id='start-button', n_clicks=0, className="btn primary"),
                         html.Button('Stop', id='stop-button', n_clicks=0, disabled=True, className="btn danger"),
@@ -83,7 +121,14 @@ def create_layout():
                                 {'label': 'Memory', 'value': 'mem'},
                                 {'label': 'Task', 'value': 'task'},
                                 {'label': 'Battery', 'value': 'battery'},
+                                {'label': 'Power', 'value': 'power'},
                                 {"label": "Swap", "value": "swap"},
+                                {"label": "Processes", "value": "proc"},
+                                {"label": "Target app", "value": "app"},
+                                {"label": "Frames", "value": "frames"},
+                                {"label": "Cores & thermal", "value": "cores"},
+                                {"label": "Network", "value": "net"},
+                                {"label": "Burst (100ms)", "value": "burst"},
                             ], value='cpu', clearable=False, searchable=False,
                             className="ddl sm"
                         ),
@@ -95,6 +140,11 @@ def create_layout():
                             className="ddl lg"
                         ),
                     ], className="row gap wrap"),
+                    html.Div([
+                        html.Label("download", className="lbl"),
+                        html.A("CSV", id='device-csv-link', href="", target="_blank", className="dl-link"),
+                        html.A("Parquet", id='device-parquet-link', href="", target="_blank", className="dl-link"),
+                    ], id='device-download-row', className="row gap", style={'display': 'none'}),
                 ], className="card"),
             ], className="col left"),
 
@@ -133,7 +183,34 @@ def create_layout():
                             html.Div("Battery", className="mini-k"),
                             html.Div(id="mini-batt-level", className="mini-v")
                         ], className="mini"),
-                    ], className="mini-grid")
+                    ], className="mini-grid"),
+                    html.Div(id="stats-table", className="stats-results"),
+                ], className="card"),
+                html.Div([
+                    dcc.Input(
+                        id='logcat-search-input', type='text', debounce=True,
+                        placeholder="Search logcat (tag or message words, FTS5 syntax works too)", className="w-100"
+                    ),
+                    html.Div(id='logcat-results', className="log-lines"),
+                ], className="card"),
+                html.Div([
+                    html.Div([
+                        html.Label("Compare", className="lbl"),
+                        dcc.Dropdown(id='session-a-dropdown', options=[], placeholder="Session A", className="ddl lg"),
+                        dcc.Dropdown(id='session-b-dropdown', options=[], placeholder="Session B", className="ddl lg"),
+                        dcc.Dropdown(
+                            id='session-metric-dropdown', options=[], clearable=False, placeholder="Metric",
+                            className="ddl compact"
+                        ),
+                        html.A("CSV", id='session-csv-link', href="", target="_blank", className="dl-link"),
+                        html.A("Parquet", id='session-parquet-link', href="", target="_blank", className="dl-link"),
+                    ], className="row gap wrap"),
+                    dcc.Graph(
+                        id='session-compare-plot',
+                        style={'height': '320px', 'width': '100%'},
+                        config={"displayModeBar": False}
+                    ),
+                    html.Div(id='session-compare-table', className="stats-results"),
                 ], className="card"),
             ], className="col right"),
         ], className="grid-2"),
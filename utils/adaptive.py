@@ -0,0 +1,68 @@
+import math
+
+# Watched sample keys and the change per second that counts as fast (CPU in %, memory in MB)
+WATCHED_METRICS = {"cpu_user": 5.0, "cpu_sys": 5.0, "mem_used": 50.0}
+
+# Weight of the newest activity in its moving average
+ACTIVITY_ALPHA = 0.3
+
+# Averaged activity below this for CALM_SAMPLES samples in a row backs off
+CALM_ACTIVITY = 0.2
+CALM_SAMPLES = 3
+
+# Factor by which the interval grows when calm, it halves at once on a fast change
+BACKOFF_FACTOR = 1.5
+
+
+class AdaptiveInterval:
+    """Moves the sampling interval between a minimum and a maximum with the signal's activity
+
+    Activity is the largest rate of change of the watched metrics, each scaled by the
+    rate that counts as fast, so 1.0 is a fast change of at least one metric. A single
+    fast sample halves the interval (spikes are short), while backing off needs several
+    calm samples in a row and grows the interval by BACKOFF_FACTOR, so one quiet reading
+    in the middle of a burst does not slow sampling down.
+    """
+
+    def __init__(self, min_interval, max_interval):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.reset()
+
+    def reset(self):
+        self.previous = None
+        self.activity = 0.0
+        self.calm = 0
+
+    def update(self, data, interval):
+        """Feed one sample taken at `interval`, returns (new interval, reason) or None to keep it"""
+        values = {key: data.get(key) for key in WATCHED_METRICS}
+        previous, self.previous = self.previous, (data["timestamp"], values)
+        if previous is None:
+            return self._clamp(interval)
+        elapsed = (data["timestamp"] - previous[0]).total_seconds()
+        if elapsed <= 0:
+            return None
+
+        activity = 0.0
+        for key, fast in WATCHED_METRICS.items():
+            if values[key] is None or previous[1][key] is None:
+                continue
+            activity = max(activity, abs(values[key] - previous[1][key]) / elapsed / fast)
+        self.activity = ACTIVITY_ALPHA * activity + (1 - ACTIVITY_ALPHA) * self.activity
+
+        if activity >= 1.0:
+            self.calm = 0
+            new_interval = round(max(self.min_interval, interval / 2), 2)
+            return (new_interval, "fast") if new_interval < interval else None
+        self.calm = self.calm + 1 if self.activity < CALM_ACTIVITY else 0
+        if self.calm >= CALM_SAMPLES:
+            self.calm = 0
+            new_interval = round(min(self.max_interval, interval * BACKOFF_FACTOR), 2)
+            return (new_interval, "steady") if new_interval > interval else None
+        return None
+
+    def _clamp(self, interval):
+        """Bring an interval set outside the range into it"""
+        clamped = min(max(interval, self.min_interval), self.max_interval)
+        return None if math.isclose(clamped, interval) else (clamped, "range")
@@ -2,23 +2,51 @@ import subprocess
 import time
 import re
 import logging
-import os
+
+from utils.metrics import ADB_COMMAND_SECONDS, ADB_COMMAND_ERRORS
+from utils.timing import DEVICE_TIME_COMMAND
+from utils.parsers import parse_battery_status
 
 logging.basicConfig(level=logging.INFO, format="%(name)s: %(asctime)s | %(levelname)s | %(filename)s:%(lineno)s >>> %(message)s", datefmt="%d-%m-%YT%H:%M:%SZ")
 
+# How long a transport gets to come up after adb tcpip or adb connect, and how often it is polled
+READY_TIMEOUT = 10
+READY_POLL_INTERVAL = 0.25
+
 # Run adb commands.
-def run_adb_command(cmd, device_id=None):
-    """Run an adb command and return the output."""
+def run_adb_command(cmd, device_id=None, check=False):
+    """Run an adb command and return the output.
+
+    None on a timeout, and with check=True also when adb exits with an error.
+    """
     base_cmd = ['adb']
     if device_id:
         base_cmd += ['-s', device_id]
     base_cmd += cmd
+    command_type = command_label(cmd)
+    start = time.perf_counter()
     try:
         result = subprocess.run(base_cmd, capture_output=True, text=True, timeout=10)
+        if result.returncode != 0:
+            ADB_COMMAND_ERRORS.inc(command_type)
+            if check:
+                logging.error(f"Command {cmd} failed: {(result.stderr or result.stdout).strip()}")
+                return None
         return result.stdout.strip()
     except subprocess.TimeoutExpired:
+        ADB_COMMAND_ERRORS.inc(command_type)
         logging.error(f"Command {cmd} timed out.")
         return None
+    finally:
+        ADB_COMMAND_SECONDS.observe(time.perf_counter() - start, command_type)
+
+# Short label for an adb command, e.g. "shell top" or "get-state"
+def command_label(cmd):
+    if cmd and cmd[0] == 'shell' and len(cmd) > 1:
+        # label timed commands by the wrapped command, not by date
+        body = cmd[1].removeprefix(f"{DEVICE_TIME_COMMAND};").split()
+        return f"shell {body[0]}" if body else "shell"
+    return cmd[0] if cmd else ""
 
 # To get the connected devices
 def get_connected_device():
@@ -97,21 +125,53 @@ def get_device_model(device_id):
 # Extract ip of device
 def get_device_ip(device_id):
     output = run_adb_command(['shell', 'ip', 'addr', 'show', 'wlan0'], device_id)
-    match = re.search(r'inet\s+(\d+\.\d+\.\d+\.\d+)', output)
+    # None when adb timed out, the caller retries like for a missing address
+    match = re.search(r'inet\s+(\d+\.\d+\.\d+\.\d+)', output or '')
     return match.group(1) if match else None
 
+# List device ids with their state ("device", "offline", "unauthorized"...) from one adb call
+def list_devices():
+    output = run_adb_command(['devices'])
+    devices = {}
+    for line in (output or '').splitlines()[1:]:
+        parts = line.split()
+        if len(parts) >= 2:
+            devices[parts[0]] = parts[1]
+    return devices
+
+# Poll get-state until the device is usable, returns False on timeout.
+def wait_for_device(device_id, timeout=READY_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while True:
+        state = run_adb_command(['get-state'], device_id)
+        if state and 'device' in state.lower():
+            return True
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(READY_POLL_INTERVAL)
+
 # Establish connection through wifi.
 def connect_wifi_adb(device_id, ip, port=5555):
     logging.info(f"Enabling ADB over TCP/IP on port {port}...")
     run_adb_command(['tcpip', str(port)], device_id)
-    time.sleep(2)
+    # adbd restarts in TCP mode, connect as soon as it listens instead of sleeping a fixed time
     logging.info(f"Trying to connect to {ip}:{port}...")
-    output = run_adb_command(['connect', f'{ip}:{port}'])
-    if output and 'connected' in output.lower():
-        logging.info(f"Connected to {ip}:{port}")
-        return True
-    logging.error(f"Could not connect to {ip}:{port}: {output}")
-    return False
+    deadline = time.monotonic() + READY_TIMEOUT
+    while True:
+        output = run_adb_command(['connect', f'{ip}:{port}'])
+        # "failed to connect" and "unable to connect" while adbd is still restarting
+        if output and 'connected' in output.lower():
+            break
+        if time.monotonic() > deadline:
+            logging.error(f"Could not connect to {ip}:{port}: {output}")
+            return False
+        time.sleep(READY_POLL_INTERVAL)
+    # a fresh TCP transport is "offline" until adbd answers on it
+    if not wait_for_device(f'{ip}:{port}', timeout=max(deadline - time.monotonic(), READY_POLL_INTERVAL)):
+        logging.error(f"{ip}:{port} connected but the device did not come online")
+        return False
+    logging.info(f"Connected to {ip}:{port}")
+    return True
 
 # Get serial number of device
 def get_device_serial(device_id):
@@ -138,47 +198,4 @@ def check_initial_devices():
 # To Check the battery status
 def get_battery_status(device_id):
     output = run_adb_command(['shell', 'dumpsys', 'battery'], device_id)
-    battery_info = {}
-    for line in output.splitlines():
-        line = line.strip()
-        if line.startswith('level:'):
-            battery_info['level'] = int(line.split(':')[1].strip())
-        elif line.startswith('temperature:'):
-            battery_info['temperature'] = int(line.split(':')[1].strip()) / 10.0
-        elif line.startswith('status:'):
-            raw_status = line.split(':')[1].strip()
-
-            # Some devices output numeric codes (Android standard)
-            # 1=Unknown, 2=Charging, 3=Discharging, 4=Not Charging, 5=Full
-            mapping = {
-                "1": "Unknown",
-                "2": "Charging",
-                "3": "Discharging",
-                "4": "Not Charging",
-                "5": "Full"
-            }
-
-            # If numeric, convert using map; else assume it's already a word
-            battery_info['charging_status'] = mapping.get(raw_status, raw_status)
-        elif line.startswith('health:'):
-            raw_health = line.split(':')[1].strip()
-
-            # Android numeric health codes:
-            health_map = {
-                "1": "Unknown",
-                "2": "Good",
-                "3": "Overheat",
-                "4": "Dead",
-                "5": "Over Voltage",
-                "6": "Unspecified Failure",
-                "7": "Cold"
-            }
-
-            # If numeric, convert. Otherwise store raw text.
-            battery_info['battery_health'] = health_map.get(raw_health, raw_health)
-    return battery_info
-    
-
-    # Check at startup
-if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
-    has_devices = check_initial_devices()
\ No newline at end of file
+    return parse_battery_status(output or '')
@@ -0,0 +1,122 @@
+import logging
+import os
+import subprocess
+import tempfile
+
+from utils.adb import run_adb_command
+
+# Script pushed to the device, overwritten on every start
+AGENT_PATH = "/data/local/tmp/telemetry_agent.sh"
+
+# Lines framing each record of the stream, followed by the record's sequence number
+RECORD_MARKER = "@@record"
+END_MARKER = "@@end"
+
+# Echoed before dumpsys battery in the streamed command, the polled mode reads it with its own adb call
+BATTERY_MARKER = "@@battery"
+
+
+def agent_script(command, interval):
+    """Device shell loop running `command` every `interval` seconds, each run framed as one record
+
+    Runs start on a fixed schedule: the loop sleeps for what is left of the interval after
+    the command, timed with /proc/uptime (centiseconds, read with a builtin), so the record
+    rate does not drift by the command's runtime. A run longer than the interval starts the
+    next one right away and the schedule restarts from there, missed runs are not caught up.
+
+    The loop has no end of its own: once the host goes away the next echo fails on the
+    closed stdout and the shell exits with it.
+    """
+    period = max(round(interval * 100), 1)
+    return (
+        "n=0\n"
+        "read up idle < /proc/uptime; next=${up%.*}${up#*.}\n"
+        "while :; do\n"
+        f"  echo {RECORD_MARKER} $n\n"
+        f"  {command}\n"
+        f"  echo {END_MARKER} $n\n"
+        "  n=$((n+1))\n"
+        f"  next=$((next+{period}))\n"
+        "  read up idle < /proc/uptime; now=${up%.*}${up#*.}\n"
+        "  left=$((next-now))\n"
+        "  if [ $left -gt 0 ]; then\n"
+        "    cs=$((left%100)); [ $cs -lt 10 ] && cs=0$cs\n"
+        "    sleep $((left/100)).$cs\n"
+        "  else\n"
+        "    next=$now\n"
+        "  fi\n"
+        "done\n"
+    )
+
+
+def frame_records(lines):
+    """Group streamed lines into records, yields (sequence number, record text) as each record ends
+
+    Lines are consumed lazily, so a record is handed on as soon as its end line arrives.
+    A record cut off by a restart or a dropped connection has no end line and is skipped.
+    """
+    sequence = None
+    body = []
+    for line in lines:
+        if line.startswith(RECORD_MARKER):
+            sequence = line[len(RECORD_MARKER):].strip()
+            body = []
+        elif line.startswith(END_MARKER):
+            if sequence is not None and line[len(END_MARKER):].strip() == sequence:
+                yield int(sequence), "".join(body)
+            sequence = None
+        elif sequence is not None:
+            body.append(line)
+
+
+class DeviceAgent:
+    """Sampling loop running on the device, streaming framed records over one `adb shell`
+
+    The command that the host would otherwise send every tick is pushed once as a shell
+    script; the device then runs it at the configured interval and writes the output to
+    a single stdout stream. The host only reads and parses, there is no adb round trip
+    or process start per sample.
+    """
+
+    def __init__(self, device_id, command, interval):
+        self.device_id = device_id
+        self.command = command
+        self.interval = interval
+        self.process = None
+
+    def start(self):
+        """Push the script and start it, returns False when either step fails"""
+        with tempfile.NamedTemporaryFile("w", suffix=".sh", delete=False, newline="\n") as f:
+            f.write(agent_script(self.command, self.interval))
+        try:
+            if run_adb_command(["push", f.name, AGENT_PATH], self.device_id, check=True) is None:
+                return False
+        finally:
+            os.unlink(f.name)
+        try:
+            self.process = subprocess.Popen(
+                ["adb", "-s", self.device_id, "shell", "sh", AGENT_PATH],
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, errors="replace",
+            )
+        except OSError as e:
+            logging.error(f"Could not start the device agent: {e}")
+            return False
+        logging.info(f"Device agent started on {self.device_id}, one record every {self.interval:g}s")
+        return True
+
+    def records(self):
+        """Records of the stream as they arrive, ends when the stream does"""
+        if self.process is None:
+            return
+        yield from frame_records(self.process.stdout)
+
+    def stop(self):
+        # also called from the thread stopping the monitoring while the records are read
+        process, self.process = self.process, None
+        if process is None or process.poll() is not None:
+            return
+        process.terminate()
+        try:
+            process.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            process.kill()
@@ -0,0 +1,180 @@
+import json
+import logging
+import operator
+import time
+from collections import deque
+
+# Fields computed from the sample before rules are checked, not stored
+DERIVED_METRICS = {
+    # share of all cores that is busy, top reports idle out of 100% per core
+    "cpu_busy_pct": lambda data: (
+        100 * (1 - data["cpu_idle"] / data["cpu_cpu"]) if data.get("cpu_cpu") and "cpu_idle" in data else None
+    ),
+}
+
+# Rules checked when no rules file is given
+DEFAULT_RULES = [
+    {"name": "cpu_pegged", "metric": "cpu_busy_pct", "op": ">", "threshold": 90, "for": 30, "severity": "warning"},
+    {"name": "thermal_runaway", "metric": "thermal_max_c", "op": ">", "threshold": 80, "for": 10,
+     "severity": "critical"},
+    {"name": "battery_hot", "metric": "battery_temp", "op": ">", "threshold": 45, "severity": "critical"},
+    {"name": "memory_jump", "metric": "mem_used", "kind": "zscore", "threshold": 4, "severity": "warning"},
+]
+
+OPERATORS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+KINDS = ("threshold", "zscore", "ewma")
+SEVERITIES = ("info", "warning", "critical")
+
+# Samples a metric needs before anomaly rules judge it, the mean and deviation are noise before
+MIN_ANOMALY_SAMPLES = 30
+
+# Seconds before the same rule notifies again, however often it flaps
+RULE_COOLDOWN = 300
+
+# Notifications per minute over all rules, the rest is only saved
+MAX_ALERTS_PER_MINUTE = 5
+
+
+def validate_rules(rules):
+    """Check rule dicts as loaded from JSON, returns them with defaults filled in, raises ValueError"""
+    if not isinstance(rules, list):
+        raise ValueError("Alert rules must be a JSON list of rule objects")
+    checked = []
+    names = set()
+    for rule in rules:
+        if not isinstance(rule, dict) or not rule.get("name") or not rule.get("metric"):
+            raise ValueError(f"Alert rule needs a name and a metric: {rule!r}")
+        rule = {"kind": "threshold", "op": ">", "for": 0, "severity": "warning", **rule}
+        if rule["name"] in names:
+            raise ValueError(f"Duplicate alert rule name: {rule['name']}")
+        names.add(rule["name"])
+        if rule["kind"] not in KINDS:
+            raise ValueError(f"Unknown alert rule kind {rule['kind']!r}, expected one of {', '.join(KINDS)}")
+        if rule["op"] not in OPERATORS:
+            raise ValueError(f"Unknown alert rule operator {rule['op']!r}, expected one of {', '.join(OPERATORS)}")
+        if rule["severity"] not in SEVERITIES:
+            raise ValueError(f"Unknown severity {rule['severity']!r}, expected one of {', '.join(SEVERITIES)}")
+        if not isinstance(rule.get("threshold"), (int, float)) or not isinstance(rule["for"], (int, float)):
+            raise ValueError(f"Alert rule {rule['name']} needs a numeric threshold and duration")
+        checked.append(rule)
+    return checked
+
+
+def load_rules(path):
+    """Read and validate a JSON rules file, raises ValueError"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            rules = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        raise ValueError(f"Could not read alert rules from {path}: {e}")
+    return validate_rules(rules)
+
+
+class CompiledRule:
+    """One rule with its comparison resolved and its sustained/active state"""
+
+    def __init__(self, rule):
+        self.rule = rule
+        self.name = rule["name"]
+        self.metric = rule["metric"]
+        self.kind = rule["kind"]
+        self.compare = OPERATORS[rule["op"]]
+        self.threshold = rule["threshold"]
+        self.duration = rule["for"]
+        self.severity = rule["severity"]
+        # when the condition started to hold, None while it does not
+        self.since = None
+        self.active = False
+        self.notified = None
+
+    def score(self, value, baseline):
+        """Value the threshold is compared with, None when the rule cannot judge yet
+
+        baseline is the (count, mean, std, ewma) of StatsEngine.baseline.
+        """
+        if self.kind == "threshold":
+            return value
+        if baseline is None:
+            return None
+        count, mean, std, ewma = baseline
+        if count < MIN_ANOMALY_SAMPLES or not std:
+            return None
+        # anomalies count both ways, the operator picks how far off is too far
+        return abs(value - (mean if self.kind == "zscore" else ewma)) / std
+
+
+class AlertEngine:
+    """Rules checked incrementally against each sample
+
+    Rules are compiled once and grouped by metric, so a sample only touches the rules of
+    the metrics it has. A rule fires when its condition has held for its duration and
+    stays active until the condition clears, so an ongoing problem is one alert. Firing
+    and clearing are both returned, notifications are limited per rule and in total.
+    """
+
+    def __init__(self, rules=None):
+        self.rules = validate_rules(DEFAULT_RULES if rules is None else rules)
+        self.by_metric = {}
+        for rule in self.rules:
+            self.by_metric.setdefault(rule["metric"], []).append(CompiledRule(rule))
+        self.derived = {name: DERIVED_METRICS[name] for name in self.by_metric if name in DERIVED_METRICS}
+        # monotonic times of recent notifications, for the overall limit
+        self.recent = deque()
+
+    def reset(self):
+        for compiled in self.by_metric.values():
+            for rule in compiled:
+                rule.since = None
+                rule.active = False
+
+    def evaluate(self, data, stats=None):
+        """Check a sample, returns [(rule, state, value, notify)] with state 'fired' or 'cleared'
+
+        stats is the StatsEngine of the samples before this one, for anomaly rules.
+        """
+        events = []
+        now = data["timestamp"].timestamp()
+        values = {name: compute(data) for name, compute in self.derived.items()}
+        for metric, compiled in self.by_metric.items():
+            value = values[metric] if metric in values else data.get(metric)
+            if value is None:
+                continue
+            baseline = stats.baseline(metric) if stats is not None else None
+            for rule in compiled:
+                score = rule.score(value, baseline)
+                if score is None:
+                    continue
+                if rule.compare(score, rule.threshold):
+                    if rule.since is None:
+                        rule.since = now
+                    if not rule.active and now - rule.since >= rule.duration:
+                        rule.active = True
+                        events.append((rule, "fired", value, self._may_notify(rule)))
+                else:
+                    rule.since = None
+                    if rule.active:
+                        rule.active = False
+                        events.append((rule, "cleared", value, False))
+        return events
+
+    def _may_notify(self, rule):
+        now = time.monotonic()
+        if rule.notified is not None and now - rule.notified < RULE_COOLDOWN:
+            return False
+        while self.recent and now - self.recent[0] > 60:
+            self.recent.popleft()
+        if len(self.recent) >= MAX_ALERTS_PER_MINUTE:
+            return False
+        rule.notified = now
+        self.recent.append(now)
+        return True
+
+
+def alert_message(rule, state, value):
+    """Text of an alert, as shown in the notification and saved"""
+    if state == "cleared":
+        return f"{rule.name} cleared: {rule.metric} is {value:.4g}"
+    if rule.kind == "threshold":
+        held = f" for {rule.duration:g}s" if rule.duration else ""
+        return f"{rule.name}: {rule.metric} {rule.rule['op']} {rule.threshold:g}{held} (now {value:.4g})"
+    return f"{rule.name}: {rule.metric} at {value:.4g} is more than {rule.threshold:g} std from its {rule.kind}"
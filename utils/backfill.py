@@ -0,0 +1,91 @@
+import logging
+import math
+import os
+import tempfile
+
+from utils.adb import run_adb_command
+from utils.agent import RECORD_MARKER, END_MARKER, BATTERY_MARKER
+from utils.timing import timed_shell_command
+
+# Echoed before the (empty) output of the backfill commands in the shell call of the system metrics
+BACKFILL_MARKER = "@@backfill"
+
+BUFFER_PATH = "/data/local/tmp/telemetry_backfill"
+PID_PATH = f"{BUFFER_PATH}.pid"
+# created by every poll of the host, the loop only records when it was not
+HEARTBEAT_PATH = f"{BUFFER_PATH}.host"
+
+# The loop outlives the longest pause by this much, each poll restarts it if needed
+LOOP_MARGIN = 60
+
+# Loop passes in a row without a heartbeat before the loop records. The host polls every
+# interval plus its tick, so single passes without one are normal while it is connected.
+GRACE_PASSES = 3
+
+
+def loop_script(interval, lifetime):
+    """Device shell loop appending one framed sample to the buffer while the host misses polls
+
+    Recording starts after GRACE_PASSES passes without a heartbeat and stops at the next
+    one. A record holds the same timed top and battery output as a regular poll, limited to
+    the top header, so buffered samples parse like live ones.
+    """
+    iterations = math.ceil(lifetime / interval)
+    record = timed_shell_command(f"top -n 1 -m 5; echo {BATTERY_MARKER}; dumpsys battery")
+    return (
+        f"echo $$ > {PID_PATH}; n=0; missed=0; while [ $n -lt {iterations} ]; do "
+        f"if [ -e {HEARTBEAT_PATH} ]; then rm -f {HEARTBEAT_PATH}; missed=0; "
+        f"else missed=$((missed+1)); fi; "
+        f"if [ $missed -ge {GRACE_PASSES} ]; then "
+        f"{{ echo {RECORD_MARKER} $n; {record}; echo {END_MARKER} $n; }} >> {BUFFER_PATH}; fi; "
+        f"sleep {interval:g}; n=$((n+1)); done"
+    )
+
+
+class BackfillBuffer:
+    """Device-side buffer that keeps sampling while the host cannot reach the device
+
+    A detached loop runs at the monitoring interval for as long as the longest pause.
+    Every poll of the host drops a heartbeat file and clears the buffer, so while the
+    host is connected the loop only removes the heartbeat. Once polls have stopped for
+    GRACE_PASSES intervals, the loop appends framed samples to the buffer, which is pulled in one transfer after the
+    reconnect.
+    """
+    marker = BACKFILL_MARKER
+
+    def __init__(self, interval, max_pause):
+        self.interval = interval
+        self.lifetime = max_pause + LOOP_MARGIN
+        # the first poll replaces a loop left over from an earlier run, its interval may differ
+        self.started = False
+
+    def shell_command(self):
+        restart = "" if self.started else f"kill $(cat {PID_PATH} 2>/dev/null) 2>/dev/null; "
+        self.started = True
+        return (
+            f"echo {BACKFILL_MARKER}; {restart}: > {HEARTBEAT_PATH}; rm -f {BUFFER_PATH}; "
+            f"kill -0 $(cat {PID_PATH} 2>/dev/null) 2>/dev/null || "
+            f"{{ nohup sh -c '{loop_script(self.interval, self.lifetime)}' </dev/null >/dev/null 2>&1 & }}"
+        )
+
+    def reset(self):
+        self.started = False
+
+    def parse(self, output):
+        return None
+
+    def pull(self, device_id):
+        """Move the buffer aside on the device and pull it, returns its content or None"""
+        run_adb_command(
+            ["shell", f"mv -f {BUFFER_PATH} {BUFFER_PATH}.read 2>/dev/null; : > {HEARTBEAT_PATH}"], device_id
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            local_path = os.path.join(tmp, "backfill.txt")
+            run_adb_command(["pull", f"{BUFFER_PATH}.read", local_path], device_id)
+            if not os.path.exists(local_path):
+                logging.info("No backfill buffer on the device")
+                return None
+            with open(local_path, encoding="utf-8", errors="replace") as f:
+                content = f.read()
+        run_adb_command(["shell", f"rm -f {BUFFER_PATH}.read"], device_id)
+        return content
@@ -0,0 +1,124 @@
+import io
+import logging
+import os
+import tempfile
+import time
+
+from utils.adb import run_adb_command
+from utils.power import POWER_SUPPLY
+
+BURST_PATH = "/data/local/tmp/telemetry_burst"
+
+# Written by the device loop before the first and after the last reading
+START_MARKER = "@@start"
+DONE_MARKER = "@@done"
+
+# Extra time the device gets to finish and flush before the file is pulled
+FINISH_TIMEOUT = 10
+
+# /proc/meminfo lines read per sample, the first five are the same on every kernel since 3.14
+MEMINFO_LINES = 5
+
+
+def burst_script(rate_hz, duration):
+    """Device shell loop writing one line per reading, only shell builtins run apart from sleep
+
+    Every line is 'uptime,/proc/stat cpu line,meminfo lines...,current_now,voltage_now'.
+    The loop starts with the device clock and uptime, so readings can be placed in time.
+    """
+    period = 1 / rate_hz
+    iterations = int(duration * rate_hz)
+    meminfo = "; ".join(f"read m{i}" for i in range(MEMINFO_LINES))
+    fields = ",".join(f"$m{i}" for i in range(MEMINFO_LINES))
+    return (
+        f"read up idle < /proc/uptime; echo {START_MARKER} $(date +%s.%N) $up; n=0; while [ $n -lt {iterations} ]; do "
+        f"read up idle < /proc/uptime; read cpu < /proc/stat; {{ {meminfo}; }} < /proc/meminfo; "
+        f"read c < {POWER_SUPPLY}/current_now; read v < {POWER_SUPPLY}/voltage_now; "
+        f"echo \"$up,$cpu,{fields},$c,$v\"; sleep {period:.3f}; n=$((n+1)); done; echo {DONE_MARKER}"
+    )
+
+
+def capture_burst(device_id, rate_hz, duration):
+    """Record on the device for `duration` seconds and pull the file in one transfer
+
+    Returns the file content, or None when the capture did not finish.
+    """
+    run_adb_command(
+        ["shell", f"rm -f {BURST_PATH}; {{ nohup sh -c '{burst_script(rate_hz, duration)}' "
+                  f"</dev/null >{BURST_PATH} 2>/dev/null & }}"],
+        device_id,
+    )
+    logging.info(f"Burst capture running on {device_id}: {duration:g}s at {rate_hz:g} Hz")
+    time.sleep(duration)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        local_path = os.path.join(tmp, "burst.csv")
+        deadline = time.monotonic() + FINISH_TIMEOUT
+        while True:
+            run_adb_command(["pull", BURST_PATH, local_path], device_id)
+            content = ""
+            if os.path.exists(local_path):
+                with open(local_path, encoding="utf-8", errors="replace") as f:
+                    content = f.read()
+            # the loop runs a little slower than the rate, give it time to write its last readings
+            if content.rstrip().endswith(DONE_MARKER) or time.monotonic() > deadline:
+                break
+            time.sleep(0.5)
+    run_adb_command(["shell", f"rm -f {BURST_PATH}"], device_id)
+    if not content.rstrip().endswith(DONE_MARKER):
+        logging.error("Burst capture did not finish on the device")
+        return None
+    return content
+
+
+def parse_burst(content):
+    """Parse a burst file into a DataFrame, one row per reading, in a single vectorized pass
+
+    Columns: device_time (device epoch seconds), cpu_pct (all cores, from tick deltas),
+    mem_total, mem_used, mem_free, mem_available, mem_buffers, mem_cached (MB),
+    power_current_ma, power_voltage_v and power_mw. The first reading has no cpu_pct.
+    """
+    import numpy as np
+    import pandas as pd
+
+    lines = content.splitlines()
+    start = next((line.split() for line in lines if line.startswith(START_MARKER)), None)
+    if start is None or len(start) < 3:
+        return None
+    start_epoch, start_uptime = float(start[1]), float(start[2])
+
+    readings = "\n".join(line for line in lines if line and not line.startswith("@@"))
+    if not readings:
+        return None
+    raw = pd.read_csv(io.StringIO(readings), header=None, dtype=str)
+    frame = pd.DataFrame({"device_time": start_epoch + raw[0].astype(float) - start_uptime})
+
+    # cpu  user nice system idle iowait irq softirq steal ...
+    ticks = raw[1].str.split(expand=True).iloc[:, 1:].astype("int64")
+    total = ticks.sum(axis=1)
+    idle = ticks[4] + ticks[5]
+    busy_delta = (total - idle).diff()
+    total_delta = total.diff()
+    frame["cpu_pct"] = (100 * busy_delta / total_delta.where(total_delta > 0)).round(1)
+
+    # "MemTotal:  7573000 kB", labels pick the columns so older kernels without MemAvailable also parse
+    memory = {}
+    for column in range(2, 2 + MEMINFO_LINES):
+        parts = raw[column].str.split(expand=True)
+        label = parts[0].iloc[0].rstrip(":")
+        memory[label] = (parts[1].astype("int64") / 1024).round(1)
+    # in the order of the burst_table columns, the rows are stored by position
+    frame["mem_total"] = memory.get("MemTotal")
+    frame["mem_used"] = frame["mem_total"] - memory.get("MemFree")
+    frame["mem_free"] = memory.get("MemFree")
+    frame["mem_available"] = memory.get("MemAvailable", np.nan)
+    frame["mem_buffers"] = memory.get("Buffers", np.nan)
+    frame["mem_cached"] = memory.get("Cached", np.nan)
+
+    current_ua = pd.to_numeric(raw[2 + MEMINFO_LINES], errors="coerce")
+    voltage_uv = pd.to_numeric(raw[3 + MEMINFO_LINES], errors="coerce")
+    frame["power_current_ma"] = (current_ua / 1000).round(1)
+    frame["power_voltage_v"] = (voltage_uv / 1e6).round(3)
+    # the sign of current_now differs between vendors, see PowerSampler
+    frame["power_mw"] = (current_ua.abs() * voltage_uv * 1e-9).round(1)
+    return frame
@@ -0,0 +1,190 @@
+import logging
+import re
+import time
+
+from utils.parsers import parse_sysfs_values, parse_core_ticks
+
+# Echoed before the core and thermal output in the shell call of the system metrics
+CORES_MARKER = "@@cores"
+
+CPU_ROOT = "/sys/devices/system/cpu"
+THERMAL_ROOT = "/sys/class/thermal"
+
+CORE_PATH = re.compile(r'/cpu(\d+)/cpufreq/(\w+)$')
+ZONE_PATH = re.compile(r'/thermal_zone(\d+)/(\w+)$')
+
+# device serial -> discovered sysfs layout, the explicit cpufreq and thermal paths to read
+_discovered = {}
+
+# Seconds before the layout is discovered again, for thermal zones that could not be read before
+# and cores that were offline; a core showing up in /proc/stat triggers it right away
+REDISCOVER_INTERVAL = 300
+
+
+def _zone_key(zone_type, zone, used):
+    """Sample key of a thermal zone, e.g. thermal_cpu_0, unique per device"""
+    key = "thermal_" + re.sub(r'\W+', '_', zone_type.lower()).strip('_')
+    return key if key not in used else f"{key}_{zone}"
+
+
+def _celsius(value):
+    # most zones report millidegrees, a few report degrees
+    temp = int(value)
+    return temp / 1000 if abs(temp) >= 1000 else float(temp)
+
+
+class CoreThermalSampler:
+    """Per-core frequency and utilization and thermal zone temperatures, in one batched read
+
+    The first poll of a device discovers which cpufreq and thermal_zone files exist and
+    can be read; the explicit paths are cached per serial, so later polls read exactly
+    those files with a single grep instead of expanding globs over sysfs. The layout is
+    discovered again every REDISCOVER_INTERVAL, when a core comes online that was not
+    there before, and after a reset. Discovery polls read the current values too, so no
+    sample is lost to them. A core counts as throttled when its scaling_max_freq is below
+    cpuinfo_max_freq.
+    """
+    marker = CORES_MARKER
+
+    def __init__(self, device_serial):
+        self.device_serial = device_serial
+        self.previous_ticks = {}
+        # columnar batches of the last poll, stored in the long cores and thermal tables
+        self.batches = {}
+        # whether the last shell_command was a discovery poll
+        self.discovering = False
+
+    def shell_command(self):
+        layout = _discovered.get(self.device_serial)
+        if layout is None or time.monotonic() >= layout["expires"]:
+            self.discovering = True
+            files = (
+                f"{CPU_ROOT}/cpu[0-9]*/cpufreq/cpuinfo_max_freq {CPU_ROOT}/cpu[0-9]*/cpufreq/scaling_cur_freq "
+                f"{CPU_ROOT}/cpu[0-9]*/cpufreq/scaling_max_freq "
+                f"{THERMAL_ROOT}/thermal_zone*/type {THERMAL_ROOT}/thermal_zone*/temp"
+            )
+        elif layout["files"]:
+            self.discovering = False
+            files = " ".join(layout["files"])
+        else:
+            # nothing readable in sysfs, grep without files would wait on stdin
+            self.discovering = False
+            return f"echo {CORES_MARKER}; grep '^cpu[0-9]' /proc/stat"
+        return f"echo {CORES_MARKER}; grep -H . {files} 2>/dev/null; grep '^cpu[0-9]' /proc/stat"
+
+    def reset(self):
+        self.previous_ticks = {}
+        self.batches = {}
+        # cores and zones may differ after a reconnect or a reboot
+        _discovered.pop(self.device_serial, None)
+
+    def parse(self, output):
+        """Parse the output of shell_command, returns the sample fields or None"""
+        self.batches = {}
+        if output is None:
+            return None
+        lines = output.splitlines()
+        values = parse_sysfs_values(lines)
+        ticks = parse_core_ticks(lines)
+
+        if self.discovering:
+            self._discover(values, ticks)
+        layout = _discovered.get(self.device_serial)
+        if layout is None:
+            self.previous_ticks = ticks
+            return None
+        if ticks.keys() - layout["online"]:
+            # a hot-plugged core has cpufreq files that were not read
+            layout["expires"] = 0
+
+        data = {}
+        cores = {"core": [], "freq_mhz": [], "scaling_max_mhz": [], "cpuinfo_max_mhz": [], "util_pct": []}
+        throttled = 0
+        for core, cpuinfo_max in layout["cores"].items():
+            directory = f"{CPU_ROOT}/cpu{core}/cpufreq"
+            freq = values.get(f"{directory}/scaling_cur_freq")
+            if freq is None:
+                # offline cores drop out until they come back
+                continue
+            freq_mhz = int(freq) / 1000
+            scaling_max = values.get(f"{directory}/scaling_max_freq")
+            scaling_max_mhz = int(scaling_max) / 1000 if scaling_max else None
+            util = None
+            if core in ticks and core in self.previous_ticks:
+                busy = ticks[core][0] - self.previous_ticks[core][0]
+                total = ticks[core][1] - self.previous_ticks[core][1]
+                util = round(100 * busy / total, 1) if total > 0 else None
+            if scaling_max_mhz is not None and scaling_max_mhz < cpuinfo_max / 1000:
+                throttled += 1
+
+            data[f"core_freq_{core}"] = freq_mhz
+            data[f"core_util_{core}"] = util
+            cores["core"].append(core)
+            cores["freq_mhz"].append(freq_mhz)
+            cores["scaling_max_mhz"].append(scaling_max_mhz)
+            cores["cpuinfo_max_mhz"].append(cpuinfo_max / 1000)
+            cores["util_pct"].append(util)
+        self.previous_ticks = ticks
+
+        zones = {"zone": [], "zone_type": [], "temp_c": []}
+        for zone, (zone_type, key) in layout["zones"].items():
+            value = values.get(f"{THERMAL_ROOT}/thermal_zone{zone}/temp")
+            try:
+                temp = _celsius(value)
+            except (TypeError, ValueError):
+                continue
+            data[key] = temp
+            zones["zone"].append(zone)
+            zones["zone_type"].append(zone_type)
+            zones["temp_c"].append(temp)
+
+        if cores["core"]:
+            data["cores_throttled"] = throttled
+            self.batches["cores_table"] = cores
+        if zones["temp_c"]:
+            data["thermal_max_c"] = max(zones["temp_c"])
+            self.batches["thermal_table"] = zones
+        return data or None
+
+    def _discover(self, values, ticks):
+        """Cache the readable cpufreq and thermal files found by a discovery poll"""
+        cores = {}
+        zones = {}
+        zone_types = {}
+        zone_temps = set()
+        for path, value in values.items():
+            match = CORE_PATH.search(path)
+            if match and match.group(2) == "cpuinfo_max_freq":
+                cores[int(match.group(1))] = int(value)
+                continue
+            match = ZONE_PATH.search(path)
+            if match and match.group(2) == "type":
+                zone_types[int(match.group(1))] = value
+            elif match and match.group(2) == "temp":
+                zone_temps.add(int(match.group(1)))
+
+        used = set()
+        # zones that could not be read are left out until the next discovery
+        for zone in sorted(zone_temps & zone_types.keys()):
+            key = _zone_key(zone_types[zone], zone, used)
+            used.add(key)
+            zones[zone] = (zone_types[zone], key)
+
+        files = []
+        for core in sorted(cores):
+            directory = f"{CPU_ROOT}/cpu{core}/cpufreq"
+            files += [f"{directory}/scaling_cur_freq", f"{directory}/scaling_max_freq"]
+        files += [f"{THERMAL_ROOT}/thermal_zone{zone}/temp" for zone in zones]
+
+        previous = _discovered.get(self.device_serial)
+        _discovered[self.device_serial] = layout = {
+            "cores": dict(sorted(cores.items())), "zones": zones, "files": files,
+            "online": set(ticks), "expires": time.monotonic() + REDISCOVER_INTERVAL,
+        }
+        # rediscovery finding the same layout is not news
+        changed = previous is None or previous["files"] != files
+        logging.log(
+            logging.INFO if changed else logging.DEBUG,
+            f"Found {len(cores)} cpufreq core(s) and {len(layout['zones'])} readable thermal zone(s) "
+            f"on {self.device_serial}",
+        )
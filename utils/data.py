@@ -1,78 +1,163 @@
 import re
 import os
+import json
 import sqlite3
 import logging
 import threading
 from datetime import datetime
 
+from utils.metrics import timed, SAVE_TO_DB_SECONDS, SAVE_TO_DB_ERRORS
+# parsers live in utils.parsers, re-exported here for existing imports
+from utils.parsers import remove_ansi_escape_codes, parse_top_memory, parse_top_summary  # noqa: F401
+
 #To ensure only one thread is written at a time in database.
 db_lock = threading.Lock()
 
+# Schema creation runs in the background at startup, writers wait for it.
+init_lock = threading.RLock()
+database_ready = threading.Event()
+DATABASE_PATH = os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')), 'app.db')
 
-#Removes terminal color codes and escape sequences from ADB or shell outputs.
-def remove_ansi_escape_codes(text):
-    ansi_escape = re.compile(r'\x1B(?:[@-Z\-_]|\[[0-?]*[ -/]*[@-~])')
-    return ansi_escape.sub('', text)
-
-#Converts memory strings(1G->1024MB)
-def parse_top_memory(value_str):
-    value_str = value_str.upper().strip()
-    if value_str.endswith("G"):
-        return int(float(value_str[:-1]) * 1024)
-    elif value_str.endswith("M"):
-        return int(float(value_str[:-1]))
-    elif value_str.endswith("K"):
-        return int(value_str[:-1]) / 1024
-    else:
-        return int(value_str)
 
+# Per-device tables: devices column -> (table suffix, columns besides id and timestamp)
+DEVICE_TABLES = {
+    'cpu_table': ('cpu', [
+        ('cpu_cpu', 'INTEGER'), ('cpu_user', 'INTEGER'), ('cpu_nice', 'INTEGER'),
+        ('cpu_sys', 'INTEGER'), ('cpu_idle', 'INTEGER'), ('cpu_iow', 'INTEGER'),
+        ('cpu_irq', 'INTEGER'), ('cpu_sirq', 'INTEGER'), ('cpu_host', 'INTEGER'),
+        # device clock at capture, adb round trip and estimated device-host clock offset
+        ('device_time', 'REAL'), ('collection_latency_ms', 'REAL'), ('clock_offset_ms', 'REAL'),
+        # 1 for samples buffered on the device during a disconnect and pulled afterwards
+        ('backfilled', 'INTEGER'),
+        # seconds between samples when this one was taken, varies in adaptive mode
+        ('sample_interval', 'REAL'),
+    ]),
+    'memory_table': ('memory', [
+        ('mem_total', 'INTEGER'), ('mem_used', 'INTEGER'), ('mem_free', 'INTEGER'), ('mem_buffers', 'INTEGER'),
+    ]),
+    'tasks_table': ('tasks', [
+        ('tasks_total', 'INTEGER'), ('tasks_running', 'INTEGER'), ('tasks_sleeping', 'INTEGER'),
+        ('tasks_stopped', 'INTEGER'), ('tasks_zombie', 'INTEGER'),
+    ]),
+    'swap_table': ('swap', [
+        ('swap_total', 'INTEGER'), ('swap_used', 'INTEGER'), ('swap_free', 'INTEGER'), ('swap_cached', 'INTEGER'),
+    ]),
+    'battery_table': ('battery', [
+        ('battery_level', 'INTEGER'), ('battery_health', 'TEXT'),
+        ('battery_temperature', 'REAL'), ('charging_status', 'TEXT'),
+    ]),
+    # power_supply current and voltage averaged over the interval, energy integrated over it
+    'power_table': ('power', [
+        ('power_readings', 'INTEGER'), ('power_current_ma', 'REAL'), ('power_voltage_v', 'REAL'),
+        ('power_mw', 'REAL'), ('power_peak_mw', 'REAL'), ('energy_mj', 'REAL'),
+    ]),
+    # throughput summed over all interfaces but loopback, and the target app's own where available
+    'net_table': ('net', [
+        ('net_rx_bps', 'REAL'), ('net_tx_bps', 'REAL'), ('net_rx_pps', 'REAL'), ('net_tx_pps', 'REAL'),
+        ('app_rx_bps', 'REAL'), ('app_tx_bps', 'REAL'), ('app_rx_pps', 'REAL'), ('app_tx_pps', 'REAL'),
+    ]),
+    # target package mode, summed over the package's processes
+    'app_table': ('app', [
+        ('app_package', 'TEXT'), ('app_pids', 'INTEGER'), ('app_threads', 'INTEGER'), ('app_cpu', 'REAL'),
+        ('app_rss_mb', 'REAL'), ('app_pss_mb', 'REAL'), ('app_swap_mb', 'REAL'),
+    ]),
+    # frames rendered by the target package since the previous sample
+    'frames_table': ('frames', [
+        ('gfx_frames', 'INTEGER'), ('gfx_jank_pct', 'REAL'), ('gfx_p50_ms', 'REAL'),
+        ('gfx_p90_ms', 'REAL'), ('gfx_p99_ms', 'REAL'), ('gfx_missed_vsync', 'INTEGER'),
+    ]),
+}
 
-#Extracts Logs
-def parse_top_summary(lines, device_serial=None):
-    data = {}
-    if len(lines) < 7:
-        logging.error("Insufficient top output lines.")
-        return None
-    try:
-        #Extract Task Count
-        task_line = lines[0].replace('Tasks:', '').replace(',', '')
-        task_matches = re.findall(r'(\d+)\s+(\w+)', task_line)
-        for value, label in task_matches:
-            data[f'tasks_{label.lower()}'] = int(value)
-        
-        # Extract Memory
-        mem_line = lines[2] if 'Mem:' in lines[2] else lines[1]
-        mem_matches = re.findall(r'(\d+[KMG]?)\s+(\w+)', mem_line)
-        for value_str, label in mem_matches:
-            data[f'mem_{label.lower()}'] = parse_top_memory(value_str)
-        
-        #Extract Swap Info
-        swap_line_index = 3 if mem_line == lines[2] else 2
-        swap_matches = re.findall(r'(\d+)K\s+(\w+)', lines[swap_line_index])
-        for value, label in swap_matches:
-            data[f'swap_{label.lower()}'] = int(value)
-
-        #Extract CPU usage
-        cpu_line = lines[6]
-        cpu_matches = re.findall(r'(\d+)%(\w+)', cpu_line)
-        for value, label in cpu_matches:
-            data[f'cpu_{label.lower()}'] = int(value)
-
-        # Store TimeStamp and Device Info
-        data['timestamp'] = datetime.now()
-        if device_serial:
-            data['device_serial'] = device_serial
-
-        return data
-    except Exception as e:
-        logging.error(f"Parsing failed: {e}")
-        return None
+# Per-device tables that get several rows per sample, written by their own save function.
+BATCH_TABLES = {
+    # Top processes, names and users are stored once in process_names and referenced by id
+    'processes_table': ('processes', [
+        ('process_id', 'INTEGER'), ('pid', 'INTEGER'), ('cpu_percent', 'REAL'),
+        ('mem_percent', 'REAL'), ('res_mb', 'REAL'),
+    ]),
+    # One row per online core
+    'cores_table': ('cores', [
+        ('core', 'INTEGER'), ('freq_mhz', 'REAL'), ('scaling_max_mhz', 'REAL'),
+        ('cpuinfo_max_mhz', 'REAL'), ('util_pct', 'REAL'),
+    ]),
+    # One row per readable thermal zone
+    'thermal_table': ('thermal', [
+        ('zone', 'INTEGER'), ('zone_type', 'TEXT'), ('temp_c', 'REAL'),
+    ]),
+    # One row per interface that had traffic in the interval
+    'net_interfaces_table': ('net_interfaces', [
+        ('interface', 'TEXT'), ('rx_bps', 'REAL'), ('rx_pps', 'REAL'), ('tx_bps', 'REAL'), ('tx_pps', 'REAL'),
+    ]),
+}
+
+# Tables filled by a stream rather than per sample, every row has its own timestamp.
+STREAM_TABLES = {
+    # logcat lines, timestamp is the device time mapped onto the host clock
+    'logcat_table': ('logcat', [
+        ('device_time', 'REAL'), ('pid', 'INTEGER'), ('tid', 'INTEGER'),
+        ('priority', 'TEXT'), ('tag', 'TEXT'), ('message', 'TEXT'),
+    ]),
+    # high-rate burst captures, every burst of a device gets its own burst_id; session_id is the
+    # session that was running, NULL for a burst outside of one
+    'burst_table': ('burst', [
+        ('burst_id', 'INTEGER'), ('session_id', 'INTEGER'), ('device_time', 'REAL'), ('cpu_pct', 'REAL'),
+        ('mem_total', 'REAL'), ('mem_used', 'REAL'), ('mem_free', 'REAL'), ('mem_available', 'REAL'),
+        ('mem_buffers', 'REAL'), ('mem_cached', 'REAL'),
+        ('power_current_ma', 'REAL'), ('power_voltage_v', 'REAL'), ('power_mw', 'REAL'),
+    ]),
+    # session statistics per metric, rewritten while the session runs; sketch is the JSON of a
+    # mergeable quantile sketch (utils.stats.QuantileSketch) so sessions can be combined later
+    'stats_table': ('stats', [
+        ('session_start', 'TEXT'), ('metric', 'TEXT'), ('count', 'INTEGER'), ('mean', 'REAL'), ('std', 'REAL'),
+        ('min', 'REAL'), ('max', 'REAL'), ('ewma', 'REAL'), ('p50', 'REAL'), ('p90', 'REAL'), ('p99', 'REAL'),
+        ('sketch', 'TEXT'),
+    ]),
+    # alert rules firing and clearing, value is the metric when it happened
+    'alerts_table': ('alerts', [
+        ('rule', 'TEXT'), ('metric', 'TEXT'), ('state', 'TEXT'), ('severity', 'TEXT'),
+        ('value', 'REAL'), ('threshold', 'REAL'), ('message', 'TEXT'),
+    ]),
+    # sampling interval changes of the adaptive mode, the interval holds until the next row
+    'rate_table': ('rate', [
+        ('sample_interval', 'REAL'), ('previous_interval', 'REAL'), ('activity', 'REAL'), ('reason', 'TEXT'),
+    ]),
+}
+
+# Full-text indexed columns of stream tables, in an FTS5 table '<table>_fts' kept in sync by triggers
+FTS_COLUMNS = {'logcat_table': ('tag', 'message')}
+
+# Sample keys stored under a different column name
+COLUMN_KEYS = {'battery_temperature': 'battery_temp'}
+
+# Statistics of a finished session, per metric in session_summaries (total is count * mean, e.g. energy)
+SESSION_SUMMARY_COLUMNS = ('count', 'mean', 'std', 'min', 'max', 'p50', 'p90', 'p99', 'total')
+
+# Points of the downsampled series stored per metric when a session ends, each the mean, min and max of its bucket
+SESSION_SERIES_POINTS = 200
+
+# DEVICE_TABLES columns without a session series, bookkeeping rather than measurements
+SERIES_EXCLUDED = {'device_time', 'clock_offset_ms', 'backfilled'}
+
+# Tables that only get a row when the sample has at least one of their values
+OPTIONAL_TABLES = {'battery_table', 'power_table', 'net_table', 'app_table', 'frames_table'}
+
+# (database path, device serial) -> (device id, tables), so samples skip the devices lookup
+_device_cache = {}
+
+# (database path, process name, user) -> process_names id
+_process_name_cache = {}
+
+# FTS5 is compiled into nearly every SQLite build, without it searches fall back to LIKE
+_fts_available = True
 
 
 #Creates the SQLite database and the table schema.
-def initialize_database():
-    root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-    db_path = os.path.join(root_dir, 'app.db')
+def initialize_database(db_path=None):
+    with init_lock:
+        return _initialize_database(db_path or DATABASE_PATH)
+
+def _initialize_database(db_path):
+    global DATABASE_PATH
     logging.info(f"Database path: {db_path}")
 
     conn = sqlite3.connect(db_path)
@@ -84,204 +169,612 @@ def initialize_database():
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         device_serial TEXT UNIQUE NOT NULL,
         model TEXT,
-        connection_type TEXT,
-        cpu_table TEXT,
-        memory_table TEXT,
-        tasks_table TEXT,
-        swap_table TEXT,
-        battery_table TEXT
+        connection_type TEXT
     )
     ''')
 
+    # Process dimension table, shared by all devices
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS process_names (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        user TEXT NOT NULL DEFAULT '',
+        UNIQUE(name, user)
+    )
+    ''')
+
+    # Monitoring sessions, samples and energy are filled in when the session ends
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        device_serial TEXT NOT NULL,
+        label TEXT,
+        metadata TEXT,
+        started TEXT NOT NULL,
+        ended TEXT,
+        samples INTEGER,
+        energy_mj REAL
+    )
+    ''')
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS session_summaries (
+        session_id INTEGER NOT NULL,
+        metric TEXT NOT NULL,
+        {", ".join(f"{name} REAL" for name in SESSION_SUMMARY_COLUMNS)},
+        PRIMARY KEY (session_id, metric)
+    )
+    ''')
+    # offset_s is seconds since the session started, so sessions line up on one axis
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS session_series (
+        session_id INTEGER NOT NULL,
+        metric TEXT NOT NULL,
+        offset_s REAL NOT NULL,
+        mean REAL,
+        min REAL,
+        max REAL
+    )
+    ''')
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS session_series_metric ON session_series (session_id, metric, offset_s);"
+    )
+
     # Check for missing columns and add if necessary
     cursor.execute("PRAGMA table_info(devices);")
     existing_cols = [r[1] for r in cursor.fetchall()]
-    for col in ['cpu_table', 'memory_table', 'tasks_table', 'swap_table', 'battery_table']:
+    for col in (*DEVICE_TABLES, *BATCH_TABLES, *STREAM_TABLES):
         if col not in existing_cols:
             cursor.execute(f"ALTER TABLE devices ADD COLUMN {col} TEXT;")
 
     conn.commit()
     conn.close()
     logging.info("Database initialized successfully.")
+    DATABASE_PATH = db_path
+    database_ready.set()
     return db_path
 
-def create_device_tables(conn, device_serial):
-    sanitized = re.sub(r'\W+', '_', device_serial.lower())
-    cpu_table = f"{sanitized}_cpu"
-    memory_table = f"{sanitized}_memory"
-    tasks_table = f"{sanitized}_tasks"
-    swap_table = f"{sanitized}_swap"
-    battery_table = f"{sanitized}_battery"
+#Initializes the database on first use if startup has not done it yet.
+def ensure_database():
+    if not database_ready.is_set():
+        with init_lock:
+            if not database_ready.is_set():
+                initialize_database()
+    return DATABASE_PATH
+
+def device_table_prefix(device_serial):
+    return re.sub(r'\W+', '_', device_serial.lower())
 
+#Creates missing per-device tables and columns, returns {devices column: table name}
+def create_device_tables(conn, device_serial):
+    sanitized = device_table_prefix(device_serial)
     cursor = conn.cursor()
+    tables = {}
+    for col, (suffix, columns) in (*DEVICE_TABLES.items(), *BATCH_TABLES.items(), *STREAM_TABLES.items()):
+        table = f"{sanitized}_{suffix}"
+        column_defs = ", ".join(f"{name} {sql_type}" for name, sql_type in columns)
+        cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            {column_defs}
+        )
+        ''')
+        # tables created by older versions may lack newer columns
+        cursor.execute(f"PRAGMA table_info({table});")
+        existing_cols = {r[1] for r in cursor.fetchall()}
+        for name, sql_type in columns:
+            if name not in existing_cols:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {sql_type};")
+        tables[col] = table
+        if col in DEVICE_TABLES:
+            # session series and downloads select samples by time
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {table}_timestamp ON {table} (timestamp);")
+    for col, fts_columns in FTS_COLUMNS.items():
+        create_fts_index(cursor, tables[col], fts_columns)
+    conn.commit()
+    return tables
+
+#Creates the timestamp index and the external content FTS5 index of a stream table
+def create_fts_index(cursor, table, columns):
+    global _fts_available
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {table}_timestamp ON {table} (timestamp);")
+    if not _fts_available:
+        return
+    names = ", ".join(columns)
+    new_values = ", ".join(f"new.{name}" for name in columns)
+    old_values = ", ".join(f"old.{name}" for name in columns)
+    try:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5({names}, content='{table}', content_rowid='id');"
+        )
+    except sqlite3.OperationalError as e:
+        _fts_available = False
+        logging.warning(f"Full-text search is not available, searching with LIKE instead: {e}")
+        return
     cursor.execute(f'''
-    CREATE TABLE IF NOT EXISTS {cpu_table} (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        timestamp TEXT NOT NULL,
-        cpu_cpu INTEGER,
-        cpu_user INTEGER,
-        cpu_nice INTEGER,
-        cpu_sys INTEGER,
-        cpu_idle INTEGER,
-        cpu_iow INTEGER,
-        cpu_irq INTEGER,
-        cpu_sirq INTEGER,
-        cpu_host INTEGER
-    )
-    ''')
-    cursor.execute(f'''
-    CREATE TABLE IF NOT EXISTS {memory_table} (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        timestamp TEXT NOT NULL,
-        mem_total INTEGER,
-        mem_used INTEGER,
-        mem_free INTEGER,
-        mem_buffers INTEGER
-    )
-    ''')
-    cursor.execute(f'''
-    CREATE TABLE IF NOT EXISTS {tasks_table} (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        timestamp TEXT NOT NULL,
-        tasks_total INTEGER,
-        tasks_running INTEGER,
-        tasks_sleeping INTEGER,
-        tasks_stopped INTEGER,
-        tasks_zombie INTEGER
-    )
-    ''')
-    cursor.execute(f'''
-    CREATE TABLE IF NOT EXISTS {swap_table} (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        timestamp TEXT NOT NULL,
-        swap_total INTEGER,
-        swap_used INTEGER,
-        swap_free INTEGER,
-        swap_cached INTEGER
-    )
+    CREATE TRIGGER IF NOT EXISTS {table}_fts_insert AFTER INSERT ON {table} BEGIN
+        INSERT INTO {table}_fts (rowid, {names}) VALUES (new.id, {new_values});
+    END
     ''')
     cursor.execute(f'''
-    CREATE TABLE IF NOT EXISTS {battery_table} (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        timestamp TEXT NOT NULL,
-        battery_level INTEGER,
-        battery_health TEXT,
-        battery_temperature REAL,
-        charging_status TEXT
-    )
+    CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table} BEGIN
+        INSERT INTO {table}_fts ({table}_fts, rowid, {names}) VALUES ('delete', old.id, {old_values});
+    END
     ''')
-    conn.commit()
-    return cpu_table, memory_table, tasks_table, swap_table, battery_table
 
 def get_or_create_device(conn, device_serial, model='Unknown', connection_type='Unknown'):
     cursor = conn.cursor()
-    cursor.execute("SELECT id, cpu_table, memory_table, tasks_table, swap_table, battery_table FROM devices WHERE device_serial=?", (device_serial,))
+    cursor.execute("SELECT id FROM devices WHERE device_serial=?", (device_serial,))
     row = cursor.fetchone()
+    tables = create_device_tables(conn, device_serial)
     if row:
-        return row
+        device_id = row[0]
+        assignments = ", ".join(f"{col}=?" for col in tables)
+        cursor.execute(f"UPDATE devices SET {assignments} WHERE id=?", (*tables.values(), device_id))
     else:
-        cpu_table, memory_table, tasks_table, swap_table, battery_table = create_device_tables(conn, device_serial)
-        cursor.execute('''
-        INSERT INTO devices (device_serial, model, connection_type, cpu_table, memory_table, tasks_table, swap_table, battery_table)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (device_serial, model, connection_type, cpu_table, memory_table, tasks_table, swap_table, battery_table))
-        conn.commit()
+        cursor.execute(f'''
+        INSERT INTO devices (device_serial, model, connection_type, {", ".join(tables)})
+        VALUES ({", ".join("?" * (3 + len(tables)))})
+        ''', (device_serial, model, connection_type, *tables.values()))
         device_id = cursor.lastrowid
-        return (device_id, cpu_table, memory_table, tasks_table, swap_table, battery_table)
+    conn.commit()
+    return device_id, tables
+
+def cached_device(conn, db_path, device_serial, model='Unknown', connection_type='Unknown'):
+    cache_key = (db_path, device_serial)
+    if cache_key not in _device_cache:
+        _device_cache[cache_key] = get_or_create_device(conn, device_serial, model, connection_type)
+    return _device_cache[cache_key]
+
+def process_name_ids(cursor, db_path, names, users):
+    """Map (name, user) pairs onto process_names ids, adding the ones not seen before"""
+    ids = []
+    for key in zip(names, users):
+        process_id = _process_name_cache.get((db_path, *key))
+        if process_id is None:
+            cursor.execute("INSERT OR IGNORE INTO process_names (name, user) VALUES (?, ?)", key)
+            cursor.execute("SELECT id FROM process_names WHERE name=? AND user=?", key)
+            process_id = _process_name_cache[(db_path, *key)] = cursor.fetchone()[0]
+        ids.append(process_id)
+    return ids
+
+def insert_batch(cursor, table, timestamp, batch):
+    """Insert one row per entry of a columnar {column: [values]} batch"""
+    columns = list(batch)
+    rows = zip(*batch.values())
+    cursor.executemany(
+        f"INSERT INTO {table} (timestamp, {', '.join(columns)}) VALUES (?{', ?' * len(columns)})",
+        ((timestamp, *row) for row in rows),
+    )
+
+def insert_row(cursor, table, timestamp, values):
+    """Insert one row from a {column: value} dict"""
+    cursor.execute(
+        f"INSERT INTO {table} (timestamp, {', '.join(values)}) VALUES (?{', ?' * len(values)})",
+        (timestamp, *values.values()),
+    )
+
+def format_timestamp(value):
+    return value.isoformat(sep=' ', timespec='milliseconds')
 
 
 #inserts one complete record
+@timed(SAVE_TO_DB_SECONDS)
 def save_data_to_db(data_point):
-    db_path = DATABASE_PATH
+    db_path = ensure_database()
     try:
         with db_lock:
             conn = sqlite3.connect(db_path, timeout=30)
             device_serial = data_point.get('device_serial', 'unknown')
             model = data_point.get('model', 'Unknown')
             connection_type = data_point.get('connection_type', 'Unknown')
-            device_id, cpu_table, memory_table, tasks_table, swap_table, battery_table = get_or_create_device(conn,model, model, connection_type)
+            device_id, tables = cached_device(conn, db_path, device_serial, model, connection_type)
 
-            timestamp = data_point['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
-            cursor = conn.cursor()
+            insert_data_point(conn.cursor(), tables, data_point)
+            conn.commit()
+            conn.close()
+            return True
+    except Exception as e:
+        SAVE_TO_DB_ERRORS.inc()
+        print(f"[ERROR] Failed to save data to database: {e}")
+        return False
 
-            cursor.execute(f'''
-                INSERT INTO {cpu_table} (
-                    timestamp, cpu_cpu, cpu_user, cpu_nice, cpu_sys, cpu_idle,
-                    cpu_iow, cpu_irq, cpu_sirq, cpu_host
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                timestamp,
-                data_point.get('cpu_cpu', 0),
-                data_point.get('cpu_user', 0),
-                data_point.get('cpu_nice', 0),
-                data_point.get('cpu_sys', 0),
-                data_point.get('cpu_idle', 0),
-                data_point.get('cpu_iow', 0),
-                data_point.get('cpu_irq', 0),
-                data_point.get('cpu_sirq', 0),
-                data_point.get('cpu_host', 0),
-            ))
-
-            cursor.execute(f'''
-                INSERT INTO {memory_table} (
-                    timestamp, mem_total, mem_used, mem_free, mem_buffers
-                ) VALUES (?, ?, ?, ?, ?)
-            ''', (
-                timestamp,
-                data_point.get('mem_total', 0),
-                data_point.get('mem_used', 0),
-                data_point.get('mem_free', 0),
-                data_point.get('mem_buffers', 0),
-            ))
-
-            cursor.execute(f'''
-                INSERT INTO {tasks_table} (
-                    timestamp, tasks_total, tasks_running, tasks_sleeping,
-                    tasks_stopped, tasks_zombie
-                ) VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                timestamp,
-                data_point.get('tasks_total', 0),
-                data_point.get('tasks_running', 0),
-                data_point.get('tasks_sleeping', 0),
-                data_point.get('tasks_stopped', 0),
-                data_point.get('tasks_zombie', 0),
-            ))
-
-            cursor.execute(f'''
-                INSERT INTO {swap_table} (
-                    timestamp, swap_total, swap_used, swap_free, swap_cached
-                ) VALUES (?, ?, ?, ?, ?)
-            ''', (
-                timestamp,
-                data_point.get('swap_total', 0),
-                data_point.get('swap_used', 0),
-                data_point.get('swap_free', 0),
-                data_point.get('swap_cached', 0),
-            ))
-
-            if any(key in data_point for key in ['battery_level', 'battery_health', 'battery_temperature', 'charging_status']):
-                cursor.execute(f'''
-                    INSERT INTO {battery_table} (
-                        timestamp, battery_level, battery_health, battery_temperature, charging_status
-                    ) VALUES (?, ?, ?, ?, ?)
-                ''', (
-                    timestamp,
-                    data_point.get('battery_level'),
-                    data_point.get('battery_health'),
-                    data_point.get('battery_temp'),
-                    data_point.get('charging_status'),
-                ))
 
+#inserts several records of one device in a single transaction
+def save_data_points_to_db(data_points):
+    if not data_points:
+        return True
+    db_path = ensure_database()
+    first = data_points[0]
+    try:
+        with db_lock:
+            conn = sqlite3.connect(db_path, timeout=30)
+            _, tables = cached_device(
+                conn, db_path, first.get('device_serial', 'unknown'),
+                first.get('model', 'Unknown'), first.get('connection_type', 'Unknown'),
+            )
+            cursor = conn.cursor()
+            for data_point in data_points:
+                insert_data_point(cursor, tables, data_point)
             conn.commit()
             conn.close()
             return True
     except Exception as e:
+        SAVE_TO_DB_ERRORS.inc()
         print(f"[ERROR] Failed to save data to database: {e}")
         return False
 
-if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
-    DATABASE_PATH = initialize_database()
-else:
-    DATABASE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'adb_monitor.db')
 
+def insert_data_point(cursor, tables, data_point):
+    """Insert the DEVICE_TABLES rows of one record"""
+    timestamp = format_timestamp(data_point['timestamp'])
+    for col, (_, columns) in DEVICE_TABLES.items():
+        table = tables[col]
+        keys = [(name, COLUMN_KEYS.get(name, name), sql_type) for name, sql_type in columns]
+        if col in OPTIONAL_TABLES and not any(key in data_point for _, key, _ in keys):
+            continue
+        # missing integer counters are stored as 0, everything else as NULL
+        default = None if col in OPTIONAL_TABLES else 0
+        values = {
+            name: data_point.get(key, default if sql_type == 'INTEGER' else None)
+            for name, key, sql_type in keys
+        }
+        insert_row(cursor, table, timestamp, values)
+
+
+#inserts the top processes of one sample, batch as returned by parse_top_processes
+def save_processes_to_db(data_point, batch):
+    db_path = ensure_database()
+    try:
+        with db_lock:
+            conn = sqlite3.connect(db_path, timeout=30)
+            _, tables = cached_device(
+                conn, db_path, data_point.get('device_serial', 'unknown'),
+                data_point.get('model', 'Unknown'), data_point.get('connection_type', 'Unknown'),
+            )
+            cursor = conn.cursor()
+            insert_batch(cursor, tables['processes_table'], format_timestamp(data_point['timestamp']), {
+                'process_id': process_name_ids(cursor, db_path, batch['name'], batch['user']),
+                'pid': batch['pid'],
+                'cpu_percent': batch['cpu'],
+                'mem_percent': batch['mem'],
+                'res_mb': batch['res'],
+            })
+            conn.commit()
+            conn.close()
+            return True
+    except Exception as e:
+        SAVE_TO_DB_ERRORS.inc()
+        print(f"[ERROR] Failed to save processes to database: {e}")
+        return False
+
+
+#inserts the batch table rows of one sample, batches as {BATCH_TABLES column: columnar batch}
+def save_batches_to_db(data_point, batches):
+    db_path = ensure_database()
+    try:
+        with db_lock:
+            conn = sqlite3.connect(db_path, timeout=30)
+            _, tables = cached_device(
+                conn, db_path, data_point.get('device_serial', 'unknown'),
+                data_point.get('model', 'Unknown'), data_point.get('connection_type', 'Unknown'),
+            )
+            cursor = conn.cursor()
+            timestamp = format_timestamp(data_point['timestamp'])
+            for col, batch in batches.items():
+                insert_batch(cursor, tables[col], timestamp, batch)
+            conn.commit()
+            conn.close()
+            return True
+    except Exception as e:
+        SAVE_TO_DB_ERRORS.inc()
+        print(f"[ERROR] Failed to save batches to database: {e}")
+        return False
+
+
+#inserts streamed rows of one device, rows as tuples of the STREAM_TABLES columns with the timestamp first
+def save_stream_to_db(device_serial, col, rows, model='Unknown', connection_type='Unknown'):
+    db_path = ensure_database()
+    try:
+        with db_lock:
+            conn = sqlite3.connect(db_path, timeout=30)
+            _, tables = cached_device(conn, db_path, device_serial, model, connection_type)
+            columns = ['timestamp', *(name for name, _ in STREAM_TABLES[col][1])]
+            conn.executemany(
+                f"INSERT INTO {tables[col]} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                rows,
+            )
+            conn.commit()
+            conn.close()
+            return True
+    except Exception as e:
+        SAVE_TO_DB_ERRORS.inc()
+        print(f"[ERROR] Failed to save stream rows to database: {e}")
+        return False
+
+
+#inserts one burst capture, rows as tuples of the burst_table columns with the timestamp first and without burst_id and session_id
+def save_burst_to_db(device_serial, rows, model='Unknown', connection_type='Unknown', session_id=None):
+    db_path = ensure_database()
+    try:
+        with db_lock:
+            conn = sqlite3.connect(db_path, timeout=30)
+            _, tables = cached_device(conn, db_path, device_serial, model, connection_type)
+            table = tables['burst_table']
+            burst_id = conn.execute(f"SELECT COALESCE(MAX(burst_id), 0) + 1 FROM {table}").fetchone()[0]
+            columns = ['timestamp', *(name for name, _ in STREAM_TABLES['burst_table'][1])]
+            conn.executemany(
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                ((row[0], burst_id, session_id, *row[1:]) for row in rows),
+            )
+            conn.commit()
+            conn.close()
+            return burst_id
+    except Exception as e:
+        SAVE_TO_DB_ERRORS.inc()
+        print(f"[ERROR] Failed to save burst to database: {e}")
+        return None
+
+
+#replaces the statistics of one session, rows as (metric, summary, sketch) from StatsEngine.rows
+def save_stats_to_db(device_serial, session_start, rows, model='Unknown', connection_type='Unknown'):
+    db_path = ensure_database()
+    try:
+        with db_lock:
+            conn = sqlite3.connect(db_path, timeout=30)
+            _, tables = cached_device(conn, db_path, device_serial, model, connection_type)
+            table = tables['stats_table']
+            session = format_timestamp(session_start)
+            columns = [name for name, _ in STREAM_TABLES['stats_table'][1]]
+            conn.execute(f"DELETE FROM {table} WHERE session_start=?", (session,))
+            conn.executemany(
+                f"INSERT INTO {table} (timestamp, {', '.join(columns)}) VALUES (?{', ?' * len(columns)})",
+                (
+                    (format_timestamp(datetime.now()), session, metric, summary['count'], summary['mean'],
+                     summary['std'], summary['min'], summary['max'], summary['ewma'],
+                     summary['p50'], summary['p90'], summary['p99'], sketch)
+                    for metric, summary, sketch in rows
+                ),
+            )
+            conn.commit()
+            conn.close()
+            return True
+    except Exception as e:
+        SAVE_TO_DB_ERRORS.inc()
+        print(f"[ERROR] Failed to save statistics to database: {e}")
+        return False
+
+
+#records the start of a session, returns its id
+def create_session(device_serial, started, label=None, metadata=None, model='Unknown', connection_type='Unknown'):
+    db_path = ensure_database()
+    try:
+        with db_lock:
+            conn = sqlite3.connect(db_path, timeout=30)
+            # creates the device tables the series are read from at the end
+            cached_device(conn, db_path, device_serial, model, connection_type)
+            cursor = conn.execute(
+                "INSERT INTO sessions (device_serial, label, metadata, started) VALUES (?, ?, ?, ?)",
+                (device_serial, label, json.dumps(metadata or {}, default=str), format_timestamp(started)),
+            )
+            conn.commit()
+            conn.close()
+            return cursor.lastrowid
+    except Exception as e:
+        SAVE_TO_DB_ERRORS.inc()
+        print(f"[ERROR] Failed to save session to database: {e}")
+        return None
+
+
+#closes a session with its summaries, rows as (metric, summary, sketch) from StatsEngine.rows,
+#and stores a downsampled series of every metric of the DEVICE_TABLES read back from its samples
+def finish_session(session_id, ended, rows):
+    db_path = ensure_database()
+    try:
+        conn = sqlite3.connect(db_path, timeout=30)
+        try:
+            with db_lock:
+                device_serial, started = conn.execute(
+                    "SELECT device_serial, started FROM sessions WHERE id=?", (session_id,)
+                ).fetchone()
+                _, tables = cached_device(conn, db_path, device_serial)
+            # only reads, so the samples are aggregated without holding up the writers
+            series, samples = session_series(conn, tables, started, ended)
+            summaries = {metric: summary for metric, summary, _ in rows}
+            energy = summaries.get('energy_mj')
+            with db_lock:
+                conn.execute("DELETE FROM session_summaries WHERE session_id=?", (session_id,))
+                conn.executemany(
+                    f"INSERT INTO session_summaries (session_id, metric, {', '.join(SESSION_SUMMARY_COLUMNS)}) "
+                    f"VALUES (?, ?{', ?' * len(SESSION_SUMMARY_COLUMNS)})",
+                    (
+                        (session_id, metric, *(summary[name] for name in SESSION_SUMMARY_COLUMNS[:-1]),
+                         summary['mean'] * summary['count'])
+                        for metric, summary in summaries.items()
+                    ),
+                )
+                conn.execute("DELETE FROM session_series WHERE session_id=?", (session_id,))
+                conn.executemany(
+                    "INSERT INTO session_series (session_id, metric, offset_s, mean, min, max) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    ((session_id, *row) for row in series),
+                )
+                conn.execute(
+                    "UPDATE sessions SET ended=?, samples=?, energy_mj=? WHERE id=?",
+                    (format_timestamp(ended), samples, energy['mean'] * energy['count'] if energy else None,
+                     session_id),
+                )
+                conn.commit()
+        finally:
+            conn.close()
+        return True
+    except Exception as e:
+        SAVE_TO_DB_ERRORS.inc()
+        print(f"[ERROR] Failed to save session summaries to database: {e}")
+        return False
+
+
+def session_series(conn, tables, started, ended):
+    """Samples of a session aggregated into SESSION_SERIES_POINTS buckets per metric
+
+    Returns ([(metric, offset_s, mean, min, max)], sample count). Every table is read once
+    through its timestamp index, grouped by bucket in SQLite, so only the buckets reach Python.
+    """
+    duration = max((ended - datetime.fromisoformat(started)).total_seconds(), 1.0)
+    bucket = duration / SESSION_SERIES_POINTS
+    samples = 0
+    series = []
+    for col, (_, columns) in DEVICE_TABLES.items():
+        names = [name for name, sql_type in columns if sql_type != 'TEXT' and name not in SERIES_EXCLUDED]
+        query = f'''
+        SELECT AVG(elapsed), COUNT(*), {", ".join(f"AVG({n}), MIN({n}), MAX({n})" for n in names)}
+        FROM (
+            SELECT (julianday(timestamp) - julianday(?)) * 86400 AS elapsed, {", ".join(names)}
+            FROM {tables[col]} WHERE timestamp BETWEEN ? AND ?
+        )
+        GROUP BY CAST(elapsed / ? AS INTEGER)
+        '''
+        rows = conn.execute(query, (started, started, format_timestamp(ended), bucket)).fetchall()
+        if col == 'cpu_table':
+            samples = sum(row[1] for row in rows)
+        series.extend(
+            (COLUMN_KEYS.get(name, name), row[0], *row[2 + 3 * i:5 + 3 * i])
+            for row in rows
+            for i, name in enumerate(names)
+            # optional tables leave NULLs where a sample did not have the value
+            if row[2 + 3 * i] is not None
+        )
+    return series, samples
+
+
+def list_sessions(device_serial=None, session_ids=None, limit=100):
+    """Sessions newest first as dicts, with the metadata decoded and the device model"""
+    db_path = ensure_database()
+    conditions = []
+    params = []
+    if device_serial:
+        conditions.append("s.device_serial = ?")
+        params.append(device_serial)
+    if session_ids is not None:
+        conditions.append(f"s.id IN ({', '.join('?' * len(session_ids))})")
+        params.extend(session_ids)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        rows = conn.execute(f'''
+        SELECT s.*, d.model FROM sessions s LEFT JOIN devices d ON d.device_serial = s.device_serial
+        {where} ORDER BY s.id DESC LIMIT ?
+        ''', (*params, limit)).fetchall()
+    finally:
+        conn.close()
+    return [{**dict(row), 'metadata': json.loads(row['metadata'] or '{}')} for row in rows]
+
+
+def load_session_summaries(session_ids):
+    """{session id: {metric: summary}} of finished sessions, one indexed read"""
+    db_path = ensure_database()
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        rows = conn.execute(
+            f"SELECT session_id, metric, {', '.join(SESSION_SUMMARY_COLUMNS)} FROM session_summaries "
+            f"WHERE session_id IN ({', '.join('?' * len(session_ids))})",
+            list(session_ids),
+        ).fetchall()
+    finally:
+        conn.close()
+    summaries = {session_id: {} for session_id in session_ids}
+    for session_id, metric, *values in rows:
+        summaries[session_id][metric] = dict(zip(SESSION_SUMMARY_COLUMNS, values))
+    return summaries
+
+
+def load_session_series(session_ids, metric):
+    """{session id: (offsets, means, mins, maxs)} of one metric, in time order"""
+    db_path = ensure_database()
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        series = {}
+        for session_id in session_ids:
+            rows = conn.execute(
+                "SELECT offset_s, mean, min, max FROM session_series WHERE session_id=? AND metric=? ORDER BY offset_s",
+                (session_id, metric),
+            ).fetchall()
+            series[session_id] = tuple(map(list, zip(*rows))) if rows else ([], [], [], [])
+        return series
+    finally:
+        conn.close()
+
+
+def fts_query(text):
+    """Turn free text into an FTS5 query matching all of its words, as prefixes
+
+    Text that is already FTS5 syntax (quotes, AND/OR/NOT, column filters) is passed through.
+    """
+    if any(char in text for char in '"*:()') or re.search(r'\b(AND|OR|NOT|NEAR)\b', text):
+        return text
+    return " ".join(f'"{word}"*' for word in text.split())
+
+
+def search_logcat(device_serial, text=None, start=None, end=None, priorities=None, limit=200):
+    """Logcat lines of a device, newest first, as (timestamp, priority, tag, pid, message) tuples
+
+    text is matched against tag and message with the FTS5 index; start and end are
+    timestamps as stored, priorities a string of logcat priority letters, e.g. 'WEF'.
+    """
+    db_path = ensure_database()
+    table = f"{device_table_prefix(device_serial)}_logcat"
+    window = []
+    window_params = []
+    if start is not None:
+        window.append("l.timestamp >= ?")
+        window_params.append(start)
+    if end is not None:
+        window.append("l.timestamp <= ?")
+        window_params.append(end)
+    conditions = list(window)
+    params = list(window_params)
+    if priorities:
+        conditions.append(f"l.priority IN ({', '.join('?' * len(priorities))})")
+        params.extend(priorities)
+
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        exists = conn.execute(
+            "SELECT name FROM sqlite_master WHERE name IN (?, ?)", (table, f"{table}_fts")
+        ).fetchall()
+        if not exists:
+            return []
+        if text and len(exists) == 2:
+            rowids = ""
+            if window:
+                # rows are inserted in time order, so the window is also an id range the FTS index can seek to
+                first, last = conn.execute(
+                    f"SELECT min(id), max(id) FROM {table} l WHERE {' AND '.join(window)}", window_params
+                ).fetchone()
+                if first is None:
+                    return []
+                rowids = f" AND f.rowid BETWEEN {first} AND {last}"
+            # the FTS index hands out matching rowids newest first, the join only reads those rows
+            query = f'''
+            SELECT l.timestamp, l.priority, l.tag, l.pid, l.message
+            FROM {table}_fts f JOIN {table} l ON l.id = f.rowid
+            WHERE {table}_fts MATCH ?{rowids}{"".join(f" AND {c}" for c in conditions)}
+            ORDER BY f.rowid DESC LIMIT ?
+            '''
+            params = [fts_query(text), *params, limit]
+        else:
+            if text:
+                conditions.append("(l.message LIKE ? OR l.tag LIKE ?)")
+                params += [f"%{text}%", f"%{text}%"]
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            query = f"SELECT l.timestamp, l.priority, l.tag, l.pid, l.message FROM {table} l {where} ORDER BY l.timestamp DESC LIMIT ?"
+            params.append(limit)
+        try:
+            return conn.execute(query, params).fetchall()
+        except sqlite3.OperationalError as e:
+            # malformed FTS5 syntax typed into the search box
+            logging.debug(f"Logcat search failed: {e}")
+            return []
+    finally:
+        conn.close()
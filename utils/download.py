@@ -0,0 +1,233 @@
+import csv
+import importlib.util
+import io
+import sqlite3
+from datetime import datetime
+
+from utils.data import DEVICE_TABLES, COLUMN_KEYS, ensure_database, device_table_prefix, format_timestamp, list_sessions
+
+# Row ids per SQLite query. Each query is its own short read, so writers get the database between chunks
+DOWNLOAD_CHUNK_ROWS = 5000
+
+DOWNLOAD_FORMATS = {"csv": "text/csv; charset=utf-8", "parquet": "application/vnd.apache.parquet"}
+
+# sample key -> (devices column, table column, SQL type) of every downloadable metric
+DOWNLOAD_COLUMNS = {
+    COLUMN_KEYS.get(name, name): (col, name, sql_type)
+    for col, (_, columns) in DEVICE_TABLES.items()
+    for name, sql_type in columns
+}
+
+# every sample has a cpu row, the other tables are matched to it
+BASE_TABLE = 'cpu_table'
+
+
+def download_query(args):
+    """(device serial, start, end, metrics, format) of the download query parameters, raises ValueError
+
+    A session id stands for its device and time range, start and end narrow it further.
+    """
+    fmt = args.get("format", "csv").lower()
+    if fmt not in DOWNLOAD_FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}, expected one of {', '.join(DOWNLOAD_FORMATS)}")
+    if fmt == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        raise ValueError("Parquet downloads need pyarrow (pip install pyarrow), CSV works without it")
+
+    device, start, end = args.get("device"), "", format_timestamp(datetime.max)
+    if args.get("session"):
+        try:
+            sessions = list_sessions(session_ids=[int(args["session"])])
+        except ValueError:
+            raise ValueError(f"Invalid session {args['session']!r}")
+        if not sessions:
+            raise ValueError(f"No session {args['session']}")
+        device, start, end = sessions[0]["device_serial"], sessions[0]["started"], sessions[0]["ended"] or end
+    if not device:
+        raise ValueError("Pass a device serial or a session id")
+    try:
+        if args.get("start"):
+            start = max(start, format_timestamp(datetime.fromisoformat(args["start"])))
+        if args.get("end"):
+            end = min(end, format_timestamp(datetime.fromisoformat(args["end"])))
+    except ValueError:
+        raise ValueError("start and end are ISO timestamps, e.g. 2025-01-31T14:00")
+
+    metrics = [m for m in args.get("metrics", "").split(",") if m] or list(DOWNLOAD_COLUMNS)
+    unknown = [m for m in metrics if m not in DOWNLOAD_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown metrics: {', '.join(unknown)}")
+    return device, start, end, metrics, fmt
+
+
+class TableCursor:
+    """Rows of one device table in a time range, read in id windows of DOWNLOAD_CHUNK_ROWS
+
+    Windows on the primary key bound what every query scans, however narrow the time
+    range, and the connection holds no read lock between queries. Rows stored after the
+    download started are left out.
+    """
+
+    def __init__(self, conn, table, columns, start, end):
+        self.query = (
+            f"SELECT id, timestamp{''.join(f', {c}' for c in columns)} FROM {table} "
+            f"WHERE id > ? AND id <= ? AND timestamp BETWEEN ? AND ? ORDER BY id"
+        )
+        self.conn = conn
+        self.range = (start, end)
+        self.last_id = 0
+        self.max_id = conn.execute(f"SELECT MAX(id) FROM {table}").fetchone()[0] or 0
+        self.rows = []
+        self.index = 0
+
+    def chunk(self):
+        """Next non-empty chunk of (id, timestamp, *columns) rows, empty at the end"""
+        while self.last_id < self.max_id:
+            first, self.last_id = self.last_id, self.last_id + DOWNLOAD_CHUNK_ROWS
+            rows = self.conn.execute(self.query, (first, self.last_id, *self.range)).fetchall()
+            if rows:
+                return rows
+        return []
+
+    def take(self, timestamp):
+        """Columns of the next row if it has this timestamp, else None
+
+        Every sample writes its rows in the same order to all tables, so the rows of an
+        optional table are the samples that had its values, in the order of the cpu rows.
+        """
+        if self.index == len(self.rows):
+            self.rows, self.index = self.chunk(), 0
+            if not self.rows:
+                return None
+        row = self.rows[self.index]
+        if row[1] != timestamp:
+            return None
+        self.index += 1
+        return row[2:]
+
+
+def sample_chunks(device_serial, metrics, start, end):
+    """Chunks of (timestamp, *metrics) rows of a device, the tables joined on the sample
+
+    Rows come in the order they were stored, which is time order except for backfilled
+    samples, stored after the reconnect that brought them.
+    """
+    db_path = ensure_database()
+    prefix = device_table_prefix(device_serial)
+    # devices column -> table columns of the requested metrics
+    wanted = {BASE_TABLE: []}
+    for metric in metrics:
+        col, name, _ = DOWNLOAD_COLUMNS[metric]
+        wanted.setdefault(col, []).append(name)
+
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        if f"{prefix}_{DEVICE_TABLES[BASE_TABLE][0]}" not in existing:
+            return
+        # the base first, so the other tables have every row of the samples it has
+        base = TableCursor(conn, f"{prefix}_{DEVICE_TABLES[BASE_TABLE][0]}", wanted[BASE_TABLE], start, end)
+        cursors = {
+            col: TableCursor(conn, f"{prefix}_{DEVICE_TABLES[col][0]}", names, start, end)
+            for col, names in wanted.items()
+            if col != BASE_TABLE and f"{prefix}_{DEVICE_TABLES[col][0]}" in existing
+        }
+        positions = {col: {name: i for i, name in enumerate(names)} for col, names in wanted.items()}
+        while True:
+            rows = base.chunk()
+            if not rows:
+                return
+            chunk = []
+            for row in rows:
+                values = {BASE_TABLE: row[2:]}
+                for col, cursor in cursors.items():
+                    values[col] = cursor.take(row[1])
+                chunk.append((row[1], *(
+                    values[col][positions[col][name]] if values.get(col) is not None else None
+                    for col, name, _ in (DOWNLOAD_COLUMNS[m] for m in metrics)
+                )))
+            yield chunk
+    finally:
+        conn.close()
+
+
+def csv_stream(chunks, metrics):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["timestamp", *metrics])
+    for chunk in chunks:
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    yield buffer.getvalue()
+
+
+class ChunkSink(io.RawIOBase):
+    """Write-only file collecting what the Parquet writer wrote since the last drain"""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        # the footer records offsets from the start of the file, not of the chunk
+        return self.position
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def parquet_stream(chunks, metrics):
+    """One Parquet row group per chunk, each sent as soon as it is written"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {"INTEGER": pa.int64(), "REAL": pa.float64(), "TEXT": pa.string()}
+    schema = pa.schema(
+        [("timestamp", pa.timestamp("ms")), *((m, types[DOWNLOAD_COLUMNS[m][2]]) for m in metrics)]
+    )
+    sink = ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    for chunk in chunks:
+        columns = list(zip(*chunk))
+        arrays = [pa.array([datetime.fromisoformat(t) for t in columns[0]], pa.timestamp("ms"))]
+        arrays += [pa.array(values, field.type) for values, field in zip(columns[1:], list(schema)[1:])]
+        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def register_download_endpoint(server, path="/download"):
+    """Stream samples of a device from the database as CSV or Parquet on a Flask server
+
+    Query parameters: device (serial) or session (id), start and end (ISO timestamps),
+    metrics (comma separated sample keys, default all) and format (csv or parquet).
+    """
+    from flask import Response, jsonify, request
+
+    def download():
+        try:
+            device, start, end, metrics, fmt = download_query(request.args)
+        except ValueError as e:
+            return jsonify(error=str(e)), 400
+        stream = csv_stream if fmt == "csv" else parquet_stream
+        name = f"{device_table_prefix(device)}_{start[:10] or 'all'}.{fmt}"
+        return Response(
+            stream(sample_chunks(device, metrics, start, end), metrics),
+            mimetype=DOWNLOAD_FORMATS[fmt],
+            headers={"Content-Disposition": f'attachment; filename="{name}"'},
+        )
+
+    server.add_url_rule(path, "telemetry_download", download)
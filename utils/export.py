@@ -0,0 +1,392 @@
+import gzip
+import hashlib
+import json
+import logging
+import math
+import os
+import queue
+import re
+import struct
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from utils.metrics import (
+    EXPORT_SAMPLES, EXPORT_DROPPED, EXPORT_REQUEST_SECONDS, EXPORT_QUEUE_DEPTH, EXPORT_SPOOL_BYTES,
+)
+from utils.stats import EXCLUDED_KEYS
+
+# Samples waiting for the exporter thread; when full, new samples are dropped rather than waited for
+QUEUE_SIZE = 10000
+
+# Samples per request, and the longest a sample waits before it is sent
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 5.0
+
+REQUEST_TIMEOUT = 10
+
+# Encoded batches that could not be sent are kept on disk up to this size, the oldest are dropped beyond it
+SPOOL_MAX_BYTES = 64 * 1024 * 1024
+SPOOL_DIR = os.environ.get(
+    "TELEMETRY_EXPORT_SPOOL",
+    os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')), 'export_spool'),
+)
+
+# Seconds before the spool is retried after a failed request, doubled per failure up to RETRY_MAX
+RETRY_MIN = 1.0
+RETRY_MAX = 300.0
+
+# Prefix of the exported metric names, e.g. telemetry_cpu_user
+METRIC_PREFIX = "telemetry"
+
+# Sample keys exported as labels of every series
+LABEL_KEYS = {"device_serial": "device", "model": "model", "connection_type": "connection"}
+
+
+def sample_fields(data):
+    """Numeric metrics of a sample, the keys StatsEngine keeps statistics for"""
+    return {
+        key: float(value) for key, value in data.items()
+        if key not in EXCLUDED_KEYS and isinstance(value, (int, float)) and not isinstance(value, bool)
+        and math.isfinite(value)
+    }
+
+
+def sample_labels(data):
+    return {label: str(data.get(key) or "unknown") for key, label in LABEL_KEYS.items()}
+
+
+class InfluxLineFormat:
+    """InfluxDB line protocol, one line per sample with every metric as a float field, gzip compressed"""
+    name = "influx"
+    content_type = "text/plain; charset=utf-8"
+    headers = {"Content-Encoding": "gzip"}
+
+    @staticmethod
+    def _escape(value):
+        return re.sub(r'([,= \\])', r'\\\1', value)
+
+    def encode(self, samples):
+        lines = []
+        for data in samples:
+            fields = sample_fields(data)
+            if not fields:
+                continue
+            tags = ",".join(f"{label}={self._escape(value)}" for label, value in sorted(sample_labels(data).items()))
+            values = ",".join(f"{self._escape(key)}={value!r}" for key, value in fields.items())
+            lines.append(f"{METRIC_PREFIX},{tags} {values} {int(data['timestamp'].timestamp() * 1e9)}")
+        return gzip.compress("\n".join(lines).encode("utf-8"))
+
+
+class OtlpJsonFormat:
+    """OTLP/HTTP metrics in the JSON encoding, a gauge per metric and a resource per device, gzip compressed"""
+    name = "otlp"
+    content_type = "application/json"
+    headers = {"Content-Encoding": "gzip"}
+
+    def encode(self, samples):
+        # (labels) -> {metric name: [data points]}
+        resources = {}
+        for data in samples:
+            time_ns = str(int(data["timestamp"].timestamp() * 1e9))
+            metrics = resources.setdefault(tuple(sorted(sample_labels(data).items())), {})
+            for key, value in sample_fields(data).items():
+                metrics.setdefault(f"{METRIC_PREFIX}.{key}", []).append({"timeUnixNano": time_ns, "asDouble": value})
+        request = {"resourceMetrics": [
+            {
+                "resource": {"attributes": [
+                    {"key": f"device.{label}", "value": {"stringValue": value}} for label, value in labels
+                ]},
+                "scopeMetrics": [{
+                    "scope": {"name": METRIC_PREFIX},
+                    "metrics": [
+                        {"name": name, "gauge": {"dataPoints": points}} for name, points in metrics.items()
+                    ],
+                }],
+            }
+            for labels, metrics in resources.items()
+        ]}
+        return gzip.compress(json.dumps(request, separators=(",", ":")).encode("utf-8"))
+
+
+def _varint(value):
+    out = bytearray()
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _message_field(number, payload):
+    """Length-delimited protobuf field (strings and embedded messages)"""
+    return _varint(number << 3 | 2) + _varint(len(payload)) + payload
+
+
+def snappy_compress(data):
+    """Snappy block format, as remote-write requires, with a greedy 4-byte hash match
+
+    Series labels repeat in every sample of a batch, which is what the matches pick up.
+    """
+    out = bytearray(_varint(len(data)))
+
+    def literal(start, end):
+        while start < end:
+            chunk = min(end - start, 65536)
+            if chunk <= 60:
+                out.append((chunk - 1) << 2)
+            elif chunk <= 256:
+                out.extend((60 << 2, chunk - 1))
+            else:
+                out.append(61 << 2)
+                out.extend(struct.pack("<H", chunk - 1))
+            out.extend(data[start:start + chunk])
+            start += chunk
+
+    table = {}
+    position = literal_start = 0
+    end = len(data)
+    while position + 4 <= end:
+        key = data[position:position + 4]
+        candidate = table.get(key)
+        table[key] = position
+        offset = position - candidate if candidate is not None else 0
+        if not 0 < offset <= 0xFFFF:
+            position += 1
+            continue
+        length = 4
+        while position + length < end and data[candidate + length] == data[position + length]:
+            length += 1
+        literal(literal_start, position)
+        position += length
+        literal_start = position
+        # copies with a 2-byte offset, up to 64 bytes each
+        while length > 0:
+            chunk = min(length, 64)
+            out.append((chunk - 1) << 2 | 2)
+            out.extend(struct.pack("<H", offset))
+            length -= chunk
+    literal(literal_start, end)
+    return bytes(out)
+
+
+class RemoteWriteFormat:
+    """Prometheus remote-write 1.0: a protobuf WriteRequest, snappy compressed
+
+    The protobuf is written by hand, the messages involved are four fields deep.
+    """
+    name = "remote-write"
+    content_type = "application/x-protobuf"
+    headers = {"Content-Encoding": "snappy", "X-Prometheus-Remote-Write-Version": "0.1.0"}
+
+    @staticmethod
+    def _metric_name(key):
+        return re.sub(r'[^a-zA-Z0-9_:]', '_', f"{METRIC_PREFIX}_{key}")
+
+    def encode(self, samples):
+        # (sorted labels with __name__) -> [(timestamp ms, value)], a series' samples must be in time order
+        series = {}
+        for data in sorted(samples, key=lambda point: point["timestamp"]):
+            labels = sorted(sample_labels(data).items())
+            timestamp_ms = int(data["timestamp"].timestamp() * 1000)
+            for key, value in sample_fields(data).items():
+                name = ("__name__", self._metric_name(key))
+                series.setdefault((name, *labels), []).append((timestamp_ms, value))
+        request = bytearray()
+        for labels, points in series.items():
+            timeseries = bytearray()
+            for label, value in labels:
+                timeseries += _message_field(1, _message_field(1, label.encode()) + _message_field(2, value.encode()))
+            for timestamp_ms, value in points:
+                # Sample: double value = 1, int64 timestamp = 2
+                timeseries += _message_field(2, b"\x09" + struct.pack("<d", value) + b"\x10" + _varint(timestamp_ms))
+            request += _message_field(1, bytes(timeseries))
+        return snappy_compress(bytes(request))
+
+
+EXPORT_FORMATS = {fmt.name: fmt for fmt in (InfluxLineFormat, OtlpJsonFormat, RemoteWriteFormat)}
+
+
+class DiskSpool:
+    """Encoded batches waiting to be resent, one file each, sent oldest first and bounded in total size"""
+
+    def __init__(self, directory, max_bytes=SPOOL_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        # file name -> size, names sort in the order the batches were made
+        self.files = {name: os.path.getsize(os.path.join(directory, name))
+                      for name in sorted(os.listdir(directory)) if name.endswith(".batch")}
+        self.sequence = 0
+        EXPORT_SPOOL_BYTES.set(self.size)
+
+    @property
+    def size(self):
+        return sum(self.files.values())
+
+    def __len__(self):
+        return len(self.files)
+
+    def put(self, body, samples):
+        """Keep a batch of `samples` samples, dropping the oldest ones over the size limit"""
+        self.sequence += 1
+        # the sample count rides along in the name, for counting what a dropped file held
+        name = f"{time.time_ns():020d}-{self.sequence:06d}-{samples}.batch"
+        path = os.path.join(self.directory, name)
+        with open(path + ".tmp", "wb") as f:
+            f.write(body)
+        os.replace(path + ".tmp", path)
+        self.files[name] = len(body)
+        while self.size > self.max_bytes and len(self.files) > 1:
+            oldest = next(iter(self.files))
+            logging.warning(f"Export spool over {self.max_bytes} bytes, dropping {oldest}")
+            EXPORT_DROPPED.inc("spool full", amount=self.samples(oldest))
+            self.remove(oldest)
+        EXPORT_SPOOL_BYTES.set(self.size)
+
+    def oldest(self):
+        """(name, body) of the oldest batch, or None"""
+        for name in self.files:
+            try:
+                with open(os.path.join(self.directory, name), "rb") as f:
+                    return name, f.read()
+            except OSError:
+                # removed by hand, or by another exporter sharing the directory
+                self.files.pop(name)
+                return self.oldest()
+        return None
+
+    def remove(self, name):
+        self.files.pop(name, None)
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except OSError:
+            pass
+        EXPORT_SPOOL_BYTES.set(self.size)
+
+    @staticmethod
+    def samples(name):
+        return int(name[:-len(".batch")].rsplit("-", 1)[1])
+
+
+class Exporter:
+    """Ships samples to an external time-series store in batches
+
+    submit() only puts the sample in a bounded queue and never waits, so a slow or
+    unreachable store cannot hold up sampling; when the queue is full the sample is
+    dropped and counted. An exporter thread takes batches of up to BATCH_SIZE samples,
+    or whatever arrived within FLUSH_INTERVAL, encodes and compresses them and POSTs
+    them to the URL. A batch that fails with a network error, 429 or 5xx goes to a
+    disk spool that is retried oldest first with exponential backoff. While the spool
+    is not empty new batches queue behind it, so stores that reject out-of-order
+    samples (remote-write) get them in order. Spooled batches outlive a restart.
+    """
+
+    def __init__(self, fmt, url, headers=None, spool_dir=None):
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format {fmt!r}, expected one of {', '.join(EXPORT_FORMATS)}")
+        self.format = EXPORT_FORMATS[fmt]()
+        self.url = url
+        self.headers = {"Content-Type": self.format.content_type, **self.format.headers, **(headers or {})}
+        # one spool per format and destination, so batches are never sent to a store that did not ask for them
+        destination = hashlib.sha1(f"{fmt} {url}".encode()).hexdigest()[:12]
+        self.spool = DiskSpool(os.path.join(spool_dir or SPOOL_DIR, f"{fmt}-{destination}"))
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.retry_at = 0.0
+        self.backoff = RETRY_MIN
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name=f"export-{self.format.name}", daemon=True)
+            self.thread.start()
+        return self
+
+    def submit(self, data):
+        """Queue a sample for export, drops it when the queue is full"""
+        try:
+            self.queue.put_nowait(data)
+        except queue.Full:
+            EXPORT_DROPPED.inc("queue full")
+
+    def stop(self, timeout=REQUEST_TIMEOUT):
+        """Send what is queued, batches that cannot be sent stay in the spool for the next run"""
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=timeout)
+            self.thread = None
+
+    def _run(self):
+        while not (self.stop_event.is_set() and self.queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._export(batch)
+            self._retry_spool()
+        if len(self.spool):
+            logging.warning(f"{len(self.spool)} export batch(es) left in {self.spool.directory}")
+
+    def _next_batch(self):
+        try:
+            batch = [self.queue.get(timeout=FLUSH_INTERVAL)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + FLUSH_INTERVAL
+        while len(batch) < BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (self.stop_event.is_set() and self.queue.empty()):
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        EXPORT_QUEUE_DEPTH.set(self.queue.qsize())
+        return batch
+
+    def _export(self, batch):
+        try:
+            body = self.format.encode(batch)
+        except Exception as e:
+            logging.error(f"Could not encode {len(batch)} sample(s) for export: {e}")
+            EXPORT_DROPPED.inc("encoding", amount=len(batch))
+            return
+        if len(self.spool) or self._send(body, len(batch)) is None:
+            self.spool.put(body, len(batch))
+
+    def _retry_spool(self):
+        while len(self.spool) and time.monotonic() >= self.retry_at:
+            name, body = self.spool.oldest() or (None, None)
+            if name is None:
+                return
+            if self._send(body, DiskSpool.samples(name)) is None:
+                return
+            self.spool.remove(name)
+
+    def _send(self, body, samples):
+        """POST a batch, True when it was accepted, False when rejected for good, None to retry later"""
+        request = urllib.request.Request(self.url, data=body, headers=self.headers, method="POST")
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT):
+                pass
+        except urllib.error.HTTPError as e:
+            if e.code != 429 and e.code < 500:
+                # the store will not take this batch however often it is sent
+                logging.error(f"Export of {samples} sample(s) to {self.url} rejected: {e.code} {e.reason}")
+                EXPORT_DROPPED.inc("rejected", amount=samples)
+                return False
+            return self._failed(f"{e.code} {e.reason}")
+        except (OSError, urllib.error.URLError) as e:
+            return self._failed(e)
+        finally:
+            EXPORT_REQUEST_SECONDS.observe(time.perf_counter() - start, self.format.name)
+        EXPORT_SAMPLES.inc(self.format.name, amount=samples)
+        self.backoff = RETRY_MIN
+        return True
+
+    def _failed(self, reason):
+        logging.warning(f"Export to {self.url} failed ({reason}), retrying in {self.backoff:g}s")
+        self.retry_at = time.monotonic() + self.backoff
+        self.backoff = min(self.backoff * 2, RETRY_MAX)
+        return None
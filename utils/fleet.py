@@ -0,0 +1,127 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.adb import run_adb_command, get_device_ip, connect_wifi_adb, wait_for_device
+
+# Devices brought up at the same time, each worker mostly waits on its own adb calls
+FLEET_WORKERS = 8
+
+# Attempts per step, with RETRY_DELAY * attempt seconds between them
+STEP_ATTEMPTS = 3
+RETRY_DELAY = 1
+
+WIFI_PORT = 5555
+
+
+class FleetConnector:
+    """Moves every USB-attached device to ADB over Wi-Fi at once
+
+    Each device runs the same steps as ConnectionManager.try_wifi_connect (ip addr,
+    tcpip, connect) in a bounded thread pool, every step retried on its own. An IP
+    seen before is tried first with a plain `adb connect`, adbd keeps listening on TCP
+    until the device reboots, so a repeated bring-up skips ip addr and tcpip.
+
+    results holds one row per serial and is updated while the bring-up runs.
+    """
+
+    def __init__(self, connection_manager, workers=FLEET_WORKERS):
+        self.connection_manager = connection_manager
+        self.workers = workers
+        self.results = {}
+        self.running = False
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Run the bring-up in a background thread, returns False when one is already running"""
+        # two clicks can arrive on two callback threads, only one of them may start
+        with self.lock:
+            if self.running:
+                return False
+            self.running = True
+        threading.Thread(target=self.run, name="wifi-fleet", daemon=True).start()
+        return True
+
+    def run(self):
+        """Bring up all devices and wait for them, returns the result rows"""
+        self.running = True
+        try:
+            devices = self.connection_manager.devices_by_serial()
+            self.results = {}
+            pending = {}
+            for serial, device_ids in sorted(devices.items()):
+                usb_ids = [d for d in device_ids if ':' not in d]
+                wifi_ids = [d for d in device_ids if ':' in d]
+                if wifi_ids:
+                    self._update(serial, usb_ids[0] if usb_ids else None, "connected", endpoint=wifi_ids[0],
+                                 detail="already on Wi-Fi")
+                elif usb_ids:
+                    pending[serial] = usb_ids[0]
+                    self._update(serial, usb_ids[0], "queued")
+            logging.info(f"Wi-Fi bring-up of {len(pending)} device(s) with {self.workers} workers")
+            start = time.monotonic()
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="wifi-fleet") as pool:
+                for serial, usb_id in pending.items():
+                    pool.submit(self._bring_up, serial, usb_id)
+            connected = sum(row["status"] == "connected" for row in self.results.values())
+            logging.info(
+                f"Wi-Fi bring-up done in {time.monotonic() - start:.1f}s: {connected}/{len(self.results)} connected"
+            )
+            return self.rows()
+        finally:
+            self.running = False
+
+    def rows(self):
+        return sorted(self.results.values(), key=lambda row: row["serial"])
+
+    def _update(self, serial, usb_id, status, endpoint=None, detail="", attempts=0, seconds=None):
+        # rows are replaced, not changed in place, so readers never see half an update
+        self.results[serial] = {
+            "serial": serial, "usb_id": usb_id, "status": status, "endpoint": endpoint,
+            "detail": detail, "attempts": attempts, "seconds": seconds,
+        }
+
+    def _bring_up(self, serial, usb_id):
+        start = time.monotonic()
+        attempts = 0
+
+        def step(name, action, tries=STEP_ATTEMPTS):
+            nonlocal attempts
+            self._update(serial, usb_id, "running", detail=name, attempts=attempts)
+            for attempt in range(1, tries + 1):
+                attempts += 1
+                result = action()
+                if result:
+                    return result
+                if attempt < tries:
+                    time.sleep(RETRY_DELAY * attempt)
+            return None
+
+        try:
+            cached = self.connection_manager.wifi_endpoints.get(serial)
+            # a single try, a stale IP falls through to the full sequence
+            if cached and step("connect (cached IP)", lambda: self._connect(cached), tries=1):
+                endpoint, detail = cached, "cached IP"
+            else:
+                ip = step("ip addr", lambda: get_device_ip(usb_id))
+                if not ip:
+                    self._update(serial, usb_id, "failed", detail="no IP on wlan0", attempts=attempts,
+                                 seconds=time.monotonic() - start)
+                    return
+                endpoint, detail = f"{ip}:{WIFI_PORT}", "tcpip"
+                if not step("tcpip + connect", lambda: connect_wifi_adb(usb_id, ip, WIFI_PORT)):
+                    self._update(serial, usb_id, "failed", endpoint=endpoint, detail="connect failed",
+                                 attempts=attempts, seconds=time.monotonic() - start)
+                    return
+            self.connection_manager.wifi_endpoints[serial] = endpoint
+            self._update(serial, usb_id, "connected", endpoint=endpoint, detail=detail, attempts=attempts,
+                         seconds=time.monotonic() - start)
+        except Exception as e:
+            logging.error(f"Wi-Fi bring-up of {serial} failed: {e}")
+            self._update(serial, usb_id, "failed", detail=str(e), attempts=attempts, seconds=time.monotonic() - start)
+
+    @staticmethod
+    def _connect(endpoint):
+        output = run_adb_command(['connect', endpoint])
+        return bool(output and 'connected' in output.lower()) and wait_for_device(endpoint)
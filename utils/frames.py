@@ -0,0 +1,79 @@
+import logging
+import math
+
+from utils.parsers import parse_framestats
+
+# Echoed before the gfxinfo output in the shell call of the system metrics
+FRAMES_MARKER = "@@gfx"
+
+# Frame budget when the build does not report FrameInterval (Android 11 and older), 60Hz
+DEFAULT_FRAME_INTERVAL_NS = 16_666_667
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    index = max(math.ceil(fraction * len(sorted_values)) - 1, 0)
+    return sorted_values[index]
+
+
+def frame_stats(frames):
+    """Jank %, frame time percentiles and missed vsyncs of the frames of one interval"""
+    if not frames:
+        return {"gfx_frames": 0}
+    frame_times = []
+    janky = 0
+    missed_vsync = 0
+    for intended, vsync, frame_time, interval in frames:
+        interval = interval or DEFAULT_FRAME_INTERVAL_NS
+        frame_times.append(frame_time)
+        if frame_time > interval:
+            janky += 1
+        # the UI thread started the frame one or more vsyncs late
+        if vsync - intended >= interval:
+            missed_vsync += 1
+    frame_times.sort()
+    return {
+        "gfx_frames": len(frames),
+        "gfx_jank_pct": round(100 * janky / len(frames), 1),
+        "gfx_p50_ms": round(percentile(frame_times, 0.50) / 1e6, 2),
+        "gfx_p90_ms": round(percentile(frame_times, 0.90) / 1e6, 2),
+        "gfx_p99_ms": round(percentile(frame_times, 0.99) / 1e6, 2),
+        "gfx_missed_vsync": missed_vsync,
+    }
+
+
+class FrameStatsSampler:
+    """Incremental frame timing of one package from dumpsys gfxinfo framestats
+
+    gfxinfo keeps the last 120 frames of each window; only frames whose intended vsync
+    is newer than the last one seen are counted, so every poll covers just the interval
+    since the previous one. Intervals longer than the buffer (about 2s at 60Hz) only see
+    the most recent frames.
+    """
+    marker = FRAMES_MARKER
+
+    def __init__(self, package):
+        self.package = package
+        self.last_vsync = 0
+        self.primed = False
+
+    def shell_command(self):
+        return f"echo {FRAMES_MARKER}; dumpsys gfxinfo {self.package} framestats"
+
+    def reset(self):
+        self.last_vsync = 0
+        self.primed = False
+
+    def parse(self, output):
+        """Parse the output of shell_command, returns the sample fields or None"""
+        if output is None:
+            return None
+        frames = parse_framestats(output, self.last_vsync)
+        if frames:
+            self.last_vsync = frames[-1][0]
+        # the first poll returns whatever is buffered, not one interval's worth
+        if not self.primed:
+            self.primed = True
+            logging.debug(f"Frame stats baseline for {self.package}: {len(frames)} buffered frame(s) skipped")
+            return None
+        return frame_stats(frames)
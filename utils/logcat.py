@@ -0,0 +1,156 @@
+import logging
+import queue
+import subprocess
+import threading
+import time
+from datetime import datetime
+
+from utils.data import save_stream_to_db, format_timestamp
+from utils.parsers import parse_logcat_line, LOG_PRIORITIES
+from utils.metrics import LOGCAT_LINES, LOGCAT_DROPPED, LOGCAT_QUEUE_DEPTH
+
+# Lines waiting for the writer; when full the reader stops reading, so adb and logcat wait too
+QUEUE_SIZE = 20000
+
+# Lines per insert transaction, and the longest a line waits before it is written
+BATCH_SIZE = 1000
+FLUSH_INTERVAL = 1.0
+
+# How long the reader waits on a full queue before it starts dropping lines
+PUT_TIMEOUT = 5.0
+
+
+def parse_filter_specs(text):
+    """Validate logcat filterspecs like 'ActivityManager:I MyApp:V *:W', returns them as a tuple
+
+    Raises ValueError for anything logcat would reject.
+    """
+    specs = []
+    for spec in (text or "").split():
+        tag, sep, priority = spec.rpartition(':')
+        if not sep or not tag or len(priority) != 1 or priority.upper() not in LOG_PRIORITIES + 'S':
+            raise ValueError(f"Invalid logcat filter '{spec}', expected TAG:PRIORITY with a priority of {LOG_PRIORITIES}S")
+        specs.append(f"{tag}:{priority.upper()}")
+    return tuple(specs)
+
+
+class LogcatStream:
+    """Streams `adb logcat -v epoch` of one device into its logcat table
+
+    A reader thread parses lines into a bounded queue, a writer thread inserts them in
+    batches of up to BATCH_SIZE, one transaction each, and the FTS5 index is updated by
+    triggers in the same transaction. When the writer falls behind the reader blocks on
+    the full queue, which stops adb reading from the device; lines are only dropped
+    (and counted) when the queue stays full for PUT_TIMEOUT. Filtering happens on the
+    device through logcat's own filterspecs, so filtered lines never cross adb.
+
+    The stream restarts from the last line it saw when adb exits, e.g. on a reconnect.
+    """
+
+    def __init__(self, device_serial, filter_specs=(), to_host_time=None, model='Unknown', connection_type='Unknown'):
+        self.device_serial = device_serial
+        self.filter_specs = tuple(filter_specs)
+        # device epoch seconds -> host epoch seconds
+        self.to_host_time = to_host_time or (lambda device_time: device_time)
+        self.model = model
+        self.connection_type = connection_type
+        self.device_id = None
+        self.process = None
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.stop_event = threading.Event()
+        self.writer = None
+        # device time of the newest line and the lines sharing it, to skip them when logcat restarts from that time
+        self.last_time = None
+        self.last_lines = set()
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def ensure_running(self, device_id):
+        """Start the stream, or restart it when adb exited or the device is reached through another transport"""
+        if self.running and device_id == self.device_id:
+            return
+        self._close_process()
+        self.device_id = device_id
+        since = f"{self.last_time:.3f}" if self.last_time is not None else "1"
+        command = ["adb", "-s", device_id, "logcat", "-v", "epoch", "-T", since, *self.filter_specs]
+        try:
+            self.process = subprocess.Popen(
+                command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, errors="replace"
+            )
+        except OSError as e:
+            logging.error(f"Could not start logcat for {self.device_serial}: {e}")
+            self.process = None
+            return
+        logging.info(f"Streaming logcat of {self.device_serial} since {since}")
+        threading.Thread(
+            target=self._read, args=(self.process,), name=f"logcat-reader-{self.device_serial}", daemon=True
+        ).start()
+        if self.writer is None:
+            self.writer = threading.Thread(target=self._write, name=f"logcat-writer-{self.device_serial}", daemon=True)
+            self.writer.start()
+
+    def stop(self):
+        """Stop adb and write out the lines still queued"""
+        self._close_process()
+        self.stop_event.set()
+        if self.writer:
+            self.writer.join(timeout=10)
+            self.writer = None
+
+    def _close_process(self):
+        process, self.process = self.process, None
+        if process is None or process.poll() is not None:
+            return
+        process.terminate()
+        try:
+            process.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    def _read(self, process):
+        restart_time = self.last_time
+        for line in process.stdout:
+            record = parse_logcat_line(line)
+            if record is None:
+                continue
+            device_time = record[0]
+            if restart_time is not None:
+                # -T includes the lines at the restart time, some of them were stored already
+                if device_time < restart_time or (device_time == restart_time and line in self.last_lines):
+                    continue
+                restart_time = None
+            if device_time != self.last_time:
+                self.last_time = device_time
+                self.last_lines = set()
+            self.last_lines.add(line)
+            try:
+                self.queue.put(record, timeout=PUT_TIMEOUT)
+            except queue.Full:
+                LOGCAT_DROPPED.inc(self.device_serial)
+        logging.info(f"Logcat stream of {self.device_serial} ended")
+
+    def _write(self):
+        while not (self.stop_event.is_set() and self.queue.empty()):
+            try:
+                batch = [self.queue.get(timeout=FLUSH_INTERVAL)]
+            except queue.Empty:
+                continue
+            # quiet logs are written once per FLUSH_INTERVAL, busy ones once per BATCH_SIZE lines
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            while len(batch) < BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or (self.stop_event.is_set() and self.queue.empty()):
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            LOGCAT_QUEUE_DEPTH.set(self.queue.qsize(), self.device_serial)
+            rows = [
+                (format_timestamp(datetime.fromtimestamp(self.to_host_time(record[0]))), *record)
+                for record in batch
+            ]
+            if save_stream_to_db(self.device_serial, 'logcat_table', rows, self.model, self.connection_type):
+                LOGCAT_LINES.inc(self.device_serial, amount=len(rows))
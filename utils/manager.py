@@ -1,7 +1,14 @@
 import logging
 import time
 
-from utils.adb import run_adb_command, get_unique_devices, get_device_model, get_device_serial, get_device_ip, connect_wifi_adb
+from utils.adb import (
+    run_adb_command, get_unique_devices, get_device_model, get_device_serial, get_device_ip, connect_wifi_adb,
+    list_devices,
+)
+from utils.metrics import TRANSPORT_FAILOVERS
+
+# Seconds between two refreshes of the standby transport, each costs one `adb devices`
+STANDBY_CHECK_INTERVAL = 5
 
 class NotificationManager:
     def __init__(self):
@@ -52,14 +59,53 @@ class ConnectionManager:
         }
         self.wifi_connect_ip = None
         self.wifi_connect_serial = None
+        # device id -> serial, so only ids adb has not listed before cost a getprop
+        self.serials = {}
+        # serial -> last Wi-Fi endpoint seen, reconnected while the device is on USB
+        self.wifi_endpoints = {}
+        # validated second transport of the current device, (device id, connection type)
+        self.standby = None
+        self.standby_checked = 0
         logging.debug("ConnectionManager initialized")
 
+    def devices_by_serial(self):
+        """Device ids in the "device" state grouped by serial, from one `adb devices` call"""
+        listed = list_devices()
+        # the fleet and monitoring threads both call this, so the cache is only touched with
+        # single dict operations, another thread may have pruned or filled an entry in between
+        for device_id in list(self.serials):
+            if device_id not in listed:
+                self.serials.pop(device_id, None)
+        devices = {}
+        for device_id, state in listed.items():
+            if state != 'device':
+                continue
+            serial = self.serials.get(device_id)
+            if not serial:
+                serial = self.serials[device_id] = get_device_serial(device_id)
+            if not serial:
+                continue
+            devices.setdefault(serial, []).append(device_id)
+            if ':' in device_id:
+                self.wifi_endpoints[serial] = device_id
+        return devices
+
+    def may_have_transport(self, serial_number):
+        """Whether `adb devices` lists a ready id that is, or may be, this serial; no getprop"""
+        return any(
+            state == 'device' and self.serials.get(device_id) in (None, '', serial_number)
+            for device_id, state in list_devices().items()
+        )
+
+    def transports(self, serial_number):
+        """Device ids in the "device" state for a serial"""
+        return self.devices_by_serial().get(serial_number, [])
+
     def get_best_connection_for_serial(self, serial_number):
         """Return the best connection ID for a given serial number, preferring USB over WiFi"""
-        devices = get_unique_devices()
+        device_ids = self.transports(serial_number)
         logging.info(f"Finding best connection for serial : {serial_number}")
-        if serial_number in devices:
-            device_ids = devices[serial_number]
+        if device_ids:
             # more priority for USB connections
             for device_id in device_ids:
                 if ':' not in device_id:
@@ -121,24 +167,68 @@ class ConnectionManager:
         logging.critical("Failed to find a usable device connection.")
         return False
     
+    def refresh_standby(self, force=False):
+        """Keep a second transport of the current device ready for a failover
+
+        At most once every STANDBY_CHECK_INTERVAL seconds. While on USB, a Wi-Fi endpoint
+        the device had before is reconnected with `adb connect` (adbd still listens on TCP
+        until the device reboots), so a cable pull does not wait for a reconnect.
+        """
+        serial = self.device_info['persistent_id']
+        if not serial or (not force and time.monotonic() - self.standby_checked < STANDBY_CHECK_INTERVAL):
+            return self.standby
+        self.standby_checked = time.monotonic()
+
+        others = [d for d in self.transports(serial) if d != self.device_info['device_id']]
+        endpoint = self.wifi_endpoints.get(serial)
+        if not others and endpoint and self.device_info['connection_type'] == "USB":
+            output = run_adb_command(['connect', endpoint])
+            if output and 'connected' in output.lower():
+                others = [d for d in self.transports(serial) if d != self.device_info['device_id']]
+
+        standby = None
+        # USB first, like get_best_connection_for_serial
+        for device_id in sorted(others, key=lambda d: ':' in d):
+            standby = (device_id, "Wi-Fi" if ':' in device_id else "USB")
+            break
+        if standby != self.standby:
+            logging.info(f"Standby transport for {serial}: {standby[0] if standby else 'none'}")
+        self.standby = standby
+        return standby
+
+    def failover(self):
+        """Switch to the standby transport after the active one was lost, returns True on success"""
+        if not self.standby:
+            return False
+        device_id, conn_type = self.standby
+        self.standby = None
+        if not self.check_device_connection(device_id):
+            logging.info(f"Standby transport {device_id} is gone as well")
+            return False
+        logging.info(f"Failing over from {self.device_info['device_id']} to {conn_type} connection {device_id}")
+        self.device_info['device_id'] = device_id
+        self.device_info['connection_type'] = conn_type
+        TRANSPORT_FAILOVERS.inc(self.device_info['persistent_id'])
+        # look for a new standby on the next tick
+        self.standby_checked = 0
+        return True
+
     def check_for_better_connection(self):
         """Check if there's a better connection available for the current device"""
         if not self.device_info['persistent_id']:
             return False
-            
-        # keep checking for USB
-        if self.device_info['connection_type'] == "USB":
-            return False
-            
-        best_device_id, conn_type = self.get_best_connection_for_serial(self.device_info['persistent_id'])
-        
-        if best_device_id and conn_type == "USB" and self.device_info['connection_type'] == "Wi-Fi":
-            logging.info(f"Switching from Wi-Fi to USB connection: {best_device_id}")
-            self.device_info['device_id'] = best_device_id
+
+        standby = self.refresh_standby()
+
+        # USB is preferred, a Wi-Fi device that gets a cable switches to it
+        if standby and standby[1] == "USB" and self.device_info['connection_type'] == "Wi-Fi":
+            logging.info(f"Switching from Wi-Fi to USB connection: {standby[0]}")
+            self.standby = (self.device_info['device_id'], "Wi-Fi")
+            self.device_info['device_id'] = standby[0]
             self.device_info['connection_type'] = "USB"
             logging.info("Switched to USB connection.")
             return True
-            
+
         return False
     
     def try_wifi_connect(self, serial_number):
@@ -193,6 +283,7 @@ class ConnectionManager:
             
             if wifi_status:
                 logging.info(f"Connected to {usb_device_id} via Wi-Fi at {ip_output}")
+                self.wifi_endpoints[serial_number] = f"{ip_output}:5555"
                 # set flags for checking connection status
                 self.wifi_connect_ip = ip_output
                 self.wifi_connect_serial = serial_number
@@ -218,8 +309,4 @@ class ConnectionManager:
         if not serial_number:
             return None, None
             
-        unique_devices = get_unique_devices()
-        if serial_number in unique_devices:
-            return self.get_best_connection_for_serial(serial_number)
-            
-        return None, None
\ No newline at end of file
+        return self.get_best_connection_for_serial(serial_number)
\ No newline at end of file
@@ -0,0 +1,187 @@
+import bisect
+import functools
+import threading
+import time
+
+# Latency buckets in seconds, from sub-millisecond parsing up to adb timeouts.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base class for a metric family, each label combination is one series"""
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            items = sorted(self.series.items())
+            for label_values, value in items:
+                lines.extend(self._render_series(label_values, value))
+        return lines
+
+    def _render_series(self, label_values, value):
+        return [f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.series[label_values] = self.series.get(label_values, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, *label_values):
+        with self.lock:
+            self.series[label_values] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *label_values):
+        # bucket lookup happens outside the lock, the locked part is three additions
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def _render_series(self, label_values, value):
+        counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labels, label_values, f'le="{_format_value(float(bound))}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labels, label_values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=()):
+        return self.register(Gauge(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def render(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def timed(histogram, *label_values):
+    """Decorator recording the duration of every call in a histogram"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start, *label_values)
+        return wrapper
+    return decorator
+
+
+def register_metrics_endpoint(server, path="/metrics"):
+    """Expose the registry on a Flask server"""
+    def metrics():
+        return REGISTRY.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+    server.add_url_rule(path, "telemetry_metrics", metrics)
+
+
+REGISTRY = MetricsRegistry()
+
+ADB_COMMAND_SECONDS = REGISTRY.histogram(
+    "telemetry_adb_command_seconds", "Duration of adb commands.", labels=("command",))
+ADB_COMMAND_ERRORS = REGISTRY.counter(
+    "telemetry_adb_command_errors_total", "adb commands that timed out or failed.", labels=("command",))
+PARSE_TOP_SECONDS = REGISTRY.histogram(
+    "telemetry_parse_top_summary_seconds", "Time spent parsing top output.")
+SAVE_TO_DB_SECONDS = REGISTRY.histogram(
+    "telemetry_save_data_to_db_seconds", "Time spent writing one sample to SQLite, including lock wait.")
+SAVE_TO_DB_ERRORS = REGISTRY.counter(
+    "telemetry_save_data_to_db_errors_total", "Samples that could not be written to SQLite.")
+ADD_DATA_POINT_SECONDS = REGISTRY.histogram(
+    "telemetry_add_data_point_seconds", "Time spent adding a sample to the live buffer.")
+SAMPLES_COLLECTED = REGISTRY.counter(
+    "telemetry_samples_total", "Samples collected.", labels=("device",))
+MONITOR_TICK_SECONDS = REGISTRY.histogram(
+    "telemetry_monitor_tick_seconds", "Duration of one monitoring loop iteration.")
+SCHEDULER_LAG_SECONDS = REGISTRY.histogram(
+    "telemetry_scheduler_lag_seconds", "Delay between the planned and the actual start of a monitoring tick.")
+CALLBACK_SECONDS = REGISTRY.histogram(
+    "telemetry_callback_seconds", "Duration of Dash callbacks.", labels=("callback",))
+LOGCAT_LINES = REGISTRY.counter(
+    "telemetry_logcat_lines_total", "Logcat lines stored.", labels=("device",))
+LOGCAT_DROPPED = REGISTRY.counter(
+    "telemetry_logcat_dropped_total", "Logcat lines dropped because the write queue stayed full.", labels=("device",))
+LOGCAT_QUEUE_DEPTH = REGISTRY.gauge(
+    "telemetry_logcat_queue_depth", "Logcat lines waiting to be written.", labels=("device",))
+TRANSPORT_FAILOVERS = REGISTRY.counter(
+    "telemetry_transport_failovers_total", "Switches to the standby transport after the active one was lost.",
+    labels=("device",))
+EXPORT_SAMPLES = REGISTRY.counter(
+    "telemetry_export_samples_total", "Samples accepted by the export destination.", labels=("format",))
+EXPORT_DROPPED = REGISTRY.counter(
+    "telemetry_export_dropped_total", "Samples that will not be exported, by reason.", labels=("reason",))
+EXPORT_REQUEST_SECONDS = REGISTRY.histogram(
+    "telemetry_export_request_seconds", "Duration of export requests, failed ones included.", labels=("format",))
+EXPORT_QUEUE_DEPTH = REGISTRY.gauge(
+    "telemetry_export_queue_depth", "Samples waiting to be batched for export.")
+EXPORT_SPOOL_BYTES = REGISTRY.gauge(
+    "telemetry_export_spool_bytes", "Encoded batches on disk waiting to be resent.")
@@ -1,10 +1,51 @@
 import logging
-import pandas as pd
 import threading
 import time
-from utils.data import save_data_to_db, remove_ansi_escape_codes, parse_top_summary
+from collections import deque
+from datetime import datetime
+from utils.data import (
+    save_data_to_db,
+    save_data_points_to_db,
+    save_processes_to_db,
+    save_batches_to_db,
+    save_burst_to_db,
+    save_stream_to_db,
+    save_stats_to_db,
+    create_session,
+    finish_session,
+    format_timestamp,
+    remove_ansi_escape_codes,
+    parse_top_summary,
+)
+from utils.parsers import parse_top_processes, parse_battery_status, split_sections
+from utils.target import TargetAppSampler
+from utils.frames import FrameStatsSampler
+from utils.cpufreq import CoreThermalSampler
+from utils.power import PowerSampler
+from utils.network import NetworkSampler
+from utils.logcat import LogcatStream
+from utils.agent import DeviceAgent, BATTERY_MARKER, frame_records
+from utils.backfill import BackfillBuffer
+from utils.adaptive import AdaptiveInterval
+from utils.stats import StatsEngine
+from utils.alerts import AlertEngine, alert_message
+from utils.burst import capture_burst, parse_burst
 from utils.adb import get_battery_status
 from utils.adb import run_adb_command
+from utils.timing import ClockOffsetEstimator, timed_shell_command, split_timed_output
+from utils.metrics import (
+    timed,
+    ADD_DATA_POINT_SECONDS,
+    MONITOR_TICK_SECONDS,
+    SAMPLES_COLLECTED,
+    SCHEDULER_LAG_SECONDS,
+)
+
+# Seconds between reconnection attempts while paused
+RECONNECT_POLL_INTERVAL = 0.5
+
+# Seconds between two saves of the session statistics, they are saved again when monitoring stops
+STATS_SAVE_INTERVAL = 60
 
 
 class MonitoringController:
@@ -12,23 +53,44 @@ class MonitoringController:
         self.connection_manager = connection_manager
         self.state = monitoring_state
         self.notification_manager = None
+        self.clock = ClockOffsetEstimator()
+        self.target = None
+        self.frames = None
+        self.cores = None
+        self.power = None
+        self.net = None
+        self.logcat = None
+        self.agent = None
+        self.backfill = None
+        self.adaptive = None
+        # interval set at start, restored when the adaptive mode is switched off
+        self.base_interval = None
+        self.stats_saved = 0
+        self.alerts = None
 
     def start_monitoring(
-        self, interval=5, selected_device_id=None, monitoring_interval=2
+        self, interval=5, selected_device_id=None, monitoring_interval=2, label=None, metadata=None
     ):
+        """Start monitoring a device in a session with this label and metadata"""
         if self.state.monitoring_active:
             logging.warning("Monitoring already active.")
             return False
 
         self.state.auto_stopped = False
         self.state.monitoring_interval = monitoring_interval
+        self.base_interval = monitoring_interval
+        self.adaptive = None
 
         if not self.connection_manager.setup_device_connection(selected_device_id):
             logging.error("Failed to set up device connection.")
             return False
 
+        self.start_session(label, metadata)
         self.state.monitoring_active = True
-        self.state.monitoring_thread = threading.Thread(target=self._monitor_device)
+        self.state.monitoring_thread = threading.Thread(
+            target=self._monitor_device,
+            name=f"monitoring-{self.connection_manager.device_info['persistent_id']}",
+        )
         self.state.monitoring_thread.daemon = True
         self.state.monitoring_thread.start()
 
@@ -44,14 +106,63 @@ class MonitoringController:
 
         self.state.reset_monitoring_state()
 
+        # ends the record stream the monitoring thread is reading
+        agent = self.agent
+        if agent:
+            agent.stop()
+
         if self.state.monitoring_thread:
             self.state.monitoring_thread.join(timeout=1.0)
 
+        if self.logcat:
+            self.logcat.stop()
+            self.logcat = None
+
+        self.end_session()
         logging.info("Monitoring stopped.")
 
+    def start_session(self, label=None, metadata=None):
+        """End the current session and start a new one on the monitored device, returns its id
+
+        Statistics start over. The session is recorded in the database with the label, the
+        given metadata and the sampling settings, its summaries are stored by end_session.
+        """
+        self.end_session()
+        self.state.start_session(label, {
+            "interval": self.base_interval,
+            "adaptive": self.state.adaptive_range,
+            "package": self.state.target_package,
+            **(metadata or {}),
+        })
+        info = self.connection_manager.device_info
+        if self.state.save_to_local_db and info["persistent_id"]:
+            self.state.session_id = create_session(
+                info["persistent_id"], self.state.session_start, label, self.state.session_metadata,
+                info["model"], info["connection_type"],
+            )
+        logging.info(f"Session {self.state.session_id} started{f' ({label})' if label else ''}")
+        return self.state.session_id
+
+    def end_session(self):
+        """Store the summaries and downsampled series of the current session, returns its id"""
+        if not self.state.session_start:
+            return None
+        self._save_stats(force=True)
+        session_id = self.state.session_id
+        self.state.session_start = None
+        self.state.session_id = None
+        if session_id is not None:
+            finish_session(session_id, datetime.now(), self.state.stats.rows())
+            logging.info(f"Session {session_id} ended")
+        return session_id
+
     def _monitor_device(self):
         """Main monitoring loop with state-based handling"""
+        planned_start = None
         while self.state.monitoring_active:
+            tick_start = time.perf_counter()
+            if planned_start is not None:
+                SCHEDULER_LAG_SECONDS.observe(max(tick_start - planned_start, 0.0))
             try:
                 if self.state.monitoring_paused:
                     self._handle_paused_state()
@@ -59,21 +170,25 @@ class MonitoringController:
                     self._handle_active_monitoring()
             except Exception as e:
                 logging.error(f"Monitoring error: {e}")
-
-            time.sleep(self.state.monitoring_interval)
+            # streamed records are timed one by one
+            if not self.state.streaming:
+                MONITOR_TICK_SECONDS.observe(time.perf_counter() - tick_start)
+
+            # lag is measured against one interval after the previous tick started
+            planned_start = None if self.state.streaming else tick_start + self.state.monitoring_interval
+            if self.state.monitoring_paused:
+                # a returning device is picked up within a poll, not a whole interval later
+                planned_start = None
+                time.sleep(min(self.state.monitoring_interval, RECONNECT_POLL_INTERVAL))
+            else:
+                time.sleep(self.state.monitoring_interval)
 
     def _handle_paused_state(self):
-        """Handle monitoring when in paused state (reconnection)"""
-        logging.info(
-            f"Entering Paused state with a timeout of {self.state.max_pause_duration}"
-        )
-        logging.info(
-            f"Time left until waiting timeout : {self.state.pause_start_time + self.state.max_pause_duration - time.time()}"
-        )
-        if self.notification_manager:
-            self.notification_manager.set_notification(
-                "Monitoring paused.", "notification-error", 4
-            )
+        """Handle monitoring when in paused state (reconnection)
+
+        Runs every RECONNECT_POLL_INTERVAL, so a poll is one `adb devices` until a transport
+        that may be the device shows up; the pause itself is logged once when it starts.
+        """
         # Check for timeout
         if (
             self.state.pause_start_time
@@ -90,10 +205,14 @@ class MonitoringController:
             self.state.auto_stopped = True
             self.state.monitoring_active = False
             self.state.monitoring_paused = False
+            self.end_session()
             return
 
         # Try to reconnect
         current_serial = self.connection_manager.device_info["persistent_id"]
+        if not self.connection_manager.may_have_transport(current_serial):
+            self.state.reconnect_attempts += 1
+            return
         best_device_id, conn_type = self.connection_manager.find_device_connection(
             current_serial
         )
@@ -115,6 +234,7 @@ class MonitoringController:
                         "notification-success",
                         5,
                     )
+                self._pull_backfill()
                 return
 
         self.state.reconnect_attempts += 1
@@ -123,20 +243,35 @@ class MonitoringController:
         """Handle normal active monitoring state"""
         current_device_id = self.connection_manager.device_info["device_id"]
 
-        if self.connection_manager.device_info["connection_type"] == "Wi-Fi":
-            self.connection_manager.check_for_better_connection()
+        # also keeps the standby transport fresh on USB
+        self.connection_manager.check_for_better_connection()
 
         if not self.connection_manager.check_device_connection(current_device_id):
             self._handle_connection_lost()
-            return
+            # after a failover this tick's sample comes from the new transport
+            if self.state.monitoring_paused:
+                return
 
-        self._collect_device_data()
+        self._logcat_stream()
+        if self.state.streaming:
+            self._stream_device_data()
+        else:
+            self._collect_device_data()
 
     def _handle_connection_lost(self):
         """Handle case when device connection is lost"""
         current_serial = self.connection_manager.device_info["persistent_id"]
         logging.warning(f"Device connection lost for {current_serial}")
 
+        if self.connection_manager.failover():
+            conn_type = self.connection_manager.device_info["connection_type"]
+            if self.notification_manager:
+                self.notification_manager.set_notification(
+                    f"Switched to the {conn_type} connection of {current_serial}", "notification-success", 4
+                )
+            self._pull_backfill()
+            return
+
         best_device_id, conn_type = self.connection_manager.find_device_connection(
             current_serial
         )
@@ -149,11 +284,20 @@ class MonitoringController:
             logging.info(
                 f"Reconnected to same device via {conn_type}: {best_device_id}"
             )
+            self._pull_backfill()
         else:
             self.state.monitoring_paused = True
             self.state.pause_start_time = time.time()
             self.state.reconnect_attempts = 1
-            logging.warning(f"Device {current_serial} disconnected. Monitoring paused.")
+            logging.warning(
+                f"Device {current_serial} disconnected. Monitoring paused, "
+                f"waiting up to {self.state.max_pause_duration}s for it to return."
+            )
+            if self.notification_manager:
+                # shown for the whole pause, reconnecting or timing out replaces it
+                self.notification_manager.set_notification(
+                    "Monitoring paused.", "notification-error", 4, duration=self.state.max_pause_duration
+                )
 
     def _collect_device_data(self):
         """Collect and process device data"""
@@ -163,10 +307,13 @@ class MonitoringController:
 
         for attempt in range(max_retries):
             try:
+                samplers = self._samplers()
+                host_send = time.time()
                 raw_output = run_adb_command(
-                    ["shell", "top", "-n", "1"],
+                    ["shell", timed_shell_command(self._sample_command(samplers))],
                     self.connection_manager.device_info["device_id"],
                 )
+                host_receive = time.time()
 
                 if not raw_output:
                     if attempt < max_retries - 1:
@@ -179,45 +326,7 @@ class MonitoringController:
                         logging.error("Failed to get data after max retries")
                         return
 
-                clean_output = remove_ansi_escape_codes(raw_output)
-                lines = clean_output.splitlines()
-
-                data = parse_top_summary(
-                    lines,
-                    device_serial=self.connection_manager.device_info["persistent_id"],
-                )
-                if data:
-                    device_id = self.connection_manager.device_info["device_id"]
-                    conn_type = "Wi-Fi" if ":" in device_id else "USB"
-                    if (
-                        conn_type
-                        != self.connection_manager.device_info["connection_type"]
-                    ):
-                        self.connection_manager.device_info["connection_type"] = (
-                            conn_type
-                        )
-
-                    data["model"] = self.connection_manager.device_info["model"]
-                    data["connection_type"] = self.connection_manager.device_info[
-                        "connection_type"
-                    ]
-
-                    # ==== Add new metrics fetching here ====
-                    battery_data = get_battery_status(device_id)
-                    data["battery_level"] = battery_data.get("level", None)
-                    data["battery_temp"] = battery_data.get("temperature", None)
-                    data["charging_status"]=battery_data.get("charging_status",None)
-                    data["battery_health"]=battery_data.get("battery_health",None)
-
-                    # ==== End new metrics ====
-
-                    if self.state.save_to_local_db:
-                        save_data_to_db(data)
-
-                    self._handle_device_change()
-
-                    self.state.add_data_point(data)
-
+                self._process_output(raw_output, samplers, host_send, host_receive)
                 break
 
             except Exception as e:
@@ -231,6 +340,417 @@ class MonitoringController:
                         f"Failed to collect data after {max_retries} attempts: {e}"
                     )
 
+    def _stream_device_data(self):
+        """Run the on-device agent and process its records until the stream ends or streaming is switched off"""
+        while self.state.monitoring_active and self.state.streaming:
+            if not self._run_agent():
+                return
+
+    def _run_agent(self):
+        """Process the records of one agent, returns True when it was stopped to run another command"""
+        samplers = self._samplers()
+        sample_command = self._sample_command(samplers)
+        command = timed_shell_command(f"{sample_command}; echo {BATTERY_MARKER}; dumpsys battery")
+        interval = self.state.monitoring_interval
+        self.agent = DeviceAgent(self.connection_manager.device_info["device_id"], command, interval)
+        if not self.agent.start():
+            self.agent = None
+            return False
+        try:
+            for _, record in self.agent.records():
+                tick_start = time.perf_counter()
+                try:
+                    self._process_output(record, samplers, None, time.time())
+                except Exception as e:
+                    logging.error(f"Failed to process streamed record: {e}")
+                self._logcat_stream()
+                MONITOR_TICK_SECONDS.observe(time.perf_counter() - tick_start)
+                if not self.state.monitoring_active or not self.state.streaming:
+                    return False
+                # connection management goes on while streaming: the standby transport is kept
+                # fresh (at most every STANDBY_CHECK_INTERVAL) and a better one gets the agent
+                if self.connection_manager.check_for_better_connection():
+                    logging.info("Restarting the device agent on the new transport")
+                    return True
+                # the pushed script is fixed, samplers that need another command (first read,
+                # a restarted target app, a switched collector) get a new agent
+                current = self._samplers()
+                if (
+                    current != samplers
+                    or self._sample_command(current) != sample_command
+                    or self.state.monitoring_interval != interval
+                ):
+                    logging.debug("Sampler commands changed, restarting the device agent")
+                    return True
+            # adb exited, the connection is checked before the next agent starts
+            return False
+        finally:
+            if self.agent:
+                self.agent.stop()
+                self.agent = None
+
+    def _samplers(self):
+        """Enabled samplers, each one's output follows its marker line in the shell output"""
+        return [
+            sampler
+            for sampler in (
+                self._backfill_buffer(),
+                self._core_sampler(),
+                self._power_sampler(),
+                self._target_sampler(),
+                self._frame_sampler(),
+                self._net_sampler(),
+            )
+            if sampler
+        ]
+
+    @staticmethod
+    def _sample_command(samplers):
+        # the device clock and every enabled sampler are read in the same shell call as top
+        return "; ".join(["top -n 1", *(sampler.shell_command() for sampler in samplers)])
+
+    def _process_output(self, raw_output, samplers, host_send, host_receive):
+        """Parse one timed shell output into a sample, store and buffer it
+
+        host_send is None for streamed records, they were not requested by the host.
+        """
+        device_start, device_end, top_output = split_timed_output(raw_output)
+        markers = {sampler.marker for sampler in samplers} | {BATTERY_MARKER}
+        top_output, sections = split_sections(top_output, markers)
+        clean_output = remove_ansi_escape_codes(top_output)
+        lines = clean_output.splitlines()
+
+        streamed = host_send is None
+        if streamed and device_start is not None and device_end is not None:
+            # a streamed record is read as soon as it is written, only the one-way latency is unknown
+            host_send = host_receive - (device_end - device_start)
+        capture_time = self._capture_time(host_send, host_receive, device_start, device_end)
+        data = parse_top_summary(
+            lines,
+            device_serial=self.connection_manager.device_info["persistent_id"],
+            timestamp=datetime.fromtimestamp(capture_time),
+        )
+        if not data:
+            return
+
+        device_id = self.connection_manager.device_info["device_id"]
+        conn_type = "Wi-Fi" if ":" in device_id else "USB"
+        if (
+            conn_type
+            != self.connection_manager.device_info["connection_type"]
+        ):
+            self.connection_manager.device_info["connection_type"] = (
+                conn_type
+            )
+
+        data["device_time"] = device_end
+        data["sample_interval"] = self.state.monitoring_interval
+        data["collection_latency_ms"] = None if streamed else (host_receive - host_send) * 1000
+        data["clock_offset_ms"] = (
+            self.clock.offset * 1000 if self.clock.offset is not None else None
+        )
+        data["model"] = self.connection_manager.device_info["model"]
+        data["connection_type"] = self.connection_manager.device_info[
+            "connection_type"
+        ]
+
+        # ==== Add new metrics fetching here ====
+        if BATTERY_MARKER in sections:
+            battery_data = parse_battery_status(sections[BATTERY_MARKER])
+        else:
+            battery_data = get_battery_status(device_id)
+        data.update(self._battery_fields(battery_data))
+
+        for sampler in samplers:
+            data.update(sampler.parse(sections.get(sampler.marker)) or {})
+
+        # ==== End new metrics ====
+
+        processes = None
+        if self.state.process_top_k:
+            processes = parse_top_processes(lines, self.state.process_top_k)
+
+        if self.state.save_to_local_db:
+            save_data_to_db(data)
+            if processes:
+                save_processes_to_db(data, processes)
+            batches = {}
+            for sampler in samplers:
+                batches.update(getattr(sampler, "batches", {}))
+            if batches:
+                save_batches_to_db(data, batches)
+
+        self._handle_device_change()
+
+        # before the sample is added, anomaly rules compare it with the statistics of the earlier ones
+        self._evaluate_alerts(data)
+        self.state.add_data_point(data)
+        if processes:
+            self.state.add_process_batch(data, processes)
+        SAMPLES_COLLECTED.inc(data.get("device_serial", "unknown"))
+        self._adapt_interval(data)
+        self._save_stats()
+
+    def _evaluate_alerts(self, data):
+        """Check the alert rules against a sample, save what fired or cleared and notify"""
+        if not self.state.alerts_enabled:
+            self.alerts = None
+            return
+        if self.alerts is None or self.alerts.rules is not self.state.alert_rules:
+            self.alerts = AlertEngine(self.state.alert_rules)
+            # the engine fills in defaults, keep its list so it is only compiled once
+            self.state.alert_rules = self.alerts.rules
+        events = self.alerts.evaluate(data, self.state.stats)
+        if not events:
+            return
+        rows = []
+        for rule, state, value, notify in events:
+            message = alert_message(rule, state, value)
+            (logging.warning if state == "fired" else logging.info)(f"Alert {message}")
+            rows.append((
+                format_timestamp(data["timestamp"]), rule.name, rule.metric, state, rule.severity,
+                value, rule.threshold, message,
+            ))
+            if notify and self.notification_manager:
+                self.notification_manager.set_notification(
+                    message, "notification-error", priority=5 if rule.severity == "critical" else 4, duration=10
+                )
+        self.state.alerts.extend(rows)
+        if self.state.save_to_local_db:
+            save_stream_to_db(data["device_serial"], "alerts_table", rows, data["model"], data["connection_type"])
+
+    def _save_stats(self, force=False):
+        """Save the session statistics, at most every STATS_SAVE_INTERVAL seconds unless forced"""
+        if not self.state.save_to_local_db or not self.state.session_start:
+            return
+        if not force and time.monotonic() - self.stats_saved < STATS_SAVE_INTERVAL:
+            return
+        self.stats_saved = time.monotonic()
+        rows = self.state.stats.rows()
+        info = self.connection_manager.device_info
+        if rows and info["persistent_id"]:
+            save_stats_to_db(info["persistent_id"], self.state.session_start, rows, info["model"], info["connection_type"])
+
+    def _adapt_interval(self, data):
+        """In adaptive mode, move the interval with the activity of the latest sample and record the switch"""
+        if not self.state.adaptive_range:
+            if self.adaptive is not None:
+                self.adaptive = None
+                if self.base_interval:
+                    self.state.monitoring_interval = self.base_interval
+            return
+        low, high = self.state.adaptive_range
+        if self.adaptive is None or (self.adaptive.min_interval, self.adaptive.max_interval) != (low, high):
+            self.adaptive = AdaptiveInterval(low, high)
+        change = self.adaptive.update(data, self.state.monitoring_interval)
+        if change is None:
+            return
+        interval, reason = change
+        previous = self.state.monitoring_interval
+        self.state.monitoring_interval = interval
+        logging.info(f"Sampling interval {previous:g}s -> {interval:g}s ({reason})")
+        if self.state.save_to_local_db:
+            save_stream_to_db(
+                data["device_serial"], "rate_table",
+                [(format_timestamp(data["timestamp"]), interval, previous, round(self.adaptive.activity, 3), reason)],
+                data["model"], data["connection_type"],
+            )
+
+    @staticmethod
+    def _battery_fields(battery_data):
+        return {
+            "battery_level": battery_data.get("level", None),
+            "battery_temp": battery_data.get("temperature", None),
+            "charging_status": battery_data.get("charging_status", None),
+            "battery_health": battery_data.get("battery_health", None),
+        }
+
+    def _pull_backfill(self):
+        """Merge the samples the device buffered while the host could not reach it"""
+        if not self.backfill:
+            return
+        content = self.backfill.pull(self.connection_manager.device_info["device_id"])
+        if not content:
+            return
+        last = self.state.latest().get("timestamp")
+        points = []
+        for _, record in frame_records(content.splitlines(keepends=True)):
+            data = self._backfill_point(record)
+            # the last poll before the disconnect may have raced the loop's first record
+            if data and (last is None or data["timestamp"] > last):
+                points.append(data)
+        if not points:
+            return
+
+        if self.state.save_to_local_db:
+            save_data_points_to_db(points)
+        self.state.merge_data_points(points)
+        self.state.backfilled_ranges.append((points[0]["timestamp"], points[-1]["timestamp"]))
+        logging.info(
+            f"Backfilled {len(points)} sample(s) from {points[0]['timestamp']} to {points[-1]['timestamp']}"
+        )
+        if self.notification_manager:
+            self.notification_manager.set_notification(
+                f"Backfilled {len(points)} sample(s) recorded during the disconnect.", "notification-success", 4
+            )
+
+    def _backfill_point(self, record):
+        """Parse one buffered record into a sample, without touching the sampler state"""
+        device_start, device_end, output = split_timed_output(record)
+        if device_end is None:
+            return None
+        output, sections = split_sections(output, {BATTERY_MARKER})
+        data = parse_top_summary(
+            remove_ansi_escape_codes(output).splitlines(),
+            device_serial=self.connection_manager.device_info["persistent_id"],
+            timestamp=datetime.fromtimestamp(self.clock.to_host_time(device_end)),
+        )
+        if not data:
+            return None
+        data["device_time"] = device_end
+        data["clock_offset_ms"] = self.clock.offset * 1000 if self.clock.offset is not None else None
+        data["model"] = self.connection_manager.device_info["model"]
+        data["connection_type"] = self.connection_manager.device_info["connection_type"]
+        data.update(self._battery_fields(parse_battery_status(sections.get(BATTERY_MARKER, ""))))
+        data["backfilled"] = 1
+        return data
+
+    def capture_burst(self, duration, rate_hz):
+        """Start a burst capture of the monitored device in the background
+
+        Returns False when no device is monitored or a burst is already running.
+        """
+        device_id = self.connection_manager.device_info["device_id"]
+        if not device_id or self.state.burst_running:
+            return False
+        self.state.burst_running = True
+        threading.Thread(
+            target=self._run_burst, args=(device_id, duration, rate_hz), name=f"burst-{device_id}", daemon=True
+        ).start()
+        return True
+
+    def _run_burst(self, device_id, duration, rate_hz):
+        try:
+            content = capture_burst(device_id, rate_hz, duration)
+            frame = parse_burst(content) if content else None
+            if frame is None or frame.empty:
+                if self.notification_manager:
+                    self.notification_manager.set_notification("Burst capture failed.", "notification-error", 4)
+                return
+            import pandas as pd
+
+            # device clock onto the host clock, as local time like the regular samples
+            host_time = frame["device_time"] - (self.clock.offset or 0.0)
+            frame.insert(0, "timestamp", pd.to_datetime(host_time, unit="s", utc=True).dt.tz_convert(
+                datetime.now().astimezone().tzinfo
+            ).dt.tz_localize(None))
+
+            burst_id = None
+            if self.state.save_to_local_db:
+                # same text format as format_timestamp, millisecond precision
+                rows = frame.assign(timestamp=frame["timestamp"].dt.strftime("%Y-%m-%d %H:%M:%S.%f").str[:-3])
+                burst_id = save_burst_to_db(
+                    self.connection_manager.device_info["persistent_id"],
+                    list(rows.itertuples(index=False, name=None)),
+                    self.connection_manager.device_info["model"],
+                    self.connection_manager.device_info["connection_type"],
+                    self.state.session_id,
+                )
+            self.state.set_burst(frame, burst_id)
+            logging.info(f"Burst capture done: {len(frame)} readings over {duration:g}s")
+            if self.notification_manager:
+                self.notification_manager.set_notification(
+                    f"Burst captured: {len(frame)} readings at {rate_hz:g} Hz.", "notification-success", 4
+                )
+        except Exception as e:
+            logging.error(f"Burst capture failed: {e}")
+        finally:
+            self.state.burst_running = False
+
+    def _target_sampler(self):
+        """Sampler for the target package of the state, recreated when the package changes"""
+        package = self.state.target_package
+        if not package:
+            self.target = None
+        elif self.target is None or self.target.package != package:
+            logging.info(f"Sampling target package {package}")
+            self.target = TargetAppSampler(package)
+        return self.target
+
+    def _core_sampler(self):
+        """Per-core frequency and thermal sampler of the current device, when switched on"""
+        serial = self.connection_manager.device_info["persistent_id"]
+        if not self.state.collect_cores:
+            self.cores = None
+        elif self.cores is None or self.cores.device_serial != serial:
+            self.cores = CoreThermalSampler(serial)
+        return self.cores
+
+    def _power_sampler(self):
+        """Buffered current and voltage sampler, when a power sampling rate is set"""
+        rate_hz = self.state.power_rate_hz
+        if not rate_hz:
+            self.power = None
+        elif self.power is None or self.power.rate_hz != rate_hz:
+            self.power = PowerSampler(rate_hz)
+        return self.power
+
+    def _backfill_buffer(self):
+        """Device-side buffer for the samples of a disconnect, when backfill is switched on"""
+        # the slowest rate in adaptive mode, so interval changes do not restart the loop
+        interval = self.state.adaptive_range[1] if self.state.adaptive_range else self.state.monitoring_interval
+        if not self.state.backfill:
+            self.backfill = None
+        elif self.backfill is None or self.backfill.interval != interval:
+            self.backfill = BackfillBuffer(interval, self.state.max_pause_duration)
+        return self.backfill
+
+    def _net_sampler(self):
+        """Network counter sampler, given the uid of the target app once it is known"""
+        if not self.state.collect_net:
+            self.net = None
+            return None
+        if self.net is None:
+            self.net = NetworkSampler()
+        self.net.uid = self.target.uid if self.target else None
+        return self.net
+
+    def _logcat_stream(self):
+        """Keep the logcat stream of the current device running while logcat is switched on and saved"""
+        serial = self.connection_manager.device_info["persistent_id"]
+        specs = self.state.logcat_filter if self.state.collect_logcat and self.state.save_to_local_db else None
+        if self.logcat and (specs is None or self.logcat.device_serial != serial or self.logcat.filter_specs != specs):
+            self.logcat.stop()
+            self.logcat = None
+        if specs is None:
+            return None
+        if self.logcat is None:
+            self.logcat = LogcatStream(
+                serial,
+                specs,
+                self.clock.to_host_time,
+                self.connection_manager.device_info["model"],
+                self.connection_manager.device_info["connection_type"],
+            )
+        self.logcat.ensure_running(self.connection_manager.device_info["device_id"])
+        return self.logcat
+
+    def _frame_sampler(self):
+        """Frame stats sampler for the target package, when frame stats are switched on"""
+        package = self.state.target_package if self.state.collect_frames else None
+        if not package:
+            self.frames = None
+        elif self.frames is None or self.frames.package != package:
+            self.frames = FrameStatsSampler(package)
+        return self.frames
+
+    def _capture_time(self, host_send, host_receive, device_start, device_end):
+        """Device capture time mapped onto the host clock, or the receive time if the device did not report it"""
+        if device_start is None or device_end is None:
+            return host_receive
+        self.clock.update(host_send, host_receive, device_start, device_end)
+        return self.clock.to_host_time(device_end)
+
     def _handle_device_change(self):
         """Handle case when monitored device has changed"""
         if self.connection_manager.device_info["last_device_serial"] is None:
@@ -241,13 +761,30 @@ class MonitoringController:
             self.connection_manager.device_info["last_device_serial"]
             != self.connection_manager.device_info["persistent_id"]
         ):
-            self.state.total_points = 0
             logging.info(
                 f"Device changed from {self.connection_manager.device_info['last_device_serial']} to {self.connection_manager.device_info['persistent_id']}, clearing plot data"
             )
-            self.state.collected_data.drop(
-                self.state.collected_data.index, inplace=True
-            )
+            self.state.clear_data()
+            self.clock.reset()
+            if self.target:
+                self.target.reset()
+            if self.frames:
+                self.frames.reset()
+            if self.cores:
+                self.cores.reset()
+            if self.power:
+                self.power.reset()
+            if self.net:
+                self.net.reset()
+            if self.backfill:
+                self.backfill.reset()
+            if self.adaptive:
+                self.adaptive.reset()
+            if self.alerts:
+                self.alerts.reset()
+            # a session covers one device, the next one keeps its label and metadata
+            if self.state.session_start:
+                self.start_session(self.state.session_label, self.state.session_metadata)
             self.connection_manager.device_info["last_device_serial"] = (
                 self.connection_manager.device_info["persistent_id"]
             )
@@ -256,7 +793,7 @@ class MonitoringController:
 
 
 class MonitoringState:
-    def __init__(self):
+    def __init__(self, buffer_size=100):
         self.current_device = None
         self.monitoring_active = False
         self.monitoring_paused = False
@@ -264,13 +801,68 @@ class MonitoringState:
         self.monitoring_interval = 5
         self.auto_stopped = False
         self.save_to_local_db = True
-        self.collected_data = pd.DataFrame()
+        # latest samples for the live plot, oldest are dropped automatically
+        self.buffer_size = buffer_size
+        self.samples = deque(maxlen=buffer_size)
         self.total_points = 0
+        # running statistics of every metric since the session started, O(1) per sample
+        self.stats = StatsEngine()
+        self.session_start = None
+        # database id, label and metadata of the current session, see MonitoringController.start_session
+        self.session_id = None
+        self.session_label = None
+        self.session_metadata = {}
+        # top processes per sample, only collected when process_top_k > 0
+        self.process_top_k = 0
+        self.process_samples = deque(maxlen=buffer_size)
+        # package sampled from /proc alongside the system metrics, None to sample only the system
+        self.target_package = None
+        # frame timing of the target package from dumpsys gfxinfo framestats
+        self.collect_frames = False
+        # per-core frequency and utilization and thermal zones from sysfs
+        self.collect_cores = False
+        # readings per second of current_now/voltage_now, buffered on the device; 0 is off
+        self.power_rate_hz = 0
+        # interface throughput from /proc/net/dev, and the target app's traffic where the kernel exposes it
+        self.collect_net = False
+        # logcat streamed into the database, filtered on the device by logcat filterspecs
+        self.collect_logcat = False
+        self.logcat_filter = ()
+        # samples streamed by a loop running on the device instead of one adb call per tick
+        self.streaming = False
+        # the latest burst capture as a DataFrame, kept apart from the regular samples
+        self.burst = None
+        self.burst_id = None
+        self.burst_running = False
+        # rules checked against every sample, None for utils.alerts.DEFAULT_RULES
+        self.alerts_enabled = True
+        self.alert_rules = None
+        # utils.export.Exporter every sample is handed to, None to keep samples local
+        self.exporter = None
+        # latest alert rows as saved to the alerts table
+        self.alerts = deque(maxlen=buffer_size)
+        # (min, max) seconds, the interval then follows how fast CPU and memory change; None is a fixed interval
+        self.adaptive_range = None
+        # keep sampling on the device while disconnected and merge the samples after the reconnect
+        self.backfill = False
+        # (first, last) timestamps of backfilled samples, marked on the live plot
+        self.backfilled_ranges = deque(maxlen=buffer_size)
         self.reconnect_attempts = 0
         self.pause_start_time = None
         self.max_pause_duration = 30
         self.reconnection_success = False
 
+    @property
+    def collected_data(self):
+        """Buffered samples as a DataFrame, pandas is only imported when this is used"""
+        import pandas as pd
+
+        return pd.DataFrame(list(self.samples))
+
+    def latest(self):
+        """Return the most recent sample, or an empty dict"""
+        return self.samples[-1] if self.samples else {}
+
     def reset_reconnection_state(self):
         """Reset all reconnection-related state variables"""
         self.monitoring_paused = False
@@ -284,25 +876,52 @@ class MonitoringState:
         self.auto_stopped = False
         self.reset_reconnection_state()
         
+    def start_session(self, label=None, metadata=None):
+        """Start the statistics of a new monitoring session"""
+        self.session_start = datetime.now()
+        self.session_id = None
+        self.session_label = label
+        self.session_metadata = dict(metadata or {})
+        self.stats.clear()
+
     def clear_data(self):
         """Clear collected data"""
-        self.collected_data.drop(self.collected_data.index, inplace=True)
+        self.samples.clear()
+        self.process_samples.clear()
+        self.burst = None
+        self.burst_id = None
+        self.backfilled_ranges.clear()
         self.total_points = 0
         logging.info("Data cleared.")
         return True
 
 
+    @timed(ADD_DATA_POINT_SECONDS)
     def add_data_point(self, data):
-        new_df = pd.DataFrame([data])
-        self.collected_data = pd.concat(
-            [self.collected_data, new_df], ignore_index=True
-        )
+        self.samples.append(data)
+        self.stats.update(data)
+        if self.exporter:
+            self.exporter.submit(data)
         self.total_points += 1
-        # Debug print all keys and CPU info
-        logging.debug(f"Added data point {self.total_points}, keys: {list(data.keys())}")
-        cpu_keys = [k for k in data.keys() if k.startswith('cpu_')]
-        logging.debug(f"CPU metric keys with values: {{}}".format(
-            {k:data[k] for k in cpu_keys}))
-        if len(self.collected_data) > 100:
-            self.collected_data = self.collected_data.iloc[-100:]
-
+        logging.debug("Added data point %s, keys: %s", self.total_points, list(data))
+
+    def merge_data_points(self, points):
+        """Add samples older than the latest ones, the buffer stays in timestamp order"""
+        merged = sorted([*self.samples, *points], key=lambda point: point["timestamp"])
+        self.samples.clear()
+        # the deque keeps the newest buffer_size samples
+        self.samples.extend(merged)
+        for data in points:
+            self.stats.update(data)
+            if self.exporter:
+                self.exporter.submit(data)
+        self.total_points += len(points)
+
+    def set_burst(self, frame, burst_id=None):
+        """Replace the burst shown on the live plot, frame as returned by parse_burst with timestamps"""
+        self.burst = frame
+        self.burst_id = burst_id
+
+    def add_process_batch(self, data, batch):
+        """Buffer the top processes of a sample, batch as returned by parse_top_processes"""
+        self.process_samples.append((data["timestamp"], batch))
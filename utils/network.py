@@ -0,0 +1,143 @@
+import logging
+
+from utils.parsers import split_sections
+
+# Echoed before the network counters in the shell call of the system metrics
+NET_MARKER = "@@net"
+QTAGUID_MARKER = "@@qtaguid"
+
+QTAGUID_STATS = "/proc/net/xt_qtaguid/stats"
+
+# Interfaces left out of the totals
+IGNORED_INTERFACES = {"lo"}
+
+COUNTER_32_BIT = 2 ** 32
+
+
+def counter_delta(previous, current):
+    """Increase of a kernel counter between two readings, allowing for wraps and resets
+
+    32-bit counters (arm32 kernels, some drivers) wrap at 2**32: the previous value was
+    near the top and the new one is near zero. Any other decrease means the counter was
+    reset, e.g. the interface went down and up, and it has counted from zero since.
+    """
+    if current >= previous:
+        return current - previous
+    if previous < COUNTER_32_BIT and previous - current > COUNTER_32_BIT // 2:
+        return current + COUNTER_32_BIT - previous
+    return current
+
+
+def parse_net_dev(lines):
+    """Parse /proc/net/dev into {interface: (rx bytes, rx packets, tx bytes, tx packets)}"""
+    counters = {}
+    for line in lines:
+        interface, sep, values = line.partition(':')
+        if not sep or '|' in values:
+            continue
+        tokens = values.split()
+        if len(tokens) < 10:
+            continue
+        counters[interface.strip()] = (int(tokens[0]), int(tokens[1]), int(tokens[8]), int(tokens[9]))
+    return counters
+
+
+def parse_qtaguid(lines, uid):
+    """Sum the untagged rx/tx bytes and packets of one uid over all interfaces and counter sets"""
+    totals = [0, 0, 0, 0]
+    found = False
+    for line in lines:
+        tokens = line.split()
+        # idx iface acct_tag_hex uid_tag_int cnt_set rx_bytes rx_packets tx_bytes tx_packets ...
+        if len(tokens) < 9 or not tokens[0].isdigit():
+            continue
+        if tokens[2] != "0x0" or tokens[3] != str(uid) or tokens[1] in IGNORED_INTERFACES:
+            continue
+        found = True
+        for i, value in enumerate(tokens[5:9]):
+            totals[i] += int(value)
+    return tuple(totals) if found else None
+
+
+class NetworkSampler:
+    """Per-interface throughput from /proc/net/dev counter deltas
+
+    Rates are counter deltas over the device uptime between two reads. When the uid of
+    a target app is known and the kernel still has xt_qtaguid (Android 9 and older), the
+    app's own traffic is read too; newer kernels keep per-uid stats in eBPF maps that the
+    shell user cannot read, so this is switched off after the first empty read.
+    """
+    marker = NET_MARKER
+
+    def __init__(self):
+        self.previous = None
+        self.previous_app = None
+        self.uid = None
+        self.qtaguid_available = True
+        self.batches = {}
+
+    def shell_command(self):
+        command = f"echo {NET_MARKER}; cat /proc/uptime /proc/net/dev"
+        if self.uid is not None and self.qtaguid_available:
+            command += f"; echo {QTAGUID_MARKER}; grep ' {self.uid} ' {QTAGUID_STATS} 2>/dev/null"
+        return command
+
+    def reset(self):
+        self.previous = None
+        self.previous_app = None
+        self.qtaguid_available = True
+        self.batches = {}
+
+    def parse(self, output):
+        """Parse the output of shell_command, returns the sample fields or None"""
+        self.batches = {}
+        if output is None:
+            return None
+        head, sections = split_sections(output, {QTAGUID_MARKER})
+        lines = head.splitlines()
+        if not lines:
+            return None
+        uptime = float(lines[0].split()[0])
+        counters = parse_net_dev(lines[1:])
+
+        app_counters = None
+        if self.uid is not None and QTAGUID_MARKER in sections:
+            app_counters = parse_qtaguid(sections[QTAGUID_MARKER].splitlines(), self.uid)
+            if app_counters is None:
+                logging.info("Per-uid network stats are not available on this device.")
+                self.qtaguid_available = False
+
+        previous = self.previous
+        previous_app = self.previous_app
+        self.previous = (uptime, counters)
+        self.previous_app = app_counters
+        if previous is None or uptime <= previous[0]:
+            return None
+        elapsed = uptime - previous[0]
+
+        def rates(old, new):
+            return [round(counter_delta(o, n) / elapsed, 1) for o, n in zip(old, new)]
+
+        data = {"net_rx_bps": 0.0, "net_rx_pps": 0.0, "net_tx_bps": 0.0, "net_tx_pps": 0.0}
+        interfaces = {"interface": [], "rx_bps": [], "rx_pps": [], "tx_bps": [], "tx_pps": []}
+        for interface, values in counters.items():
+            # interfaces that just appeared get a rate from the next read
+            if interface in IGNORED_INTERFACES or interface not in previous[1]:
+                continue
+            rx_bps, rx_pps, tx_bps, tx_pps = rates(previous[1][interface], values)
+            if not (rx_bps or tx_bps or rx_pps or tx_pps):
+                continue
+            data[f"net_{interface}_rx_bps"] = rx_bps
+            data[f"net_{interface}_tx_bps"] = tx_bps
+            for key, value in zip(("rx_bps", "rx_pps", "tx_bps", "tx_pps"), (rx_bps, rx_pps, tx_bps, tx_pps)):
+                data[f"net_{key}"] += value
+                interfaces[key].append(value)
+            interfaces["interface"].append(interface)
+        if interfaces["interface"]:
+            self.batches["net_interfaces_table"] = interfaces
+
+        if app_counters is not None and previous_app is not None:
+            data["app_rx_bps"], data["app_rx_pps"], data["app_tx_bps"], data["app_tx_pps"] = rates(
+                previous_app, app_counters
+            )
+        return data
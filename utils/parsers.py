@@ -0,0 +1,386 @@
+"""Parsers for `top`, `dumpsys battery`, `dumpsys gfxinfo`, logcat and /proc output.
+
+Patterns are compiled once at import. The top header is read in a single pass,
+and lines are found by their prefix rather than their position. This covers
+toybox top from Android 8 to 15 (with or without a pty) and busybox top.
+"""
+import heapq
+import logging
+import re
+import sys
+from datetime import datetime
+
+from utils.metrics import timed, PARSE_TOP_SECONDS
+
+ANSI_ESCAPE = re.compile(r'\x1B(?:[@-Z\-_]|\[[0-?]*[ -/]*[@-~])')
+
+# busybox "Load average: 1.20 1.05 0.98 2/612 12345"
+LOAD_AVERAGE = re.compile(r'(\d+)/(\d+)')
+
+# busybox labels mapped onto the toybox names used everywhere else
+CPU_LABELS = {'usr': 'user', 'nic': 'nice', 'io': 'iow'}
+MEM_LABELS = {'buff': 'buffers', 'shrd': 'shared'}
+
+# process table header -> batch column, the command is always the last column
+PROCESS_COLUMNS = {'PID': 'pid', 'USER': 'user', '%CPU': 'cpu', '%MEM': 'mem', 'RES': 'res', 'RSS': 'res'}
+
+SIZE_FACTORS_MB = {'': 1 / (1024 * 1024), 'K': 1 / 1024, 'M': 1, 'G': 1024, 'T': 1024 * 1024}
+
+# logcat priorities from least to most severe
+LOG_PRIORITIES = 'VDIWEF'
+
+BATTERY_STATUS = {
+    "1": "Unknown",
+    "2": "Charging",
+    "3": "Discharging",
+    "4": "Not Charging",
+    "5": "Full",
+}
+
+BATTERY_HEALTH = {
+    "1": "Unknown",
+    "2": "Good",
+    "3": "Overheat",
+    "4": "Dead",
+    "5": "Over Voltage",
+    "6": "Unspecified Failure",
+    "7": "Cold",
+}
+
+
+def split_sections(output, markers):
+    """Split shell output at marker lines echoed between commands
+
+    Returns (text before the first marker, {marker: text after it}).
+    """
+    head = []
+    sections = {}
+    current = head
+    for line in output.splitlines():
+        if line.strip() in markers:
+            current = sections.setdefault(line.strip(), [])
+        else:
+            current.append(line)
+    return "\n".join(head), {marker: "\n".join(lines) for marker, lines in sections.items()}
+
+
+def remove_ansi_escape_codes(text):
+    """Removes terminal color codes and escape sequences from ADB or shell outputs"""
+    return ANSI_ESCAPE.sub('', text)
+
+
+def parse_top_memory(value_str):
+    """Converts memory strings to MB (1G -> 1024)"""
+    value_str = value_str.upper().strip()
+    unit = value_str[-1] if value_str[-1:] in ('K', 'M', 'G', 'T') else ''
+    number = float(value_str[:-1] if unit else value_str)
+    if unit == 'K':
+        return number / 1024
+    if unit == '':
+        # bare numbers are what top printed, kept as is
+        return int(number)
+    return int(number * SIZE_FACTORS_MB[unit])
+
+
+def _size_in_kb(value_str):
+    unit = value_str[-1].upper() if value_str[-1:].isalpha() else ''
+    number = value_str[:-1] if unit else value_str
+    return int(float(number) * SIZE_FACTORS_MB[unit] * 1024)
+
+
+def _value_label_pairs(line):
+    """'Mem:  7755048K total,  7437652K used' -> [('7755048K', 'total'), ('7437652K', 'used')]"""
+    pairs = []
+    for part in line.partition(':')[2].split(','):
+        tokens = part.split()
+        if len(tokens) >= 2:
+            pairs.append((tokens[0], tokens[1].lower()))
+    return pairs
+
+
+def _percent_pairs(tokens):
+    """toybox '800%cpu 11%user' and busybox '5.0% usr' -> [('800', 'cpu'), ...]"""
+    pairs = []
+    index = 0
+    while index < len(tokens):
+        value, sep, label = tokens[index].partition('%')
+        if sep:
+            if not label and index + 1 < len(tokens):
+                index += 1
+                label = tokens[index]
+            if label:
+                pairs.append((value, label.lower()))
+        index += 1
+    return pairs
+
+
+def scan_top_header(lines):
+    """Parse the summary lines of top in one pass
+
+    Lines are recognised by prefix and split on commas and whitespace instead of
+    running a regex over every line. Returns (data, index of the process table
+    header line or None).
+    """
+    data = {}
+    for index, raw_line in enumerate(lines):
+        line = raw_line.strip()
+        if not line:
+            continue
+        if line.startswith('Tasks:') or line.startswith('Threads:'):
+            for value, label in _value_label_pairs(line):
+                data[f'tasks_{label}'] = int(value)
+        elif line.startswith('Mem:'):
+            for value, label in _value_label_pairs(line):
+                data[f'mem_{MEM_LABELS.get(label, label)}'] = parse_top_memory(value)
+            if 'mem_total' not in data and 'mem_used' in data and 'mem_free' in data:
+                data['mem_total'] = data['mem_used'] + data['mem_free']
+        elif line.startswith('Swap:'):
+            # swap is kept in KB, as it always has been
+            for value, label in _value_label_pairs(line):
+                data[f'swap_{label}'] = _size_in_kb(value)
+        elif line.startswith('CPU:'):
+            # busybox, percentages of the whole machine
+            data['cpu_cpu'] = 100
+            for value, label in _percent_pairs(line.split()[1:]):
+                data[f'cpu_{CPU_LABELS.get(label, label)}'] = float(value)
+        elif line.startswith('Load average:'):
+            match = LOAD_AVERAGE.search(line)
+            if match:
+                data['tasks_running'] = int(match.group(1))
+                data['tasks_total'] = int(match.group(2))
+        elif '%cpu' in line:
+            for value, label in _percent_pairs(line.split()):
+                data[f'cpu_{label}'] = int(float(value))
+        elif line.startswith('PID'):
+            return data, index
+    return data, None
+
+
+@timed(PARSE_TOP_SECONDS)
+def parse_top_summary(lines, device_serial=None, timestamp=None):
+    """Extract task, memory, swap and cpu figures from top output lines"""
+    try:
+        data, _ = scan_top_header(lines)
+    except Exception as e:
+        logging.error(f"Parsing failed: {e}")
+        return None
+    if not data:
+        logging.error("Insufficient top output lines.")
+        return None
+
+    # Store TimeStamp and Device Info
+    data['timestamp'] = timestamp or datetime.now()
+    if device_serial:
+        data['device_serial'] = device_serial
+    return data
+
+
+def parse_top_processes(lines, limit=10):
+    """Parse the process table of top into a columnar batch of the `limit` busiest processes
+
+    Returns {'pid': [...], 'user': [...], 'cpu': [...], 'mem': [...], 'res': [...], 'name': [...]},
+    sorted by %CPU, or None when there is no process table. res is in MB; mem and res are
+    None for builds that do not print them (busybox). Names and users are interned, they
+    repeat in every sample.
+    """
+    start = next((i for i, line in enumerate(lines) if line.lstrip().startswith('PID')), None)
+    if start is None:
+        return None
+
+    # toybox brackets the sort column, 'S[%CPU]'
+    header = lines[start].replace('[', ' ').replace(']', ' ').split()
+    positions = {PROCESS_COLUMNS[name]: i for i, name in enumerate(header) if name in PROCESS_COLUMNS}
+    if 'pid' not in positions or 'cpu' not in positions:
+        return None
+    name_index = len(header) - 1
+    cpu_index = positions['cpu']
+
+    # only %CPU is converted for every row, the rest only for the rows that are kept
+    rows = []
+    cpu = []
+    for line in lines[start + 1:]:
+        tokens = line.split(None, name_index)
+        if len(tokens) <= name_index:
+            continue
+        try:
+            cpu.append(float(tokens[cpu_index]))
+        except ValueError:
+            continue
+        rows.append(tokens)
+
+    batch = {column: [] for column in ('pid', 'user', 'cpu', 'mem', 'res', 'name')}
+    mem_index = positions.get('mem')
+    res_index = positions.get('res')
+    user_index = positions.get('user')
+    for i in heapq.nlargest(limit, range(len(rows)), key=cpu.__getitem__):
+        tokens = rows[i]
+        batch['pid'].append(int(tokens[positions['pid']]))
+        batch['user'].append(sys.intern(tokens[user_index]) if user_index is not None else '')
+        batch['cpu'].append(cpu[i])
+        batch['mem'].append(float(tokens[mem_index]) if mem_index is not None else None)
+        res = _size_in_kb(tokens[res_index]) / 1024 if res_index is not None else None
+        batch['res'].append(round(res, 1) if res is not None else None)
+        batch['name'].append(sys.intern(tokens[name_index].strip()))
+    return batch
+
+
+def parse_battery_status(output):
+    """Parse the output of dumpsys battery"""
+    battery_info = {}
+    for line in output.splitlines():
+        key, sep, value = line.partition(':')
+        if not sep:
+            continue
+        key = key.strip()
+        value = value.strip()
+        if key == 'level':
+            battery_info['level'] = int(value)
+        elif key == 'temperature':
+            battery_info['temperature'] = int(value) / 10.0
+        elif key == 'status':
+            # Some devices output numeric codes, others already a word
+            battery_info['charging_status'] = BATTERY_STATUS.get(value, value)
+        elif key == 'health':
+            battery_info['battery_health'] = BATTERY_HEALTH.get(value, value)
+    return battery_info
+
+
+def parse_proc_stat(line):
+    """Parse /proc/<pid>/stat into the fields used for CPU accounting, None if malformed"""
+    # the command name is in parentheses and may itself contain spaces or parentheses
+    end = line.rfind(')')
+    if end < 0:
+        return None
+    fields = line[end + 1:].split()
+    if len(fields) < 20:
+        return None
+    # fields[0] is field 3 of proc(5)
+    return {
+        'pid': int(line[:line.index('(')]),
+        'state': fields[0],
+        'cpu_ticks': int(fields[11]) + int(fields[12]),
+        'threads': int(fields[17]),
+        'start_time': int(fields[19]),
+    }
+
+
+def parse_proc_fields(lines):
+    """Parse 'Key:   value kB' lines of /proc/<pid>/status and smaps_rollup, sizes in KB"""
+    fields = {}
+    for line in lines:
+        key, sep, value = line.partition(':')
+        if not sep:
+            continue
+        tokens = value.split()
+        if not tokens:
+            continue
+        fields[key.strip()] = int(tokens[0]) if tokens[0].isdigit() else value.strip()
+    return fields
+
+
+def parse_cpu_ticks(lines):
+    """Total ticks and core count from the cpu lines of /proc/stat"""
+    total = None
+    cores = 0
+    for line in lines:
+        if line.startswith('cpu '):
+            total = sum(int(value) for value in line.split()[1:])
+        elif line.startswith('cpu'):
+            cores += 1
+    return total, max(cores, 1)
+
+
+def parse_framestats(output, after_vsync=0):
+    """Parse the PROFILEDATA sections of dumpsys gfxinfo <pkg> framestats
+
+    Returns (intended vsync, vsync, frame time, frame interval or None) in nanoseconds for
+    every frame that started after `after_vsync`, oldest first. Columns are found by name,
+    FrameInterval only exists from Android 12. Rows with non-zero Flags are skipped, as
+    the framestats documentation asks.
+    """
+    frames = []
+    columns = None
+    in_section = False
+    for line in output.splitlines():
+        line = line.strip()
+        if line == '---PROFILEDATA---':
+            in_section = not in_section
+            columns = None
+            continue
+        if not in_section or not line:
+            continue
+        values = line.rstrip(',').split(',')
+        if columns is None:
+            columns = {name: i for i, name in enumerate(values)}
+            if not {'Flags', 'IntendedVsync', 'Vsync', 'FrameCompleted'} <= columns.keys():
+                in_section = False
+            continue
+        try:
+            if int(values[columns['Flags']]) != 0:
+                continue
+            intended = int(values[columns['IntendedVsync']])
+            if intended <= after_vsync:
+                continue
+            interval = int(values[columns['FrameInterval']]) if 'FrameInterval' in columns else None
+            frames.append((
+                intended,
+                int(values[columns['Vsync']]),
+                int(values[columns['FrameCompleted']]) - intended,
+                interval or None,
+            ))
+        except (IndexError, ValueError):
+            continue
+    frames.sort()
+    return frames
+
+
+def parse_sysfs_values(lines):
+    """Parse `grep -H . <files>` output into {path: value}"""
+    values = {}
+    for line in lines:
+        # error messages end up here on adb versions that merge stderr
+        if not line.startswith('/'):
+            continue
+        path, sep, value = line.partition(':')
+        if sep:
+            values[path] = value.strip()
+    return values
+
+
+def parse_core_ticks(lines):
+    """Per-core (busy, total) ticks from the cpuN lines of /proc/stat"""
+    cores = {}
+    for line in lines:
+        if not line.startswith('cpu') or line.startswith('cpu '):
+            continue
+        tokens = line.split()
+        if not tokens[0][3:].isdigit():
+            continue
+        ticks = [int(value) for value in tokens[1:]]
+        # idle and iowait are the 4th and 5th columns
+        idle = sum(ticks[3:5])
+        cores[int(tokens[0][3:])] = (sum(ticks) - idle, sum(ticks))
+    return cores
+
+
+def parse_logcat_line(line):
+    """Parse one `logcat -v epoch` line into (device time, pid, tid, priority, tag, message)
+
+    Returns None for lines without a header, e.g. '--------- beginning of main'. Tags and
+    priorities are interned, the same few repeat on most lines.
+    """
+    # "  1697712345.123  1234  1250 I ActivityManager: Start proc ..."
+    tokens = line.split(None, 4)
+    if len(tokens) < 5 or len(tokens[3]) != 1 or tokens[3] not in LOG_PRIORITIES:
+        return None
+    try:
+        device_time = float(tokens[0])
+        pid = int(tokens[1])
+        tid = int(tokens[2])
+    except ValueError:
+        return None
+    # the tag is padded to 8 characters before the colon
+    tag, sep, message = tokens[4].partition(': ')
+    if not sep:
+        tag, message = tokens[4].rstrip().removesuffix(':'), ''
+    return device_time, pid, tid, sys.intern(tokens[3]), sys.intern(tag.rstrip()), message.rstrip('\n')
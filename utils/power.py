@@ -0,0 +1,105 @@
+import logging
+
+# Echoed before the buffered power readings in the shell call of the system metrics
+POWER_MARKER = "@@power"
+
+POWER_SUPPLY = "/sys/class/power_supply/battery"
+BUFFER_PATH = "/data/local/tmp/telemetry_power"
+PID_PATH = f"{BUFFER_PATH}.pid"
+
+# The on-device loop stops by itself after this long, each poll restarts it if needed,
+# so nothing keeps running on the device once the collector is gone.
+LOOP_LIFETIME = 120
+
+# Readings further apart than this many loop periods, and at least MAX_GAP seconds, are not
+# integrated, the loop was not running in between. Each period is the sleep plus the reads.
+MAX_GAP = 1.0
+MAX_GAP_PERIODS = 3
+
+
+def loop_script(rate_hz):
+    """Device shell loop appending 'uptime current_now voltage_now' lines to the buffer file
+
+    Only shell builtins run per reading apart from sleep, so the loop is cheap on the device.
+    """
+    period = 1 / rate_hz
+    iterations = int(LOOP_LIFETIME * rate_hz)
+    return (
+        f"echo $$ > {PID_PATH}; n=0; while [ $n -lt {iterations} ]; do "
+        f"read up idle < /proc/uptime; read c < {POWER_SUPPLY}/current_now; read v < {POWER_SUPPLY}/voltage_now; "
+        f"echo $up $c $v >> {BUFFER_PATH}; sleep {period:.3f}; n=$((n+1)); done"
+    )
+
+
+def parse_power_readings(lines):
+    """Parse buffered readings into (uptime s, current uA, voltage uV), oldest first"""
+    readings = []
+    for line in lines:
+        tokens = line.split()
+        if len(tokens) != 3:
+            continue
+        try:
+            readings.append((float(tokens[0]), int(tokens[1]), int(tokens[2])))
+        except ValueError:
+            continue
+    return readings
+
+
+class PowerSampler:
+    """High-rate current and voltage from power_supply sysfs, integrated into energy per interval
+
+    A detached loop on the device samples current_now and voltage_now at `rate_hz` into a
+    buffer file. Every poll rotates the file and reads it back in the shell call of the
+    system metrics, so there is one adb round trip per interval rather than per reading.
+    Energy is the trapezoidal integral of |current| x voltage, continued across polls so
+    consecutive intervals add up. The sign of current_now differs between vendors, so
+    power is reported as a magnitude.
+    """
+    marker = POWER_MARKER
+
+    def __init__(self, rate_hz=10):
+        if rate_hz <= 0:
+            raise ValueError(f"Power sampling rate must be above 0 Hz, got {rate_hz:g}")
+        self.rate_hz = rate_hz
+        self.max_gap = max(MAX_GAP, MAX_GAP_PERIODS / rate_hz)
+        self.last_reading = None
+
+    def shell_command(self):
+        # the loop appends with >>, so after the mv its next reading starts a new file
+        return (
+            f"echo {POWER_MARKER}; mv -f {BUFFER_PATH} {BUFFER_PATH}.read 2>/dev/null && cat {BUFFER_PATH}.read; "
+            f"kill -0 $(cat {PID_PATH} 2>/dev/null) 2>/dev/null || "
+            f"{{ nohup sh -c '{loop_script(self.rate_hz)}' </dev/null >/dev/null 2>&1 & }}"
+        )
+
+    def reset(self):
+        self.last_reading = None
+
+    def parse(self, output):
+        """Parse the output of shell_command, returns the sample fields or None"""
+        if output is None:
+            return None
+        readings = parse_power_readings(output.splitlines())
+        if not readings:
+            logging.debug("No buffered power readings yet.")
+            return None
+
+        energy_uj = 0.0
+        previous = self.last_reading
+        powers_mw = []
+        for uptime, current_ua, voltage_uv in readings:
+            power_w = abs(current_ua) * voltage_uv * 1e-12
+            powers_mw.append(power_w * 1000)
+            if previous is not None and 0 < uptime - previous[0] <= self.max_gap:
+                energy_uj += (previous[1] + power_w) / 2 * (uptime - previous[0]) * 1e6
+            previous = (uptime, power_w)
+        self.last_reading = previous
+
+        return {
+            "power_readings": len(readings),
+            "power_current_ma": round(sum(r[1] for r in readings) / len(readings) / 1000, 1),
+            "power_voltage_v": round(sum(r[2] for r in readings) / len(readings) / 1e6, 3),
+            "power_mw": round(sum(powers_mw) / len(powers_mw), 1),
+            "power_peak_mw": round(max(powers_mw), 1),
+            "energy_mj": round(energy_uj / 1000, 2),
+        }
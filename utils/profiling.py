@@ -0,0 +1,215 @@
+import ast
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+PROFILE_DIR = os.environ.get(
+    "TELEMETRY_PROFILE_DIR",
+    os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')), 'profiles'),
+)
+
+# Hard limits so a profile can be started on a live collector without hurting it.
+MAX_SECONDS = 300
+MIN_INTERVAL = 0.005
+MAX_DEPTH = 64
+MAX_STACKS = 20000
+MEMORY_FRAMES = 16
+
+# Functions whose allocations are reported when memory tracing is on, as (file, function name);
+# update_graph is nested in register_callbacks, so it is found in the source rather than imported
+MEMORY_TARGETS = {
+    "add_data_point": (os.path.join("utils", "monitoring.py"), "add_data_point"),
+    "update_graph": (os.path.join("ui", "callbacks.py"), "update_graph"),
+}
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+DEFAULT_THREADS = ("monitoring", "request")
+
+
+def thread_category(name):
+    """Group threads so stacks from many request threads merge in the flamegraph"""
+    if name.startswith("monitoring"):
+        return "monitoring"
+    if "process_request_thread" in name:
+        return "request"
+    if name == "MainThread":
+        return "main"
+    return "other"
+
+
+def collapse_stack(frame, prefix, max_depth=MAX_DEPTH):
+    """Render a frame and its callers as one collapsed-stack line, root first"""
+    names = []
+    while frame is not None and len(names) < max_depth:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    names.append(prefix)
+    return ";".join(reversed(names))
+
+
+class SamplingProfiler:
+    """Statistical profiler that samples thread stacks for a fixed time and writes a collapsed-stack file"""
+    def __init__(self, output_dir=PROFILE_DIR, interval=0.01):
+        self.output_dir = output_dir
+        self.interval = max(interval, MIN_INTERVAL)
+        self.lock = threading.Lock()
+        self.thread = None
+        self.output = None
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, seconds=30, trace_memory=False, threads=DEFAULT_THREADS):
+        """Start a profile in the background, returns the output path or None if one is already running"""
+        seconds = min(max(float(seconds), 1.0), MAX_SECONDS)
+        with self.lock:
+            if self.running:
+                return None
+            os.makedirs(self.output_dir, exist_ok=True)
+            stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+            self.output = os.path.join(self.output_dir, f"profile-{stamp}.collapsed")
+            self.thread = threading.Thread(
+                target=self._run,
+                args=(seconds, trace_memory, tuple(threads or ()), self.output),
+                name="profiler",
+                daemon=True,
+            )
+            self.thread.start()
+        logging.info(f"Profiling for {seconds:.0f}s (memory tracing {'on' if trace_memory else 'off'}) -> {self.output}")
+        return self.output
+
+    def _run(self, seconds, trace_memory, threads, output):
+        started_tracing = trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(MEMORY_FRAMES)
+
+        own_ident = threading.get_ident()
+        stacks = Counter()
+        samples = 0
+        deadline = time.monotonic() + seconds
+        try:
+            while time.monotonic() < deadline:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == own_ident:
+                        continue
+                    category = thread_category(names.get(ident, ""))
+                    if threads and category not in threads:
+                        continue
+                    stack = collapse_stack(frame, category)
+                    # cap distinct stacks so memory stays bounded on long profiles
+                    if stack in stacks or len(stacks) < MAX_STACKS:
+                        stacks[stack] += 1
+                    else:
+                        stacks[f"{category};[truncated]"] += 1
+                samples += 1
+                time.sleep(self.interval)
+
+            with open(output, "w", encoding="utf-8") as f:
+                for stack, count in stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            logging.info(f"Profile written to {output} ({samples} samples, {len(stacks)} stacks)")
+
+            if trace_memory and tracemalloc.is_tracing():
+                snapshot = tracemalloc.take_snapshot()
+                # stop tracing before building the report, the report does not need it
+                if started_tracing:
+                    tracemalloc.stop()
+                memory_output = output.replace(".collapsed", ".memory.txt")
+                write_memory_report(snapshot, memory_output)
+                logging.info(f"Allocation report written to {memory_output}")
+        except Exception as e:
+            logging.error(f"Profiling failed: {e}")
+        finally:
+            if started_tracing and tracemalloc.is_tracing():
+                tracemalloc.stop()
+
+
+def function_lines(path, name):
+    """(first, last) line ranges of every function called `name` in a source file, nested ones too"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            tree = ast.parse(f.read(), path)
+    except (OSError, SyntaxError) as e:
+        logging.warning(f"Could not read {path} for the allocation report: {e}")
+        return ()
+    return tuple(
+        (node.lineno, node.end_lineno) for node in ast.walk(tree)
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name == name
+    )
+
+
+def write_memory_report(snapshot, path, limit=25):
+    """Write the largest live allocation sites under each memory target"""
+    # target name -> (file suffix, line ranges of the function)
+    targets = {
+        name: (filename, function_lines(os.path.join(ROOT_DIR, filename), function))
+        for name, (filename, function) in MEMORY_TARGETS.items()
+    }
+    sites = {name: Counter() for name in MEMORY_TARGETS}
+    blocks = Counter()
+    matches = {}
+    # grouping by traceback first means each distinct stack is inspected once, not every block
+    for stat in snapshot.statistics("traceback"):
+        hit = set()
+        # an allocation counts for a target when a line of the function is anywhere in its
+        # stack, e.g. pandas or plotly code called from update_graph
+        for frame in stat.traceback:
+            key = (frame.filename, frame.lineno)
+            names = matches.get(key)
+            if names is None:
+                names = matches[key] = tuple(
+                    name for name, (filename, ranges) in targets.items()
+                    if frame.filename.endswith(filename)
+                    and any(first <= frame.lineno <= last for first, last in ranges)
+                )
+            hit.update(names)
+        if hit:
+            site = stat.traceback[-1]
+            for name in hit:
+                sites[name][(site.filename, site.lineno)] += stat.size
+                blocks[name] += stat.count
+
+    with open(path, "w", encoding="utf-8") as f:
+        for name, (filename, function) in MEMORY_TARGETS.items():
+            total = sum(sites[name].values())
+            f.write(f"== {name} ({filename}:{function}): {total / 1024:.1f} KiB in {blocks[name]} blocks\n")
+            for (site_file, lineno), size in sites[name].most_common(limit):
+                f.write(f"{size / 1024:10.1f} KiB  {site_file}:{lineno}\n")
+            f.write("\n")
+
+
+def register_profiling_endpoint(server, profiler, path="/admin/profile"):
+    """Expose the profiler on a Flask server, POST only and only for requests from this machine
+
+    Query parameters: seconds (default 30, max 300) and memory=1 to also trace allocations.
+    """
+    from flask import jsonify, request
+
+    def profile():
+        if request.remote_addr not in ("127.0.0.1", "::1"):
+            return jsonify(error="Profiling is only available from localhost."), 403
+        seconds = request.args.get("seconds", 30, type=float)
+        trace_memory = request.args.get("memory", "0").lower() in ("1", "true", "yes")
+        output = profiler.start(seconds, trace_memory=trace_memory)
+        if output is None:
+            return jsonify(error="A profile is already running.", output=profiler.output), 409
+        return jsonify(output=output, seconds=min(seconds, MAX_SECONDS), memory=trace_memory), 202
+
+    server.add_url_rule(path, "telemetry_profile", profile, methods=["POST"])
+
+
+def install_signal_handler(profiler, seconds=30, trace_memory=False):
+    """Start a profile on SIGUSR1, where the platform has it. Must be called from the main thread"""
+    if not hasattr(signal, "SIGUSR1"):
+        return False
+    signal.signal(signal.SIGUSR1, lambda *_: profiler.start(seconds, trace_memory=trace_memory))
+    return True
@@ -0,0 +1,60 @@
+import logging
+import threading
+import time
+
+
+class StartupTimer:
+    """Records how long each startup phase takes and logs a report once the first page is served"""
+    def __init__(self, started_at=None):
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.last_mark = self.started_at
+        self.phases = {}
+        self.lock = threading.Lock()
+        self.first_page_served = False
+
+    def mark(self, name):
+        """Record a sequential phase that ended now"""
+        now = time.perf_counter()
+        with self.lock:
+            self.phases[name] = now - self.last_mark
+            self.last_mark = now
+
+    def run_in_background(self, name, func, *args):
+        """Run an initialization task in a daemon thread and record its duration"""
+        def task():
+            start = time.perf_counter()
+            try:
+                func(*args)
+            except Exception as e:
+                logging.error(f"Startup task '{name}' failed: {e}")
+            finally:
+                with self.lock:
+                    self.phases[f"{name} (background)"] = time.perf_counter() - start
+
+        thread = threading.Thread(target=task, name=f"startup-{name}", daemon=True)
+        thread.start()
+        return thread
+
+    def page_served(self):
+        """Record the time to first served page and log the report, only the first call counts"""
+        if self.first_page_served:
+            return
+        with self.lock:
+            if self.first_page_served:
+                return
+            self.first_page_served = True
+            self.phases["first page"] = time.perf_counter() - self.started_at
+        self.report()
+
+    def report(self):
+        with self.lock:
+            phases = ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in self.phases.items())
+        logging.info(f"Startup timing: {phases}")
+
+    def register(self, server):
+        """Hook into the Flask server to detect the first served page"""
+        @server.after_request
+        def _record_first_page(response):
+            if not self.first_page_served and response.status_code == 200:
+                self.page_served()
+            return response
@@ -0,0 +1,283 @@
+import json
+import math
+import threading
+
+# Sample keys that are not metrics
+EXCLUDED_KEYS = {
+    "timestamp", "device_serial", "model", "connection_type", "device_time", "clock_offset_ms",
+    "sample_interval", "backfilled", "app_package", "charging_status", "battery_health",
+}
+
+# Weight of the newest value in the exponentially weighted moving average
+EWMA_ALPHA = 0.2
+
+# Relative accuracy of the quantile sketches, a reported p99 is within 1% of a value that was seen
+SKETCH_ACCURACY = 0.01
+
+# Sliding window, kept as WINDOW_BUCKETS buckets that are merged when it is read
+WINDOW_SECONDS = 60
+WINDOW_BUCKETS = 6
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class RunningStats:
+    """Count, mean and variance (Welford), min, max and EWMA of a stream of values"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.ewma = None
+
+    def update(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.ewma = value if self.ewma is None else EWMA_ALPHA * value + (1 - EWMA_ALPHA) * self.ewma
+
+    def merge(self, other):
+        """Combine with the stats of another stream (Chan et al.), the EWMA keeps the newer side"""
+        if not other.count:
+            return self
+        if not self.count:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.min, self.max, self.ewma = other.min, other.max, other.ewma
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.ewma = other.ewma
+        return self
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with relative error (DDSketch)
+
+    Values are counted in logarithmic buckets, bucket i holds (gamma^(i-1), gamma^i], so
+    any quantile is returned within SKETCH_ACCURACY of a value of the stream. An insert
+    is one dict update, sketches merge by adding counts, and the number of buckets only
+    grows with the log of the value range.
+    """
+
+    def __init__(self, accuracy=SKETCH_ACCURACY):
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zero = 0
+        self.count = 0
+
+    def update(self, value):
+        """Count a value, returns its bucket key so sketches of the same accuracy can skip the log"""
+        key = math.ceil(math.log(abs(value)) / self.log_gamma) if value else None
+        self.add(value, key)
+        return key
+
+    def add(self, value, key):
+        self.count += 1
+        if value > 0:
+            self.positive[key] = self.positive.get(key, 0) + 1
+        elif value < 0:
+            self.negative[key] = self.negative.get(key, 0) + 1
+        else:
+            self.zero += 1
+
+    def merge(self, other):
+        for key, count in other.positive.items():
+            self.positive[key] = self.positive.get(key, 0) + count
+        for key, count in other.negative.items():
+            self.negative[key] = self.negative.get(key, 0) + count
+        self.zero += other.zero
+        self.count += other.count
+        return self
+
+    def quantile(self, q):
+        """Value at quantile q (0..1), None when the sketch is empty"""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        # negative values from the most negative up, then zeros, then positive values
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -self._value(key)
+        seen += self.zero
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self._value(key)
+        return self._value(max(self.positive)) if self.positive else 0.0
+
+    def _value(self, key):
+        # midpoint of the bucket in relative terms, within accuracy of every value in it
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def to_dict(self):
+        return {
+            "accuracy": self.accuracy, "zero": self.zero,
+            "positive": self.positive, "negative": self.negative,
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        sketch = cls(state["accuracy"])
+        sketch.zero = state["zero"]
+        sketch.positive = {int(k): v for k, v in state["positive"].items()}
+        sketch.negative = {int(k): v for k, v in state["negative"].items()}
+        sketch.count = sketch.zero + sum(sketch.positive.values()) + sum(sketch.negative.values())
+        return sketch
+
+
+def _clamp(value, low, high):
+    """Keep a sketch estimate within the exact min and max, e.g. a constant metric reports itself"""
+    if value is None or low is None:
+        return value
+    return min(max(value, low), high)
+
+
+class WindowBucket:
+    """Values of one slice of the sliding window"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.sketch = QuantileSketch()
+
+
+class MetricStats:
+    """Session and sliding window statistics of one metric"""
+
+    def __init__(self):
+        self.session = RunningStats()
+        self.sketch = QuantileSketch()
+        # bucket index (seconds since the epoch // bucket length) -> WindowBucket
+        self.buckets = {}
+        self.newest_bucket = None
+        self.last = None
+
+    def update(self, value, index):
+        """Add a value of window bucket `index`, see StatsEngine.update"""
+        self.session.update(value)
+        key = self.sketch.update(value)
+        self.last = value
+
+        if self.newest_bucket is None or index > self.newest_bucket:
+            self.newest_bucket = index
+            for old in [i for i in self.buckets if i <= index - WINDOW_BUCKETS]:
+                del self.buckets[old]
+        elif index <= self.newest_bucket - WINDOW_BUCKETS:
+            # older than the window, e.g. a backfilled sample, only counts for the session
+            return
+        bucket = self.buckets.get(index)
+        if bucket is None:
+            bucket = self.buckets[index] = WindowBucket()
+        bucket.count += 1
+        bucket.total += value
+        bucket.min = value if bucket.min is None or value < bucket.min else bucket.min
+        bucket.max = value if bucket.max is None or value > bucket.max else bucket.max
+        bucket.sketch.add(value, key)
+
+    def window(self):
+        """(count, mean, min, max, sketch) of the last WINDOW_SECONDS, merged from the buckets"""
+        buckets = list(self.buckets.values())
+        sketch = QuantileSketch()
+        for bucket in buckets:
+            sketch.merge(bucket.sketch)
+        count = sum(bucket.count for bucket in buckets)
+        if not count:
+            return 0, None, None, None, sketch
+        return (
+            count, sum(bucket.total for bucket in buckets) / count,
+            min(bucket.min for bucket in buckets), max(bucket.max for bucket in buckets), sketch,
+        )
+
+    def summary(self):
+        _, window_mean, window_min, window_max, window_sketch = self.window()
+        summary = {
+            "last": self.last,
+            "count": self.session.count,
+            "mean": self.session.mean,
+            "std": self.session.std,
+            "min": self.session.min,
+            "max": self.session.max,
+            "ewma": self.session.ewma,
+            "window_mean": window_mean,
+        }
+        for q in QUANTILES:
+            summary[f"p{round(q * 100)}"] = _clamp(self.sketch.quantile(q), self.session.min, self.session.max)
+            summary[f"window_p{round(q * 100)}"] = _clamp(window_sketch.quantile(q), window_min, window_max)
+        return summary
+
+
+class StatsEngine:
+    """Incremental statistics of every numeric metric of the samples, fed one sample at a time
+
+    The monitoring thread updates while the dashboard reads, a lock keeps the dicts consistent.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def update(self, data):
+        index = int(data["timestamp"].timestamp() // (WINDOW_SECONDS / WINDOW_BUCKETS))
+        with self.lock:
+            for key, value in data.items():
+                # bool is an int, NaN is not equal to itself
+                if key in EXCLUDED_KEYS or not isinstance(value, (int, float)) or isinstance(value, bool):
+                    continue
+                if value != value:
+                    continue
+                stats = self.metrics.get(key)
+                if stats is None:
+                    stats = self.metrics[key] = MetricStats()
+                stats.update(float(value), index)
+
+    def summary(self, metric):
+        with self.lock:
+            stats = self.metrics.get(metric)
+            return stats.summary() if stats else None
+
+    def baseline(self, metric):
+        """(count, mean, std, ewma) of the session so far, None before the first value"""
+        with self.lock:
+            stats = self.metrics.get(metric)
+            if stats is None:
+                return None
+            return stats.session.count, stats.session.mean, stats.session.std, stats.session.ewma
+
+    def names(self):
+        with self.lock:
+            return sorted(self.metrics)
+
+    def rows(self):
+        """(metric, session summary, serialized sketch) of every metric, for saving"""
+        with self.lock:
+            return [
+                (metric, stats.summary(), json.dumps(stats.sketch.to_dict()))
+                for metric, stats in sorted(self.metrics.items())
+            ]
+
+    def clear(self):
+        with self.lock:
+            self.metrics = {}
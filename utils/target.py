@@ -0,0 +1,108 @@
+import logging
+
+from utils.parsers import parse_proc_stat, parse_proc_fields, parse_cpu_ticks, split_sections
+
+# Echoed before the target app output in the shell call of the system metrics
+TARGET_MARKER = "@@target"
+PID_MARKER = "@@pid"
+CPU_MARKER = "@@cpu"
+PIDOF_MARKER = "@@pidof"
+
+# /proc/<pid>/status lines that are kept, the rest of the file is not sent back
+STATUS_KEYS = "Name|State|Uid|Threads|VmRSS|VmSwap"
+
+
+class TargetAppSampler:
+    """Samples one package from /proc, in the same shell call as the system metrics
+
+    The package is resolved to PIDs with pidof once; afterwards only /proc/<pid>/stat,
+    status and smaps_rollup are read. PIDs are resolved again when a process exits or
+    restarts (its start time changes). CPU% is the change in process ticks over the
+    change in total ticks since the previous sample, as a share of one core like top.
+    """
+    marker = TARGET_MARKER
+
+    def __init__(self, package):
+        self.package = package
+        # pid -> start time, the start time tells a restarted process from the cached one
+        self.pids = {}
+        self.previous_ticks = {}
+        self.previous_total = None
+        # real uid of the package, read from /proc/<pid>/status, for per-uid network stats
+        self.uid = None
+
+    def shell_command(self):
+        """Shell snippet to append to the system metrics command"""
+        if not self.pids:
+            return f"echo {TARGET_MARKER}; echo {PIDOF_MARKER}; pidof {self.package}"
+        parts = [f"echo {TARGET_MARKER}", f"echo {CPU_MARKER}", "grep '^cpu' /proc/stat"]
+        for pid in self.pids:
+            parts += [
+                f"echo {PID_MARKER} {pid}",
+                f"cat /proc/{pid}/stat",
+                f"grep -E '^({STATUS_KEYS}):' /proc/{pid}/status",
+                f"cat /proc/{pid}/smaps_rollup 2>/dev/null",
+            ]
+        return "; ".join(parts)
+
+    def reset(self):
+        self.pids = {}
+        self.previous_ticks = {}
+        self.previous_total = None
+
+    def parse(self, output):
+        """Parse the output of shell_command, returns the sample fields or None"""
+        if output is None:
+            return None
+        markers = {CPU_MARKER, PIDOF_MARKER, *(f"{PID_MARKER} {pid}" for pid in self.pids)}
+        _, sections = split_sections(output, markers)
+        sections = {marker: text.splitlines() for marker, text in sections.items()}
+
+        if PIDOF_MARKER in sections:
+            pids = [int(pid) for pid in " ".join(sections[PIDOF_MARKER]).split() if pid.isdigit()]
+            if pids:
+                logging.info(f"Target package {self.package} running as pid(s) {', '.join(map(str, pids))}")
+            # start times are filled in by the first /proc sample
+            self.pids = {pid: None for pid in pids}
+            return None
+
+        total, cores = parse_cpu_ticks(sections.get(CPU_MARKER, []))
+        data = {
+            "app_package": self.package,
+            "app_pids": 0,
+            "app_threads": 0,
+            "app_rss_mb": 0.0,
+            "app_swap_mb": 0.0,
+            "app_pss_mb": None,
+            "app_cpu": None,
+        }
+        ticks = {}
+        restarted = False
+        for pid in list(self.pids):
+            lines = sections.get(f"{PID_MARKER} {pid}", [])
+            stat = parse_proc_stat(lines[0]) if lines else None
+            if stat is None or (self.pids[pid] is not None and stat["start_time"] != self.pids[pid]):
+                restarted = True
+                continue
+            self.pids[pid] = stat["start_time"]
+            ticks[pid] = stat["cpu_ticks"]
+            fields = parse_proc_fields(lines[1:])
+            self.uid = fields.get("Uid", self.uid)
+            data["app_pids"] += 1
+            data["app_threads"] += stat["threads"]
+            data["app_rss_mb"] += fields.get("VmRSS", 0) / 1024
+            data["app_swap_mb"] += fields.get("VmSwap", 0) / 1024
+            # smaps_rollup needs ptrace access, it is missing for non-debuggable apps on user builds
+            if "Pss" in fields:
+                data["app_pss_mb"] = (data["app_pss_mb"] or 0.0) + fields["Pss"] / 1024
+
+        if self.previous_total is not None and total is not None and total > self.previous_total:
+            delta = sum(ticks[pid] - self.previous_ticks[pid] for pid in ticks if pid in self.previous_ticks)
+            data["app_cpu"] = round(100 * cores * delta / (total - self.previous_total), 1)
+        self.previous_ticks = ticks
+        self.previous_total = total
+
+        if restarted:
+            logging.info(f"Target package {self.package} restarted or exited, resolving pids again")
+            self.reset()
+        return data if data["app_pids"] else None
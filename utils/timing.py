@@ -0,0 +1,73 @@
+import re
+from collections import deque
+
+# `date +%s.%N` output, toybox builds without %N print the literal or nothing after the dot
+DEVICE_TIME_PATTERN = re.compile(r'^\s*(\d{9,})(?:\.(\d+))?')
+
+# Shell snippet printing the device clock, used to bracket a command in the same adb round trip
+DEVICE_TIME_COMMAND = "date +%s.%N"
+
+
+def timed_shell_command(command):
+    """Wrap a shell command so the device prints its clock before and after it"""
+    return f"{DEVICE_TIME_COMMAND}; {command}; {DEVICE_TIME_COMMAND}"
+
+
+def parse_device_time(line):
+    match = DEVICE_TIME_PATTERN.match(line)
+    if not match:
+        return None
+    seconds, fraction = match.groups()
+    return float(f"{seconds}.{fraction}") if fraction else float(seconds)
+
+
+def split_timed_output(output):
+    """Split output of timed_shell_command into (device_start, device_end, command output)
+
+    Device times are None when the device did not print them.
+    """
+    lines = output.splitlines()
+    device_start = parse_device_time(lines[0]) if lines else None
+    device_end = parse_device_time(lines[-1]) if len(lines) > 1 else None
+    start = 1 if device_start is not None else 0
+    end = len(lines) - 1 if device_end is not None else len(lines)
+    return device_start, device_end, "\n".join(lines[start:end])
+
+
+class ClockOffsetEstimator:
+    """Tracks the offset between a device clock and the host clock, NTP style
+
+    Each adb round trip gives host send/receive times and device start/end times.
+    The offset from the round trip with the smallest network delay in a sliding
+    window is the least affected by asymmetric latency; it is smoothed with an
+    EWMA so a single outlier does not shift the series.
+    """
+    def __init__(self, window=16, alpha=0.25):
+        self.window = deque(maxlen=window)
+        self.alpha = alpha
+        self.offset = None
+        self.last_delay = None
+
+    def update(self, host_send, host_receive, device_start, device_end):
+        """Add one round trip, all times in seconds since the epoch. Returns the offset estimate"""
+        # time on the wire, excluding the time the device spent running the command
+        delay = max((host_receive - host_send) - (device_end - device_start), 0.0)
+        offset = ((device_start - host_send) + (device_end - host_receive)) / 2
+        self.window.append((delay, offset))
+        self.last_delay = delay
+
+        best_offset = min(self.window)[1]
+        if self.offset is None:
+            self.offset = best_offset
+        else:
+            self.offset += self.alpha * (best_offset - self.offset)
+        return self.offset
+
+    def to_host_time(self, device_time):
+        """Map a device timestamp onto the host clock"""
+        return device_time - (self.offset or 0.0)
+
+    def reset(self):
+        self.window.clear()
+        self.offset = None
+        self.last_delay = None